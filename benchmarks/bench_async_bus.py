@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga del Bus de Servicios en modo asyncio
+Mantiene miles de conexiones ociosas abiertas mientras un grupo de clientes activos
+envía mensajes SOA, y reporta throughput y latencias.
+Uso: python benchmarks/bench_async_bus.py [--idle 10000] [--active 200] [--requests 50] [--mode async]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import statistics
+import time
+
+from services.common.soa_protocol import SOAProtocol
+from services.service_bus import AsyncServiceBus, ServiceBus
+from benchmarks.stub_services import start_stub_services
+
+BUS_PORT = 15000
+STUB_BASE_PORT = 15101
+
+
+def raise_fd_limit(wanted: int):
+    """Subir el límite de descriptores de archivo hasta donde permita el sistema"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(max(soft, wanted), hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return target
+
+
+def run_bus(mode: str, fd_limit: int):
+    """Proceso del bus con sus servicios stub"""
+    raise_fd_limit(fd_limit)
+    bus_class = AsyncServiceBus if mode == "async" else ServiceBus
+    config = {
+        code: {"host": "127.0.0.1", "port": STUB_BASE_PORT + i}
+        for i, code in enumerate(ServiceBus().service_config)
+    }
+    bus = bus_class(host="127.0.0.1", port=BUS_PORT, service_config=config)
+    start_stub_services(config)
+    bus.start()
+
+
+async def open_idle(count: int) -> list:
+    """Abrir conexiones que no envían nada"""
+    writers = []
+    for _ in range(count):
+        _, writer = await asyncio.open_connection("127.0.0.1", BUS_PORT)
+        writers.append(writer)
+    return writers
+
+
+async def active_client(requests: int, latencies: list):
+    """Cliente que envía `requests` mensajes secuenciales por una conexión persistente"""
+    message = SOAProtocol().format_message("avail", {"config": True}).encode('utf-8')
+    reader, writer = await asyncio.open_connection("127.0.0.1", BUS_PORT)
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            writer.write(message)
+            await writer.drain()
+            header = await reader.readexactly(5)
+            await reader.readexactly(int(header))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def load(idle: int, active: int, requests: int):
+    idle_writers = await open_idle(idle)
+    print(f"Conexiones ociosas abiertas: {len(idle_writers)}")
+
+    latencies: list = []
+    start = time.perf_counter()
+    await asyncio.gather(*(active_client(requests, latencies) for _ in range(active)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"Mensajes: {len(latencies)} en {elapsed:.2f}s -> {len(latencies) / elapsed:.0f} msg/s")
+    print(f"Latencia p50={quantiles[49] * 1000:.2f}ms p95={quantiles[94] * 1000:.2f}ms "
+          f"p99={quantiles[98] * 1000:.2f}ms")
+
+    for writer in idle_writers:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--idle", type=int, default=10000)
+    parser.add_argument("--active", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--mode", choices=["thread", "async"], default="async")
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit(args.idle + args.active + 1024)
+    if fd_limit < args.idle + args.active + 256:
+        args.idle = max(0, fd_limit - args.active - 256)
+        print(f"Límite de descriptores {fd_limit}: se usarán {args.idle} conexiones ociosas")
+
+    bus_process = multiprocessing.Process(target=run_bus, args=(args.mode, fd_limit), daemon=True)
+    bus_process.start()
+    time.sleep(1.0)
+    try:
+        asyncio.run(load(args.idle, args.active, args.requests))
+    finally:
+        bus_process.terminate()
+        bus_process.join()
+
+
+if __name__ == "__main__":
+    main()
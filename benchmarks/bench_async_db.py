@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Sesiones síncronas vs asíncronas en endpoints async def bajo concurrencia
+Un servicio FastAPI de prueba atiende consultas lentas (como un reporte) y rápidas (como
+una consulta de disponibilidad) con get_db (antes) y con get_async_db (después). Unos
+clientes mantienen consultas lentas en vuelo mientras otros miden la latencia de las
+rápidas: con la sesión síncrona cada consulta bloquea el event loop de uvicorn y las
+rápidas esperan a las lentas; con la asíncrona sólo esperan a la base de datos.
+Sin --database-url usa SQLite (aiosqlite) en un archivo temporal; con PostgreSQL la
+consulta lenta es pg_sleep.
+Uso: python benchmarks/bench_async_db.py [--slow 4] [--fast 8] [--seconds 5] [--database-url postgresql://...]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import http.client
+import multiprocessing
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from benchmarks.bench_bus_workers import wait_for_port
+
+PORT = 15600
+
+
+def slow_statement(url: str, args) -> tuple:
+    """Consulta lenta según el motor: pg_sleep en PostgreSQL, un CTE recursivo en SQLite"""
+    if url.startswith("postgresql"):
+        return "SELECT pg_sleep(:seconds)", {"seconds": args.slow_seconds}
+    return ("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < :rows) "
+            "SELECT count(*) FROM c", {"rows": args.slow_rows})
+
+
+def run_server(url: str, args):
+    """Proceso del servicio de prueba (un worker de uvicorn, como los servicios reales)"""
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("DB_POOL_SIZE", str(args.slow + args.fast))
+    import uvicorn
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session
+
+    from database import db_config
+    from database.db_config import get_async_db, get_db
+
+    slow_sql, slow_params = slow_statement(url, args)
+    slow, fast = text(slow_sql), text("SELECT 1")
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        if db_config.async_engine is not None:
+            await db_config.async_engine.dispose()  # Las conexiones de aiosqlite tienen hilos propios
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/sync/slow")
+    async def sync_slow(db: Session = Depends(get_db)):
+        return {"n": db.execute(slow, slow_params).scalar()}
+
+    @app.get("/sync/fast")
+    async def sync_fast(db: Session = Depends(get_db)):
+        return {"n": db.execute(fast).scalar()}
+
+    @app.get("/async/slow")
+    async def async_slow(db: AsyncSession = Depends(get_async_db)):
+        return {"n": (await db.execute(slow, slow_params)).scalar()}
+
+    @app.get("/async/fast")
+    async def async_fast(db: AsyncSession = Depends(get_async_db)):
+        return {"n": (await db.execute(fast)).scalar()}
+
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def client(path: str, deadline: float, latencies: list, errors: list):
+    """Peticiones secuenciales por una conexión keep-alive hasta el plazo"""
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def measure(mode: str, args) -> dict:
+    deadline = time.perf_counter() + args.seconds
+    slow, fast, errors = [], [], []
+    threads = [threading.Thread(target=client, args=(f"/{mode}/slow", deadline, slow, errors))
+               for _ in range(args.slow)]
+    threads += [threading.Thread(target=client, args=(f"/{mode}/fast", deadline, fast, errors))
+                for _ in range(args.fast)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    quantiles = statistics.quantiles(fast, n=100) if len(fast) > 1 else [float("nan")] * 99
+    return {
+        "fast_rps": len(fast) / args.seconds,
+        "slow_rps": len(slow) / args.seconds,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+        "slow_ms": statistics.mean(slow) * 1000 if slow else float("nan"),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="", help="Base de datos (vacío = SQLite temporal)")
+    parser.add_argument("--slow", type=int, default=4, help="Clientes concurrentes de la consulta lenta")
+    parser.add_argument("--fast", type=int, default=8, help="Clientes concurrentes de la consulta rápida")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--slow-seconds", type=float, default=0.2, help="pg_sleep de la consulta lenta")
+    parser.add_argument("--slow-rows", type=int, default=300000, help="Filas del CTE lento en SQLite")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async_db.db')}"
+    server = multiprocessing.Process(target=run_server, args=(url, args), daemon=True)
+    server.start()
+    try:
+        wait_for_port(PORT)
+        print(f"{args.slow} clientes con consultas lentas + {args.fast} con consultas rápidas, "
+              f"{args.seconds:g}s por medición ({url.split(':')[0]})")
+        print(f"{'':<10}{'rápidas/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'lentas/s':>10}"
+              f"{'lenta ms':>10}{'errores':>9}")
+        for mode, label in (("sync", "get_db"), ("async", "async_db")):
+            result = measure(mode, args)
+            print(f"{label:<10}{result['fast_rps']:>11.0f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+                  f"{result['p99']:>10.2f}{result['slow_rps']:>10.1f}{result['slow_ms']:>10.1f}{result['errors']:>9}")
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+CPU del Bus de Servicios según el codec del cliente
+Levanta el bus (modo hilos, sin caché) y servicios stub que responden una lista de reservas,
+y envía --requests peticiones con SOAClient en JSON y en MessagePack. Mide el tiempo de CPU
+(utime + stime de /proc, sólo Linux) que consume el proceso del bus por petición: el bus decodifica
+la petición en el codec del cliente y entrega la respuesta JSON del servicio sin traducirla.
+Uso: python benchmarks/bench_bus_codecs.py [--requests 5000] [--rows 200]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.bench_bus_workers import wait_for_port
+from benchmarks.payloads import booking_list
+from benchmarks.stub_services import start_stub_services
+from services.common.soa_client import SOAClient
+from services.common.soa_codecs import available_codecs
+
+BUS_PORT = 15620
+STUB_BASE_PORT = 15621
+SERVICES = ["user", "space", "avail", "book"]
+
+
+def service_config() -> dict:
+    return {code: {"host": "127.0.0.1", "port": STUB_BASE_PORT + i} for i, code in enumerate(SERVICES)}
+
+
+def run_stubs(rows: int):
+    """Proceso de los stubs, aparte para que su CPU no cuente como del bus"""
+    start_stub_services(service_config(), payload=booking_list(rows))
+    while True:
+        time.sleep(3600)
+
+
+def run_bus():
+    os.environ["BUS_CACHE_ENABLED"] = "0"  # Medir reenvío, no aciertos de caché
+    os.environ["LOG_LEVEL"] = "WARNING"
+    from services.service_bus import ServiceBus
+    ServiceBus(host="127.0.0.1", port=BUS_PORT, service_config=service_config()).start()
+
+
+def cpu_seconds(pid: int) -> float:
+    """Tiempo de CPU (usuario + sistema) consumido por un proceso"""
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def measure(codec: str, bus_pid: int, requests: int) -> dict:
+    client = SOAClient("127.0.0.1", BUS_PORT, pool_size=1, codec=codec, compression=False)
+    request = {"bulk": booking_list(20)}
+    try:
+        for _ in range(50):  # Calentamiento: negociación y conexiones del pool del bus
+            client.request("book", request)
+        cpu = cpu_seconds(bus_pid)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.request("book", request)
+        elapsed = time.perf_counter() - start
+        cpu = cpu_seconds(bus_pid) - cpu
+    finally:
+        client.close()
+    return {"cpu_us": cpu / requests * 1e6, "latency_us": elapsed / requests * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=200, help="Reservas en cada respuesta de los stubs")
+    args = parser.parse_args()
+
+    codecs = [name for name in ("json", "msgpack") if name in available_codecs()]
+    if "msgpack" not in codecs:
+        print("msgpack no instalado: solo se mide JSON (pip install -r requirements.txt)")
+
+    stubs = multiprocessing.Process(target=run_stubs, args=(args.rows,), daemon=True)
+    bus = multiprocessing.Process(target=run_bus, daemon=True)
+    stubs.start()
+    bus.start()
+    try:
+        wait_for_port(BUS_PORT)
+        for port in range(STUB_BASE_PORT, STUB_BASE_PORT + len(SERVICES)):
+            wait_for_port(port)
+        print(f"Petición de 20 reservas, respuesta de {args.rows} reservas, {args.requests} peticiones por codec")
+        print(f"{'codec':<9}{'CPU bus µs/pet':>16}{'latencia µs':>13}")
+        for codec in codecs:
+            result = measure(codec, bus.pid, args.requests)
+            print(f"{codec:<9}{result['cpu_us']:>16.1f}{result['latency_us']:>13.1f}")
+    finally:
+        bus.terminate()
+        stubs.terminate()
+        bus.join()
+        stubs.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark de reenvío del Bus de Servicios: conexión por mensaje vs pool persistente
+Uso: python benchmarks/bench_bus_pool.py [--messages 20000] [--threads 16]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+import time
+
+from services.service_bus import ServiceBus
+from benchmarks.stub_services import start_stub_services, stop_stub_services
+
+STUB_BASE_PORT = 15001
+
+
+def run(config: dict, pool_size: int, messages: int, threads: int) -> float:
+    """Reenviar `messages` mensajes desde `threads` hilos y retornar mensajes/seg"""
+    bus = ServiceBus(pool_size=pool_size, service_config=config)
+    codes = list(bus.service_config)
+    per_thread = messages // threads
+
+    def worker(offset: int):
+        for i in range(per_thread):
+            bus.forward_to_service(codes[(offset + i) % len(codes)], {"getall": True})
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    for pool in bus.pools.values():
+        pool.close()
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    config = {
+        code: {"host": "127.0.0.1", "port": STUB_BASE_PORT + i}
+        for i, code in enumerate(ServiceBus().service_config)
+    }
+    servers = start_stub_services(config)
+    try:
+        before = run(config, 0, args.messages, args.threads)
+        print(f"Sin pool (conexión por mensaje): {before:10.0f} msg/s")
+        after = run(config, args.threads, args.messages, args.threads)
+        print(f"Con pool persistente:            {after:10.0f} msg/s")
+        print(f"Mejora: x{after / before:.2f}")
+    finally:
+        stop_stub_services(servers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Escalamiento del Bus de Servicios con varios procesos (SO_REUSEPORT)
+Levanta el supervisor con 1, 2, 4... workers y mide el throughput de reenvío con
+varios procesos cliente, cada uno con conexiones persistentes en paralelo.
+Los servicios stub corren en procesos propios para que no sean el cuello de botella.
+Uso: python benchmarks/bench_bus_workers.py [--workers 1,2,4] [--clients 4] [--connections 32] [--seconds 5]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import multiprocessing
+import socket
+import time
+
+from benchmarks.payloads import booking_list
+from benchmarks.stub_services import start_stub_services
+from services.common.soa_protocol import SOAProtocol, read_frame_async
+
+BUS_PORT = 15300
+STUB_BASE_PORT = 15301
+SERVICES = ["user", "space", "avail", "book"]
+
+
+def service_config() -> dict:
+    return {code: {"host": "127.0.0.1", "port": STUB_BASE_PORT + i} for i, code in enumerate(SERVICES)}
+
+
+def run_stub(code: str, config: dict):
+    """Un proceso por servicio stub"""
+    start_stub_services({code: config})
+    while True:
+        time.sleep(3600)
+
+
+def run_supervisor(workers: int, mode: str):
+    from services.bus_supervisor import BusSupervisor
+    os.environ["BUS_CACHE_ENABLED"] = "0"  # Medir reenvío, no aciertos de caché
+    os.environ["LOG_LEVEL"] = "WARNING"
+    BusSupervisor(workers, mode=mode, host="127.0.0.1", port=BUS_PORT, service_config=service_config()).start()
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El puerto {port} no respondió")
+
+
+async def connection_loop(message: bytes, deadline: float) -> int:
+    """Enviar mensajes secuenciales por una conexión hasta el plazo; retorna cuántos"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", BUS_PORT)
+    sent = 0
+    try:
+        while time.perf_counter() < deadline:
+            writer.write(message)
+            await writer.drain()
+            await read_frame_async(reader)
+            sent += 1
+    finally:
+        writer.close()
+    return sent
+
+
+def run_client(connections: int, seconds: float, results):
+    """Proceso cliente: `connections` conexiones concurrentes durante `seconds`"""
+    protocol = SOAProtocol()
+    messages = [
+        protocol.format_message(code, {"bulk": booking_list(20, seed=i)}).encode('utf-8')
+        for i, code in enumerate(SERVICES)
+    ]
+
+    async def load():
+        deadline = time.perf_counter() + seconds
+        counts = await asyncio.gather(*(
+            connection_loop(messages[i % len(messages)], deadline) for i in range(connections)
+        ))
+        return sum(counts)
+
+    results.put(asyncio.run(load()))
+
+
+def measure(workers: int, args, context) -> float:
+    supervisor = context.Process(target=run_supervisor, args=(workers, args.mode))
+    supervisor.start()
+    try:
+        wait_for_port(BUS_PORT)
+        time.sleep(1.0)  # Que todos los workers alcancen a enlazar el puerto
+        results = context.Queue()
+        clients = [
+            context.Process(target=run_client, args=(args.connections, args.seconds, results))
+            for _ in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        total = sum(results.get() for _ in clients)
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            client.join()
+        return total / elapsed
+    finally:
+        supervisor.terminate()
+        supervisor.join()
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--mode", choices=["thread", "async"], default="async")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    stubs = [context.Process(target=run_stub, args=(code, config), daemon=True)
+             for code, config in service_config().items()]
+    for stub in stubs:
+        stub.start()
+    for config in service_config().values():
+        wait_for_port(config["port"])
+
+    print(f"CPUs: {os.cpu_count()}  clientes: {args.clients} x {args.connections} conexiones  modo: {args.mode}")
+    baseline = None
+    try:
+        for workers in (int(n) for n in args.workers.split(",")):
+            throughput = measure(workers, args, context)
+            baseline = baseline or throughput
+            print(f"{workers:3d} workers: {throughput:10.0f} msg/s  ({throughput / baseline:.2f}x)")
+    finally:
+        for stub in stubs:
+            stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de codecs SOA sobre payloads reales de reservas, disponibilidad y usuarios
+Uso: python benchmarks/bench_codecs.py [--seconds 0.5]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from services.common.soa_codecs import available_codecs, get_codec
+from benchmarks.payloads import PAYLOADS
+
+
+def ops_per_second(fn, seconds: float) -> float:
+    """Repetir `fn` durante `seconds` y retornar operaciones por segundo"""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{'payload':<16} {'codec':<8} {'bytes':>9} {'encode/s':>10} {'decode/s':>10}")
+    for label, build in PAYLOADS.items():
+        data = build()
+        for name in available_codecs():
+            codec = get_codec(name)
+            encoded = codec.encode(data)
+            assert codec.decode(encoded) == data
+            enc = ops_per_second(lambda: codec.encode(data), args.seconds)
+            dec = ops_per_second(lambda: codec.decode(encoded), args.seconds)
+            print(f"{label:<16} {name:<8} {len(encoded):>9} {enc:>10.0f} {dec:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
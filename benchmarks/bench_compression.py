@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Compresión de mensajes SOA: CPU contra bytes sobre payloads reales
+Para cada payload y codec mide el tamaño del mensaje, el ratio y el costo de comprimir y
+descomprimir con cada algoritmo, y calcula el ancho de banda bajo el cual la compresión
+compensa (bytes ahorrados / CPU gastada): en enlaces más lentos que ese valor conviene comprimir.
+Uso: python benchmarks/bench_compression.py [--seconds 0.3] [--codecs json,msgpack]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from benchmarks.bench_codecs import ops_per_second
+from benchmarks.payloads import PAYLOADS
+from services.common.soa_codecs import get_codec
+from services.common.soa_compression import LZ4Compressor, ZlibCompressor, lz4_frame
+from services.common.soa_protocol import compress_frame, decompress_frame, encode_frame
+
+
+def compressors() -> dict:
+    result = {"zlib-1": ZlibCompressor(1), "zlib-6": ZlibCompressor(6), "zlib-9": ZlibCompressor(9)}
+    if lz4_frame is not None:
+        result["lz4"] = LZ4Compressor()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=0.3)
+    parser.add_argument("--codecs", default="json,msgpack")
+    args = parser.parse_args()
+
+    if lz4_frame is None:
+        print("lz4 no instalado: solo se mide zlib (pip install lz4 para compararlo)")
+    print(f"{'payload':<16} {'codec':<7} {'algoritmo':<9} {'bytes':>8} {'comprim.':>9} {'ratio':>6} "
+          f"{'comp µs':>9} {'desc µs':>9} {'compensa bajo':>14}")
+    for label, build in PAYLOADS.items():
+        data = build()
+        for codec_name in args.codecs.split(","):
+            frame = encode_frame("book", data, get_codec(codec_name), extended=True)
+            for name, compressor in compressors().items():
+                compressed = compress_frame(frame, compressor, min_bytes=0)
+                assert decompress_frame(compressed) == frame
+                comp = 1e6 / ops_per_second(lambda: compress_frame(frame, compressor, min_bytes=0), args.seconds)
+                decomp = 1e6 / ops_per_second(lambda: decompress_frame(compressed), args.seconds)
+                saved_bits = (len(frame) - len(compressed)) * 8
+                break_even = saved_bits / (comp + decomp) if saved_bits > 0 else 0.0  # bits/µs = Mbit/s
+                print(f"{label:<16} {codec_name:<7} {name:<9} {len(frame):>8} {len(compressed):>9} "
+                      f"{len(frame) / len(compressed):>6.2f} {comp:>9.1f} {decomp:>9.1f} {break_even:>9.0f} Mbit/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Exportación completa de reservas: lista en memoria vs transmisión por lotes
+Levanta el servicio de reservas real sobre una base con --rows reservas y descarga todas:
+con una lista (antes: todas las filas en memoria y un solo JSON al final) y con
+/bookings/export en NDJSON y CSV (después: cursor del servidor y un lote por chunk).
+Cada modo corre en un proceso nuevo para medir su pico de memoria (VmHWM, sólo Linux).
+Sin --database-url usa SQLite (aiosqlite) en un archivo temporal.
+Uso: python benchmarks/bench_exports.py [--rows 200000] [--database-url postgresql://...]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import http.client
+import multiprocessing
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from benchmarks.bench_bus_workers import wait_for_port
+
+PORT = 15610
+MODES = (
+    ("lista", "/bench/list"),
+    ("ndjson", "/bookings/export"),
+    ("csv", "/bookings/export?formato=csv"),
+)
+
+
+def populate(url: str, rows: int):
+    """Crear las tablas y cargar usuarios, espacios y reservas de prueba"""
+    os.environ["DATABASE_URL"] = url
+    from sqlalchemy import insert
+
+    from database.db_config import Base, engine
+    from database.models import Espacio, Reserva, Usuario
+
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2026, 3, 1, 8)
+    with engine.begin() as conn:
+        conn.execute(insert(Usuario), [
+            {"rut": f"{i}-K", "correo_institucional": f"u{i}@mail.udp.cl", "nombre": f"Usuario {i}",
+             "tipo_usuario": "estudiante"}
+            for i in range(1000)
+        ])
+        conn.execute(insert(Espacio), [{"nombre": f"Sala {i}", "tipo": "sala", "capacidad": 30} for i in range(50)])
+        for offset in range(0, rows, 10000):
+            conn.execute(insert(Reserva), [
+                {"id_usuario": i % 1000 + 1, "id_espacio": i % 50 + 1, "estado": "aprobada",
+                 "fecha_inicio": start + timedelta(hours=i), "fecha_fin": start + timedelta(hours=i, minutes=90),
+                 "fecha_solicitud": start, "motivo": "Reunión de estudio del ramo"}
+                for i in range(offset, min(offset + 10000, rows))
+            ])
+    engine.dispose()
+
+
+def run_server(url: str):
+    """Proceso del servicio de reservas con una ruta extra que arma la lista completa como antes"""
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("LOOP_MONITOR_ENABLED", "0")
+    import uvicorn
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+
+    from database import db_config
+    from database.db_config import get_db
+    from database.models import Reserva
+    from database.queries import as_dicts, json_response, select_reservas
+    from services import booking_service
+
+    app = booking_service.app
+
+    @app.get("/bench/list")
+    async def full_list(db: Session = Depends(get_db)):
+        return json_response(as_dicts(db.execute(select_reservas().order_by(Reserva.id_reserva))))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        if db_config.async_engine is not None:
+            await db_config.async_engine.dispose()  # Las conexiones de aiosqlite tienen hilos propios
+
+    app.router.lifespan_context = lifespan
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Pico de memoria residente de un proceso (VmHWM de /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def download(path: str) -> dict:
+    """Descargar una ruta completa midiendo el primer byte, el total y los bytes recibidos"""
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=600)
+    start = time.perf_counter()
+    connection.request("GET", path)
+    response = connection.getresponse()
+    first = response.read(1)
+    first_byte = time.perf_counter() - start
+    size = len(first)
+    while True:
+        chunk = response.read(65536)
+        if not chunk:
+            break
+        size += len(chunk)
+    total = time.perf_counter() - start
+    connection.close()
+    return {"status": response.status, "first_byte": first_byte, "total": total, "size": size}
+
+
+def measure(url: str, path: str) -> dict:
+    server = multiprocessing.Process(target=run_server, args=(url,), daemon=True)
+    server.start()
+    try:
+        wait_for_port(PORT)
+        idle = peak_rss_mb(server.pid)
+        result = download(path)
+        result["idle_mb"] = idle
+        result["peak_mb"] = peak_rss_mb(server.pid)
+        return result
+    finally:
+        server.terminate()
+        server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-url", default="", help="Base de datos (vacío = SQLite temporal)")
+    parser.add_argument("--rows", type=int, default=200000, help="Reservas a cargar en la base temporal")
+    args = parser.parse_args()
+
+    url = args.database_url
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_exports.db')}"
+        loader = multiprocessing.Process(target=populate, args=(url, args.rows))
+        loader.start()
+        loader.join()
+
+    print(f"Exportación de reservas ({url.split(':')[0]}"
+          f"{'' if args.database_url else f', {args.rows} filas en la base temporal'})")
+    print(f"{'':<8}{'estado':>7}{'1er byte ms':>13}{'total s':>9}{'MB':>9}{'RSS base MB':>13}{'RSS pico MB':>13}")
+    for label, path in MODES:
+        result = measure(url, path)
+        print(f"{label:<8}{result['status']:>7}{result['first_byte'] * 1000:>13.1f}{result['total']:>9.2f}"
+              f"{result['size'] / 1e6:>9.1f}{result['idle_mb']:>13.1f}{result['peak_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
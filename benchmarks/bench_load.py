@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de punta a punta del sistema de reservas
+Usuarios virtuales ejecutan una mezcla ponderada de comandos SOA (auth login, avail slots y
+spaces, book create/cancel/approve, report uso) a través del Bus de Servicios o directamente
+contra los endpoints FastAPI, con rampa de subida y tiempos de espera entre peticiones.
+Reporta throughput y latencias p50/p95/p99 por comando.
+
+Uso:
+    python benchmarks/bench_load.py --target bus --stub --users 100 --duration 30
+    python benchmarks/bench_load.py --target bus --users 50 --ramp-up 10 --think 0.5
+    python benchmarks/bench_load.py --target http --users 20 --mix login=1,slots=4,create=2
+    python benchmarks/bench_load.py --target bus --stub --transport tcp,unix --users 100
+Con --stub el bus reenvía a servicios stub sin base de datos: se mide el bus solo.
+--transport elige cómo llega el bus a los stubs (TCP en localhost o socket Unix); con
+varios, se repite la carga con cada uno y se comparan latencias y throughput.
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from benchmarks.stub_services import start_stub_services
+from services.common.soa_client import AsyncSOAClient, SOAClientError
+
+load_dotenv()
+
+STUB_BUS_PORT = 15400
+STUB_BASE_PORT = 15401
+
+# Puerto HTTP de cada servicio (mismas variables que start_services.py)
+HTTP_PORTS = {
+    "auth": int(os.getenv("AUTH_SERVICE_PORT", "5001")),
+    "avail": int(os.getenv("AVAIL_SERVICE_PORT", "5004")),
+    "book": int(os.getenv("BOOK_SERVICE_PORT", "5005")),
+    "report": int(os.getenv("REPORT_SERVICE_PORT", "5009")),
+}
+
+DEFAULT_MIX = "login=1,slots=4,spaces=2,create=2,cancel=1,approve=1,uso=1"
+
+
+class VirtualUser:
+    """Estado de un usuario virtual: sus credenciales y las reservas que ha creado"""
+
+    def __init__(self, index: int, args):
+        self.index = index
+        self.rng = random.Random(args.seed + index)
+        self.rut = args.rut
+        self.password = args.password
+        self.user_id = args.user_ids[index % len(args.user_ids)]
+        self.space_ids = args.space_ids
+        self.bookings: List[int] = []
+
+    def space(self) -> int:
+        return self.rng.choice(self.space_ids)
+
+    def day(self) -> str:
+        return (date.today() + timedelta(days=self.rng.randint(1, 60))).isoformat()
+
+    def period(self) -> Tuple[str, str]:
+        """Bloque de 1 a 3 horas en horario de atención"""
+        start = self.rng.randint(8, 18)
+        day = self.day()
+        return f"{day}T{start:02d}:00:00", f"{day}T{min(start + self.rng.randint(1, 3), 21):02d}:00:00"
+
+    def booking(self) -> int:
+        """Una reserva propia si existe; si no, un id cualquiera (el servicio responde error)"""
+        if self.bookings:
+            return self.bookings.pop(self.rng.randrange(len(self.bookings)))
+        return self.rng.randint(1, 1000)
+
+
+class Command:
+    """
+    Comando de la mezcla con su forma SOA y su forma HTTP
+    soa(user) -> (service_code, data); http(user) -> (method, service, path, json)
+    """
+
+    def __init__(self, name: str, soa: Callable[[VirtualUser], tuple], http: Callable[[VirtualUser], tuple],
+                 created: Optional[Callable[[Any], Optional[int]]] = None):
+        self.name = name
+        self.soa = soa
+        self.http = http
+        self.created = created  # Extrae el id de la reserva creada, para cancelarla o aprobarla después
+
+
+def _slots(user: VirtualUser):
+    return {"espacio": user.space(), "fecha": user.day(), "duracion": user.rng.choice([1, 2])}
+
+
+def _spaces(user: VirtualUser):
+    inicio, fin = user.period()
+    return {"tipo": user.rng.choice([None, "sala", "cancha"]), "inicio": inicio, "fin": fin}
+
+
+def _create(user: VirtualUser):
+    inicio, fin = user.period()
+    return {"user": user.user_id, "space": user.space(), "inicio": inicio, "fin": fin}
+
+
+def _uso(user: VirtualUser):
+    fin = date.today()
+    return {"fecha_inicio": (fin - timedelta(days=30)).isoformat(), "fecha_fin": fin.isoformat()}
+
+
+def _http_slots(user: VirtualUser):
+    slots = _slots(user)
+    return "POST", "avail", "/availability/slots", {
+        "id_espacio": slots["espacio"], "fecha": slots["fecha"], "duracion_horas": slots["duracion"]}
+
+
+def _http_spaces(user: VirtualUser):
+    spaces = _spaces(user)
+    return "POST", "avail", "/availability/spaces", {
+        "tipo": spaces["tipo"], "fecha_inicio": spaces["inicio"], "fecha_fin": spaces["fin"]}
+
+
+def _http_create(user: VirtualUser):
+    booking = _create(user)
+    return "POST", "book", "/bookings/create", {
+        "id_usuario": booking["user"], "id_espacio": booking["space"],
+        "fecha_inicio": booking["inicio"], "fecha_fin": booking["fin"]}
+
+
+def _created_id(result: Any) -> Optional[int]:
+    return result.get("id") if isinstance(result, dict) and isinstance(result.get("id"), int) else None
+
+
+COMMANDS: Dict[str, Command] = {
+    "login": Command(
+        "auth.login",
+        lambda u: ("auth", {"rut": u.rut, "pass": u.password}),
+        lambda u: ("POST", "auth", "/auth/login", {"rut": u.rut, "password": u.password}),
+    ),
+    "slots": Command("avail.slots", lambda u: ("avail", {"slots": _slots(u)}), _http_slots),
+    "spaces": Command("avail.spaces", lambda u: ("avail", {"spaces": _spaces(u)}), _http_spaces),
+    "create": Command("book.create", lambda u: ("book", _create(u)), _http_create, created=_created_id),
+    "cancel": Command(
+        "book.cancel",
+        lambda u: ("book", {"cancel": u.booking()}),
+        lambda u: ("DELETE", "book", f"/bookings/{u.booking()}", None),
+    ),
+    "approve": Command(
+        "book.approve",
+        lambda u: ("book", {"approve": {"reserva": u.booking(), "estado": u.rng.choice(["aprobada", "rechazada"])}}),
+        lambda u: ("POST", "book", "/bookings/approve", {
+            "id_reserva": u.booking(), "estado": u.rng.choice(["aprobada", "rechazada"]), "id_administrador": 1}),
+    ),
+    "uso": Command(
+        "report.uso",
+        lambda u: ("report", {"uso": _uso(u)}),
+        lambda u: ("POST", "report", "/reports/uso", _uso(u)),
+    ),
+}
+
+
+def parse_mix(value: str) -> List[Tuple[Command, float]]:
+    """Mezcla "comando=peso,..." con los comandos de COMMANDS"""
+    mix = []
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in COMMANDS:
+            raise SystemExit(f"Comando desconocido en --mix: {name} (disponibles: {', '.join(COMMANDS)})")
+        mix.append((COMMANDS[name], float(weight or 1)))
+    return mix
+
+
+def parse_ids(value: str) -> List[int]:
+    """Lista "1,2,3" o rango "1-50" de ids"""
+    if "-" in value:
+        low, high = value.split("-", 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(item) for item in value.split(",")]
+
+
+class Stats:
+    """Latencias y errores por comando"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, latency: float, error: Optional[str] = None):
+        self.latencies.setdefault(name, []).append(latency)
+        if error is not None:
+            errors = self.errors.setdefault(name, {})
+            errors[error] = errors.get(error, 0) + 1
+
+    def overall(self, elapsed: float) -> dict:
+        """Throughput y latencias de todos los comandos juntos"""
+        latencies = sorted(latency for values in self.latencies.values() for latency in values)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else (latencies or [0.0]) * 99
+        return {
+            "requests": len(latencies),
+            "errors": sum(sum(kinds.values()) for kinds in self.errors.values()),
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": quantiles[49] * 1000,
+            "p95_ms": quantiles[94] * 1000,
+            "p99_ms": quantiles[98] * 1000,
+        }
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        result = {}
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            result[name] = {
+                "requests": len(latencies),
+                "errors": sum(self.errors.get(name, {}).values()),
+                "error_kinds": self.errors.get(name, {}),
+                "throughput": len(latencies) / elapsed,
+                "p50_ms": quantiles[49] * 1000,
+                "p95_ms": quantiles[94] * 1000,
+                "p99_ms": quantiles[98] * 1000,
+                "max_ms": latencies[-1] * 1000,
+            }
+        return result
+
+
+class BusTarget:
+    """Comandos enviados al Bus de Servicios con el cliente asyncio"""
+
+    def __init__(self, host: str, port: int, connections: int, timeout: float, codec: str):
+        # Sin reintentos: cada latencia medida corresponde a una sola petición
+        self.client = AsyncSOAClient(host, port, connections=connections, timeout=timeout,
+                                     retries=0, codec=codec)
+
+    async def execute(self, command: Command, user: VirtualUser) -> Any:
+        service_code, data = command.soa(user)
+        return await self.client.request(service_code, data)
+
+    async def close(self):
+        await self.client.close()
+
+
+class HttpTarget:
+    """Comandos enviados directamente a los endpoints FastAPI de cada servicio"""
+
+    def __init__(self, host: str, users: int, timeout: float):
+        self.host = host
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=users, thread_name_prefix="load-http")
+        self.sessions: Dict[int, requests.Session] = {}  # Una sesión keep-alive por usuario virtual
+
+    def _send(self, user: VirtualUser, method: str, service: str, path: str, body: Optional[dict]) -> Any:
+        session = self.sessions.setdefault(user.index, requests.Session())
+        url = f"http://{self.host}:{HTTP_PORTS[service]}{path}"
+        response = session.request(method, url, json=body, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise HttpStatusError(response.status_code)
+        return response.json()
+
+    async def execute(self, command: Command, user: VirtualUser) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._send, user, *command.http(user))
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        for session in self.sessions.values():
+            session.close()
+
+
+class HttpStatusError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def error_kind(error: Exception) -> str:
+    if isinstance(error, HttpStatusError):
+        return f"http_{error.status}"
+    return type(error).__name__
+
+
+async def virtual_user(user: VirtualUser, target, mix: List[Tuple[Command, float]], stats: Stats,
+                       delay: float, stop_at: float, think: float):
+    commands = [command for command, _ in mix]
+    weights = [weight for _, weight in mix]
+    await asyncio.sleep(delay)  # Rampa de subida
+    while time.perf_counter() < stop_at:
+        command = user.rng.choices(commands, weights)[0]
+        start = time.perf_counter()
+        try:
+            result = await target.execute(command, user)
+        except (SOAClientError, requests.RequestException, HttpStatusError) as e:
+            stats.record(command.name, time.perf_counter() - start, error_kind(e))
+        else:
+            stats.record(command.name, time.perf_counter() - start)
+            if command.created is not None:
+                booking_id = command.created(result)
+                if booking_id is not None:
+                    user.bookings.append(booking_id)
+        if think:
+            await asyncio.sleep(user.rng.expovariate(1 / think))  # Espera exponencial con media `think`
+
+
+async def run_load(target, args) -> Tuple[Stats, float]:
+    mix = parse_mix(args.mix)
+    stats = Stats()
+    start = time.perf_counter()
+    stop_at = start + args.ramp_up + args.duration
+    users = [VirtualUser(i, args) for i in range(args.users)]
+    try:
+        await asyncio.gather(*(
+            virtual_user(user, target, mix, stats, args.ramp_up * i / args.users, stop_at, args.think)
+            for i, user in enumerate(users)
+        ))
+    finally:
+        await target.close()
+    return stats, time.perf_counter() - start
+
+
+def stub_service_config(transport: str) -> Dict[str, dict]:
+    """Servicios stub por TCP en localhost o por socket Unix"""
+    config = {}
+    for i, code in enumerate(("auth", "avail", "book", "report")):
+        config[code] = {"host": "127.0.0.1", "port": STUB_BASE_PORT + i}
+        if transport == "unix":
+            config[code]["unix"] = os.path.join(tempfile.gettempdir(), f"soa-stub-{code}.sock")
+    return config
+
+
+def run_stub_bus(mode: str, delay: float, transport: str = "tcp"):
+    """Proceso con el bus y servicios stub (sin base de datos)"""
+    from services.service_bus import AsyncServiceBus, ServiceBus
+
+    os.environ.setdefault("BUS_CACHE_ENABLED", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    config = stub_service_config(transport)
+    start_stub_services(config, delay=delay)
+    bus_class = AsyncServiceBus if mode == "async" else ServiceBus
+    bus_class(host="127.0.0.1", port=STUB_BUS_PORT, service_config=config).start()
+
+
+def print_report(summary: Dict[str, dict], elapsed: float, args, transport: Optional[str] = None):
+    total = sum(item["requests"] for item in summary.values())
+    errors = sum(item["errors"] for item in summary.values())
+    stub = f" (stub, {transport})" if args.stub else ""
+    print(f"Destino: {args.target}{stub}  usuarios: {args.users}  "
+          f"rampa: {args.ramp_up:g}s  espera: {args.think:g}s  duración: {elapsed:.1f}s")
+    print(f"{'comando':<14}{'peticiones':>11}{'errores':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}")
+    for name, item in summary.items():
+        print(f"{name:<14}{item['requests']:>11}{item['errors']:>9}{item['throughput']:>9.1f}"
+              f"{item['p50_ms']:>9.2f}{item['p95_ms']:>9.2f}{item['p99_ms']:>9.2f}{item['max_ms']:>9.2f}")
+    print(f"{'total':<14}{total:>11}{errors:>9}{total / elapsed:>9.1f}")
+    for name, item in summary.items():
+        if item["error_kinds"]:
+            kinds = ", ".join(f"{kind}={count}" for kind, count in sorted(item["error_kinds"].items()))
+            print(f"  errores {name}: {kinds}")
+
+
+def print_comparison(overall: Dict[str, dict]):
+    """Comparar las ejecuciones con cada transporte bus -> servicio"""
+    print("Comparación de transportes bus -> servicio (todos los comandos)")
+    print(f"{'transporte':<12}{'peticiones':>11}{'errores':>9}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for transport, item in overall.items():
+        print(f"{transport:<12}{item['requests']:>11}{item['errors']:>9}{item['throughput']:>10.1f}"
+              f"{item['p50_ms']:>9.2f}{item['p95_ms']:>9.2f}{item['p99_ms']:>9.2f}")
+    baseline = next(iter(overall.values()))
+    for transport, item in list(overall.items())[1:]:
+        print(f"{transport} vs {next(iter(overall))}: throughput {item['throughput'] / baseline['throughput']:.2f}x, "
+              f"p50 {item['p50_ms'] - baseline['p50_ms']:+.3f}ms, p99 {item['p99_ms'] - baseline['p99_ms']:+.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["bus", "http"], default="bus")
+    parser.add_argument("--stub", action="store_true", help="Bus con servicios stub, sin base de datos")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Segundos de trabajo simulado por petición stub")
+    parser.add_argument("--bus-mode", choices=["thread", "async"], default="async", help="Motor del bus en --stub")
+    parser.add_argument("--transport", default="tcp",
+                        help="Transporte bus -> stubs en --stub: tcp, unix o tcp,unix para compararlos")
+    parser.add_argument("--bus-host", default="localhost")
+    parser.add_argument("--bus-port", type=int, default=int(os.getenv("SERVICE_BUS_PORT", "5000")))
+    parser.add_argument("--http-host", default="localhost")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios virtuales concurrentes")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="Segundos hasta tener todos los usuarios activos")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga tras la rampa")
+    parser.add_argument("--think", type=float, default=0.0, help="Espera media entre peticiones de un usuario")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Pesos por comando: " + ", ".join(COMMANDS))
+    parser.add_argument("--connections", type=int, default=8, help="Conexiones del cliente al bus")
+    parser.add_argument("--codec", default="json")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--rut", default=os.getenv("LOAD_TEST_RUT", "11111111-1"))
+    parser.add_argument("--password", default=os.getenv("LOAD_TEST_PASSWORD", "admin123"))
+    parser.add_argument("--user-ids", type=parse_ids, default=parse_ids("1-10"))
+    parser.add_argument("--space-ids", type=parse_ids, default=parse_ids("1-6"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Guardar el resumen en un archivo JSON")
+    args = parser.parse_args()
+
+    if args.stub and args.target == "http":
+        parser.error("--stub solo aplica a --target bus (los endpoints FastAPI necesitan la base de datos)")
+    transports = [transport.strip() for transport in args.transport.split(",") if transport.strip()]
+    if not transports or any(transport not in ("tcp", "unix") for transport in transports):
+        parser.error("--transport acepta tcp, unix o ambos separados por coma")
+    if len(transports) > 1 and not args.stub:
+        parser.error("Comparar transportes requiere --stub (sin él lo define la configuración del bus)")
+
+    runs = {}
+    overall = {}
+    for transport in transports:
+        bus_process = None
+        if args.stub:
+            bus_process = multiprocessing.Process(target=run_stub_bus, daemon=True,
+                                                  args=(args.bus_mode, args.stub_delay, transport))
+            bus_process.start()
+            time.sleep(1.0)
+            args.bus_host, args.bus_port = "127.0.0.1", STUB_BUS_PORT
+
+        if args.target == "bus":
+            target = BusTarget(args.bus_host, args.bus_port, args.connections, args.timeout, args.codec)
+        else:
+            target = HttpTarget(args.http_host, args.users, args.timeout)
+
+        try:
+            stats, elapsed = asyncio.run(run_load(target, args))
+        finally:
+            if bus_process is not None:
+                bus_process.terminate()
+                bus_process.join()
+
+        summary = stats.summary(elapsed)
+        print_report(summary, elapsed, args, transport)
+        runs[transport] = {"elapsed": elapsed, "overall": stats.overall(elapsed), "commands": summary}
+        overall[transport] = runs[transport]["overall"]
+
+    if len(transports) > 1:
+        print_comparison(overall)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": args.target, "stub": args.stub, "users": args.users, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Carriles de prioridad del Bus de Servicios bajo carga pesada
+Un grupo de clientes satura el bus con peticiones lentas a admin (carril bulk) mientras
+otros consultan avail (carril interactive); se mide la latencia de avail con y sin
+carriles (BUS_LANE_SLOTS=0). Con carriles, el p99 de avail debe mantenerse cercano al
+tiempo del propio servicio aunque la cola de admin esté llena.
+Uso: python benchmarks/bench_priority_lanes.py [--bulk 128] [--interactive 8] [--seconds 5] [--mode thread]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import statistics
+import time
+
+from benchmarks.bench_bus_workers import wait_for_port
+from benchmarks.stub_services import start_stub_services
+from services.common.soa_client import AsyncSOAClient
+
+BUS_PORT = 15500
+STUB_BASE_PORT = 15501
+
+
+def run_bus(mode: str, env: dict, fast_delay: float, slow_delay: float):
+    """Proceso del bus con un stub rápido (avail) y uno lento (admin)"""
+    os.environ.update(env)
+    os.environ["BUS_CACHE_ENABLED"] = "0"
+    os.environ["BUS_COALESCE_ENABLED"] = "0"
+    os.environ["LOG_LEVEL"] = "WARNING"
+    from services.service_bus import AsyncServiceBus, ServiceBus
+
+    config = {
+        "avail": {"host": "127.0.0.1", "port": STUB_BASE_PORT},
+        "admin": {"host": "127.0.0.1", "port": STUB_BASE_PORT + 1, "max_in_flight": 0},
+    }
+    start_stub_services({"avail": config["avail"]}, delay=fast_delay)
+    start_stub_services({"admin": config["admin"]}, delay=slow_delay)
+    bus_class = AsyncServiceBus if mode == "async" else ServiceBus
+    bus_class(host="127.0.0.1", port=BUS_PORT, service_config=config).start()
+
+
+async def worker(client: AsyncSOAClient, service_code: str, command: str, counter, deadline: float,
+                 latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.request(service_code, {command: {"n": next(counter)}})
+        if isinstance(response, dict) and "error" in response:
+            errors.append(response["error"])
+        else:
+            latencies.append(time.perf_counter() - start)
+
+
+async def load(args) -> dict:
+    counter = itertools.count()
+    deadline = time.perf_counter() + args.seconds
+    bulk, interactive = [], []
+    errors: list = []
+    options = dict(bus_host="127.0.0.1", bus_port=BUS_PORT, timeout=60.0, retries=0, raise_errors=False)
+    async with AsyncSOAClient(connections=4, **options) as bulk_client, \
+            AsyncSOAClient(connections=2, **options) as interactive_client:
+        await asyncio.gather(
+            *(worker(bulk_client, "admin", "export", counter, deadline, bulk, errors) for _ in range(args.bulk)),
+            *(worker(interactive_client, "avail", "slots", counter, deadline, interactive, errors)
+              for _ in range(args.interactive))
+        )
+    quantiles = statistics.quantiles(interactive, n=100) if len(interactive) > 1 else [float("nan")] * 99
+    return {
+        "avail_rps": len(interactive) / args.seconds,
+        "admin_rps": len(bulk) / args.seconds,
+        "p50": quantiles[49] * 1000,
+        "p95": quantiles[94] * 1000,
+        "p99": quantiles[98] * 1000,
+        "errors": len(errors),
+    }
+
+
+def measure(label: str, env: dict, args) -> dict:
+    bus = multiprocessing.Process(target=run_bus, args=(args.mode, env, args.fast_delay, args.slow_delay), daemon=True)
+    bus.start()
+    try:
+        wait_for_port(BUS_PORT)
+        result = asyncio.run(load(args))
+    finally:
+        bus.terminate()
+        bus.join()
+    print(f"{label:<14}{result['avail_rps']:>10.0f}{result['p50']:>10.2f}{result['p95']:>10.2f}"
+          f"{result['p99']:>10.2f}{result['admin_rps']:>11.0f}{result['errors']:>9}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread")
+    parser.add_argument("--bulk", type=int, default=128, help="Clientes concurrentes de admin (lentos)")
+    parser.add_argument("--interactive", type=int, default=8, help="Clientes concurrentes de avail")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fast-delay", type=float, default=0.002, help="Segundos por petición de avail")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="Segundos por petición de admin")
+    parser.add_argument("--slots", type=int, default=64, help="BUS_LANE_SLOTS en la medición con carriles")
+    parser.add_argument("--bulk-limit", type=int, default=16, help="Cupos máximos del carril bulk (0 = sin límite)")
+    args = parser.parse_args()
+
+    print(f"Bus {args.mode}: {args.bulk} clientes admin ({args.slow_delay * 1000:g}ms) + "
+          f"{args.interactive} clientes avail ({args.fast_delay * 1000:g}ms), {args.seconds:g}s por medición")
+    print(f"{'':<14}{'avail/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'admin/s':>11}{'errores':>9}")
+    measure("sin carriles", {"BUS_LANE_SLOTS": "0"}, args)
+    lanes = {"BUS_LANE_SLOTS": str(args.slots)}
+    if args.bulk_limit:
+        lanes["BUS_LANE_LIMITS"] = f"bulk={args.bulk_limit}"
+    measure("con carriles", lanes, args)
+
+
+if __name__ == "__main__":
+    main()
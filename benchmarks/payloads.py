@@ -0,0 +1,93 @@
+"""
+Payloads representativos del sistema para benchmarks del protocolo SOA
+Imitan las respuestas reales de los servicios BOOK, AVAIL y USER
+"""
+import random
+from datetime import datetime, timedelta
+
+ESTADOS = ["pendiente", "aprobada", "rechazada", "cancelada"]
+ESPACIOS = ["Sala de Estudio A", "Sala de Estudio B", "Cancha de Fútbol", "Cancha de Tenis",
+            "Laboratorio de Computación", "Auditorio Principal"]
+NOMBRES = ["María González", "José Pérez", "Camila Muñoz", "Benjamín Rojas", "Sofía Díaz", "Tomás Soto"]
+
+
+def booking_list(count: int = 200, seed: int = 1) -> list:
+    """Lista de reservas como la de /bookings (ReservaResponse)"""
+    rng = random.Random(seed)
+    base = datetime(2026, 3, 2, 8, 0)
+    result = []
+    for i in range(count):
+        inicio = base + timedelta(days=rng.randint(0, 120), hours=rng.randint(0, 10))
+        result.append({
+            "id": i + 1,
+            "id_usuario": rng.randint(1, 5000),
+            "id_espacio": rng.randint(1, len(ESPACIOS)),
+            "fecha_inicio": inicio.isoformat(),
+            "fecha_fin": (inicio + timedelta(hours=2)).isoformat(),
+            "estado": rng.choice(ESTADOS),
+            "motivo": "Reunión de proyecto de título",
+            "fecha_solicitud": (inicio - timedelta(days=3)).isoformat(),
+            "recurrente": False,
+            "espacio_nombre": rng.choice(ESPACIOS),
+            "usuario_nombre": rng.choice(NOMBRES),
+        })
+    return result
+
+
+def availability_slots() -> dict:
+    """Respuesta de avail slots para un día operativo"""
+    return {"slots": [
+        {"inicio": f"{h:02d}:00", "fin": f"{h + 2:02d}:00", "disponible": h % 3 != 0}
+        for h in range(8, 20)
+    ]}
+
+
+def available_spaces() -> dict:
+    """Respuesta de avail spaces"""
+    return {"espacios": [
+        {"id": i + 1, "nombre": nombre, "disponible": i % 2 == 0}
+        for i, nombre in enumerate(ESPACIOS)
+    ]}
+
+
+def user_list(count: int = 500, seed: int = 2) -> list:
+    """Lista de usuarios como la de /users (UsuarioResponse)"""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i + 1,
+            "rut": f"{rng.randint(10_000_000, 25_000_000)}-{rng.randint(0, 9)}",
+            "correo_institucional": f"usuario{i + 1}@mail.udp.cl",
+            "nombre": rng.choice(NOMBRES),
+            "tipo_usuario": "estudiante" if i % 20 else "administrador",
+            "activo": True,
+            "fecha_creacion": datetime(2025, 3, 1, 9, 30).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def audit_log(count: int = 100, seed: int = 3) -> list:
+    """Log de auditoría como el de /admin/audit (AuditoriaResponse, últimas 100 acciones)"""
+    rng = random.Random(seed)
+    base = datetime(2026, 3, 2, 8, 0)
+    return [
+        {
+            "id": count - i,
+            "tabla_afectada": rng.choice(["reservas", "configuraciones", "espacios"]),
+            "accion": rng.choice(["crear", "actualizar", "cancelar"]),
+            "id_registro": rng.randint(1, 5000),
+            "fecha_accion": (base - timedelta(minutes=7 * i)).isoformat(),
+            "usuario_id": rng.randint(1, 5000),
+        }
+        for i in range(count)
+    ]
+
+
+PAYLOADS = {
+    "reservas (200)": booking_list,
+    "slots": availability_slots,
+    "espacios": available_spaces,
+    "usuarios (500)": user_list,
+    "auditoría (100)": audit_log,
+}
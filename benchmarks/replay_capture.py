@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Reproducción de capturas de tráfico del Bus de Servicios (BUS_CAPTURE_FILE)
+Reenvía los mensajes capturados a un bus a la velocidad original (1x), acelerada (Nx) o
+máxima (--speed 0), con una conexión por cada conexión capturada y en su mismo orden:
+las peticiones con correlation ID se envían sin esperar respuesta, como en el original,
+y las clásicas esperan la respuesta anterior. Compara las latencias obtenidas con las
+registradas (la registrada se mide dentro del bus; la nueva incluye la red local).
+Uso: python benchmarks/replay_capture.py captura.bin [captura.1.bin ...] [--speed 1] [--port 5000]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from services.common.soa_protocol import (
+    FrameError, read_frame_async, split_codec, split_compression, split_correlation, split_frame
+)
+from services.common.traffic_capture import OPEN, REQUEST, RESPONSE, read_capture
+
+
+class Exchange:
+    """Una petición capturada con su latencia registrada y la obtenida al reproducirla"""
+
+    def __init__(self, timestamp: float, frame: bytes):
+        self.timestamp = timestamp
+        self.frame = frame
+        self.correlation_id: Optional[int] = None
+        self.service = "invalid"
+        try:
+            self.correlation_id, message = split_correlation(frame)
+            _, message = split_compression(split_codec(message)[1])
+            self.service = split_frame(message)[0].strip()
+        except (FrameError, ValueError):
+            pass  # Se reproduce igual: el bus responderá el mismo error
+        self.recorded: Optional[float] = None
+        self.replayed: Optional[float] = None
+        self.sent_at = 0.0
+        self.answered: Optional[asyncio.Future] = None
+
+
+def load_captures(paths: List[str]) -> List[List[Exchange]]:
+    """Peticiones agrupadas por conexión, con la latencia registrada de cada una"""
+    connections: Dict[tuple, List[Exchange]] = {}
+    pending: Dict[tuple, Dict[Optional[int], Deque[Exchange]]] = {}
+    current: Dict[tuple, tuple] = {}  # (archivo, id de conexión) -> conexión lógica vigente
+    sessions = 0
+    for index, path in enumerate(paths):
+        for record in read_capture(path):
+            raw = (index, record.connection)
+            if record.kind == OPEN or raw not in current:
+                sessions += 1
+                current[raw] = (index, record.connection, sessions)
+            key = current[raw]
+            if record.kind == REQUEST:
+                exchange = Exchange(record.timestamp, record.frame)
+                connections.setdefault(key, []).append(exchange)
+                pending.setdefault(key, {}).setdefault(exchange.correlation_id, deque()).append(exchange)
+            elif record.kind == RESPONSE:
+                waiting = pending.get(key, {}).get(record.correlation_id)
+                if waiting:
+                    exchange = waiting.popleft()
+                    exchange.recorded = record.timestamp - exchange.timestamp
+    return [exchanges for exchanges in connections.values() if exchanges]
+
+
+async def read_responses(reader: asyncio.StreamReader, waiting: Dict[Optional[int], Deque[Exchange]]):
+    while True:
+        try:
+            frame = await read_frame_async(reader)
+        except (asyncio.IncompleteReadError, FrameError, OSError):
+            return
+        correlation_id, _ = split_correlation(frame)
+        queue = waiting.get(correlation_id)
+        if not queue:
+            continue  # Respuesta sin petición conocida
+        exchange = queue.popleft()
+        exchange.replayed = time.perf_counter() - exchange.sent_at
+        exchange.answered.set_result(None)
+
+
+async def replay_connection(exchanges: List[Exchange], args, start: float, origin: float):
+    """Reproducir una conexión capturada respetando su orden y sus tiempos (escalados)"""
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    waiting: Dict[Optional[int], Deque[Exchange]] = {}
+    reader_task = asyncio.create_task(read_responses(reader, waiting))
+    previous: Optional[Exchange] = None  # Última petición clásica: hay que esperar su respuesta
+    try:
+        for exchange in exchanges:
+            if args.speed > 0:
+                delay = start + (exchange.timestamp - origin) / args.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if exchange.correlation_id is None and previous is not None:
+                await asyncio.wait([previous.answered], timeout=args.timeout)
+            exchange.answered = loop.create_future()
+            waiting.setdefault(exchange.correlation_id, deque()).append(exchange)
+            exchange.sent_at = time.perf_counter()
+            writer.write(exchange.frame)
+            await writer.drain()
+            if exchange.correlation_id is None:
+                previous = exchange
+        await asyncio.wait([exchange.answered for exchange in exchanges], timeout=args.timeout)
+    finally:
+        reader_task.cancel()
+        writer.close()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(connections: List[List[Exchange]]) -> Dict[str, dict]:
+    by_service: Dict[str, List[Exchange]] = {}
+    for exchanges in connections:
+        for exchange in exchanges:
+            by_service.setdefault(exchange.service, []).append(exchange)
+
+    summary = {}
+    for service, exchanges in sorted(by_service.items()):
+        recorded = [e.recorded for e in exchanges if e.recorded is not None]
+        replayed = [e.replayed for e in exchanges if e.replayed is not None]
+        deltas = [e.replayed - e.recorded for e in exchanges if e.recorded is not None and e.replayed is not None]
+        item = {"requests": len(exchanges), "unanswered": len(exchanges) - len(replayed)}
+        for fraction, name in ((0.5, "p50"), (0.95, "p95"), (0.99, "p99")):
+            item[f"recorded_{name}_ms"] = percentile(recorded, fraction) * 1000
+            item[f"replayed_{name}_ms"] = percentile(replayed, fraction) * 1000
+        item["delta_p50_ms"] = percentile(deltas, 0.5) * 1000
+        item["delta_p95_ms"] = percentile(deltas, 0.95) * 1000
+        summary[service] = item
+    return summary
+
+
+def print_report(summary: Dict[str, dict], connections: List[List[Exchange]], span: float, elapsed: float, args):
+    total = sum(item["requests"] for item in summary.values())
+    unanswered = sum(item["unanswered"] for item in summary.values())
+    speed = "máxima" if args.speed <= 0 else f"{args.speed:g}x"
+    print(f"Conexiones: {len(connections)}  peticiones: {total}  sin respuesta: {unanswered}  velocidad: {speed}")
+    print(f"Duración registrada: {span:.2f}s  reproducción: {elapsed:.2f}s")
+    print(f"{'servicio':<10}{'peticiones':>11}"
+          f"{'reg p50':>9}{'rep p50':>9}{'reg p95':>9}{'rep p95':>9}{'reg p99':>9}{'rep p99':>9}"
+          f"{'Δ p50':>9}{'Δ p95':>9}   (ms)")
+    for service, item in summary.items():
+        print(f"{service:<10}{item['requests']:>11}"
+              f"{item['recorded_p50_ms']:>9.2f}{item['replayed_p50_ms']:>9.2f}"
+              f"{item['recorded_p95_ms']:>9.2f}{item['replayed_p95_ms']:>9.2f}"
+              f"{item['recorded_p99_ms']:>9.2f}{item['replayed_p99_ms']:>9.2f}"
+              f"{item['delta_p50_ms']:>+9.2f}{item['delta_p95_ms']:>+9.2f}")
+
+    if args.top:
+        paired = [e for exchanges in connections for e in exchanges if e.recorded is not None and e.replayed is not None]
+        paired.sort(key=lambda e: e.replayed - e.recorded, reverse=True)
+        print(f"Mayores diferencias (top {args.top}):")
+        for exchange in paired[:args.top]:
+            print(f"  {exchange.service:<8} registrada {exchange.recorded * 1000:9.2f}ms  "
+                  f"reproducida {exchange.replayed * 1000:9.2f}ms  {exchange.frame[:60]!r}")
+
+
+async def replay(connections: List[List[Exchange]], args) -> float:
+    origin = min(exchanges[0].timestamp for exchanges in connections)
+    start = time.perf_counter()
+    await asyncio.gather(*(replay_connection(exchanges, args, start, origin) for exchanges in connections))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="Archivos de captura (uno por worker si se usó --workers)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_BUS_PORT", "5000")))
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad; 0 = sin esperas")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Espera máxima por una respuesta")
+    parser.add_argument("--top", type=int, default=10, help="Peticiones con mayor diferencia a listar")
+    parser.add_argument("--json", help="Guardar el resumen en un archivo JSON")
+    args = parser.parse_args()
+
+    connections = load_captures(args.captures)
+    if not connections:
+        raise SystemExit("La captura no contiene peticiones")
+    timestamps = [exchange.timestamp for exchanges in connections for exchange in exchanges]
+    span = max(timestamps) - min(timestamps)
+
+    elapsed = asyncio.run(replay(connections, args))
+    summary = summarize(connections)
+    print_report(summary, connections, span, elapsed, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"speed": args.speed, "span": span, "elapsed": elapsed, "services": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
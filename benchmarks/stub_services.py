@@ -0,0 +1,79 @@
+"""
+Servicios stub para benchmarks del Bus de Servicios SOA
+Responden cada mensaje SOA con un eco (o con un payload fijo), sin base de datos
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List
+
+from services.common.soa_protocol import SOAProtocol, read_frame
+
+
+class StubHandler(socketserver.BaseRequestHandler):
+    """Atiende mensajes SOA sobre una conexión persistente"""
+
+    def handle(self):
+        while True:
+            try:
+                frame = read_frame(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            service_code, data = self.server.protocol.parse_message(frame.decode('utf-8'))
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            result = {"ok": True, "echo": data} if self.server.payload is None else self.server.payload
+            response = self.server.protocol.format_message(service_code, result, extended=True)
+            self.request.sendall(response.encode('utf-8'))
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024  # El pool del bus abre muchas conexiones a la vez
+
+    def __init__(self, address, delay: float = 0.0, payload: Any = None):
+        super().__init__(address, StubHandler)
+        self.delay = delay
+        self.payload = payload
+        self.protocol = SOAProtocol()
+
+
+class UnixStubServer(socketserver.ThreadingUnixStreamServer):
+    """Stub que escucha en un socket Unix (servicio en el mismo equipo que el bus)"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, path: str, delay: float = 0.0, payload: Any = None):
+        if os.path.exists(path):
+            os.unlink(path)  # Socket de una ejecución anterior
+        super().__init__(path, StubHandler)
+        self.delay = delay
+        self.payload = payload
+        self.protocol = SOAProtocol()
+
+
+def start_stub_services(service_config: Dict[str, dict], delay: float = 0.0,
+                        payload: Any = None) -> List[socketserver.BaseServer]:
+    """Levantar un stub por cada servicio de service_config en hilos de fondo"""
+    servers = []
+    for config in service_config.values():
+        if config.get("unix"):
+            server = UnixStubServer(config["unix"], delay=delay, payload=payload)
+        else:
+            server = StubServer((config["host"], config["port"]), delay=delay, payload=payload)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def stop_stub_services(servers: List[socketserver.BaseServer]):
+    """Detener los stubs levantados"""
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -1,36 +1,301 @@
 """
 Configuración de base de datos para el Sistema de Reservación UDP
+El pool de conexiones se ajusta por servicio: cada variable DB_* puede redefinirse
+con el prefijo del servicio (ej. BOOK_DB_POOL_SIZE=20 sólo para reservas). Los eventos
+del pool (espera de checkout, conexiones, overflow, invalidaciones) se registran en el
+registro que fije set_pool_metrics (los servicios usan services.common.db_metrics).
+Junto al engine síncrono hay un engine asíncrono (asyncpg) con la misma configuración:
+los endpoints async def que usan get_async_db no bloquean el event loop mientras esperan
+a la base de datos. Se crea en la primera sesión asíncrona, así que los procesos que sólo
+usan el engine síncrono (setup_database.py, servicios sin endpoints async) no requieren asyncpg.
 """
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuración de la base de datos
 DATABASE_URL = os.getenv(
-    "DATABASE_URL", 
+    "DATABASE_URL",
     "postgresql://postgres:xd@localhost:5432/reservas_udp"
 )
 
-# Crear engine de SQLAlchemy con configuración de encoding
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={
-        "client_encoding": "utf8",
-        "options": "-c client_encoding=utf8"
-    },
-    pool_pre_ping=True
-)
+# Driver asíncrono por motor de base de datos (ASYNC_DATABASE_URL lo fija explícitamente)
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+class _NoPoolMetrics:
+    """Registro nulo: sin set_pool_metrics los eventos del pool no se miden"""
+
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+
+# Destino de los eventos del pool: cualquier objeto con inc() y observe() (etiquetas service y engine)
+pool_metrics = _NoPoolMetrics()
+
+
+def set_pool_metrics(registry):
+    """Registrar los eventos del pool de los engines del proceso (actuales y futuros) en `registry`"""
+    global pool_metrics
+    pool_metrics = registry
+
+
+def db_setting(name: str, service: Optional[str] = None, default: str = "") -> str:
+    """Valor de DB_<name>, redefinible por servicio con <SERVICIO>_DB_<name>"""
+    if service:
+        value = os.getenv(f"{service.upper()}_{name}")
+        if value:
+            return value
+    return os.getenv(name) or default
+
+
+def parse_pre_ping(policy: str) -> Optional[float]:
+    """
+    Política de ping previo al checkout: 'always' (0), 'never' (None) o los segundos
+    de inactividad a partir de los cuales se verifica la conexión (ej. '30')
+    """
+    policy = policy.strip().lower()
+    if policy in ("always", "1", "true"):
+        return 0.0
+    if policy in ("never", "0", "false"):
+        return None
+    idle = float(policy)
+    if idle < 0:
+        raise ValueError(f"DB_PRE_PING inválido: {policy!r}")
+    return idle
+
+
+class _InstrumentedPool:
+    """Mide la espera de cada checkout (logging_name = servicio)"""
+
+    engine_kind = "sync"
+
+    def _do_get(self):
+        labels = {"service": self._orig_logging_name or "default", "engine": self.engine_kind}
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.inc("pool_timeouts_total", **labels)
+            raise
+        finally:
+            pool_metrics.observe("pool_checkout_wait_seconds", time.perf_counter() - start, **labels)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    """QueuePool del engine síncrono"""
+
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.QueuePool"  # Mismo logger (y nivel) que el pool original
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    """Pool del engine asíncrono"""
+
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.AsyncAdaptedQueuePool"
+    engine_kind = "async"
+
+
+def _instrument(engine: Engine, service: str, kind: str, pre_ping_idle: Optional[float]):
+    """Registrar los eventos del pool (sobreviven a engine.dispose()); engine es el síncrono subyacente"""
+    labels = {"service": service, "engine": kind}
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, record):
+        record.info["returned"] = time.monotonic()
+        pool_metrics.inc("pool_connects_total", **labels)
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, record, proxy):
+        pool_metrics.inc("pool_checkouts_total", **labels)
+        pool = engine.pool
+        if pool.checkedout() > pool.size():
+            pool_metrics.inc("pool_overflow_checkouts_total", **labels)
+        # Ping sólo de conexiones inactivas más de pre_ping_idle segundos ('always' usa pool_pre_ping)
+        if pre_ping_idle:
+            if time.monotonic() - record.info.get("returned", 0.0) > pre_ping_idle:
+                try:
+                    engine.dialect.do_ping(dbapi_connection)
+                except Exception as e:
+                    pool_metrics.inc("pool_pre_pings_total", result="failed", **labels)
+                    raise exc.DisconnectionError(f"La conexión no respondió al ping: {e}")  # El pool reintenta
+                pool_metrics.inc("pool_pre_pings_total", result="ok", **labels)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, record):
+        record.info["returned"] = time.monotonic()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, record, exception):
+        pool_metrics.inc("pool_invalidations_total", soft="false", **labels)
+        logger.warning("Conexión de %s (%s) invalidada: %s", service, kind, exception)
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, record, exception):
+        pool_metrics.inc("pool_invalidations_total", soft="true", **labels)
+
+
+def _pool_options(service: Optional[str]) -> dict:
+    return {
+        "pool_logging_name": (service or "default").lower(),
+        "pool_size": int(db_setting("DB_POOL_SIZE", service, "5")),
+        "max_overflow": int(db_setting("DB_MAX_OVERFLOW", service, "10")),
+        "pool_timeout": float(db_setting("DB_POOL_TIMEOUT", service, "30")),
+        "pool_recycle": int(db_setting("DB_POOL_RECYCLE", service, "-1")),
+    }
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    """URL del engine asíncrono: ASYNC_DATABASE_URL o la misma base con su driver asíncrono"""
+    if os.getenv("ASYNC_DATABASE_URL"):
+        return os.getenv("ASYNC_DATABASE_URL")
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Sin driver asíncrono para {backend}; defina ASYNC_DATABASE_URL")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_db_engine(service: Optional[str] = None, url: str = DATABASE_URL) -> Engine:
+    """
+    Crear el engine con el pool configurado para un servicio
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (s), DB_POOL_RECYCLE (s, -1 = nunca),
+    DB_STATEMENT_TIMEOUT (ms, 0 = sin límite) y DB_PRE_PING (always, never o segundos de inactividad)
+    """
+    options = _pool_options(service)
+    pre_ping_idle = parse_pre_ping(db_setting("DB_PRE_PING", service, "always"))
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        server_options = "-c client_encoding=utf8"
+        statement_timeout = int(db_setting("DB_STATEMENT_TIMEOUT", service, "0"))
+        if statement_timeout > 0:
+            server_options += f" -c statement_timeout={statement_timeout}"
+        connect_args = {"client_encoding": "utf8", "options": server_options}
+
+    # Crear engine de SQLAlchemy con configuración de encoding
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=InstrumentedQueuePool,
+        pool_pre_ping=pre_ping_idle == 0.0,
+        **options
+    )
+    _instrument(engine, options["pool_logging_name"], "sync", pre_ping_idle)
+    return engine
+
+
+def create_async_db_engine(service: Optional[str] = None, url: str = DATABASE_URL) -> AsyncEngine:
+    """Crear el engine asíncrono con el mismo pool, statement_timeout y política de ping del servicio"""
+    options = _pool_options(service)
+    pre_ping_idle = parse_pre_ping(db_setting("DB_PRE_PING", service, "always"))
+    url = async_database_url(url)
+    connect_args = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        settings = {"client_encoding": "utf8"}
+        statement_timeout = int(db_setting("DB_STATEMENT_TIMEOUT", service, "0"))
+        if statement_timeout > 0:
+            settings["statement_timeout"] = str(statement_timeout)
+        connect_args = {"server_settings": settings}
+
+    engine = create_async_engine(
+        url,
+        connect_args=connect_args,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_pre_ping=pre_ping_idle == 0.0,
+        **options
+    )
+    _instrument(engine.sync_engine, options["pool_logging_name"], "async", pre_ping_idle)
+    return engine
+
+
+engine = create_db_engine()
+async_engine: Optional[AsyncEngine] = None  # Se crea en la primera sesión asíncrona (get_async_engine)
+_engine_service: Optional[str] = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine() -> AsyncEngine:
+    """Engine asíncrono del proceso, creado en el primer uso con la configuración del servicio"""
+    global async_engine
+    if async_engine is None:
+        with _async_engine_lock:
+            if async_engine is None:
+                async_engine = create_async_db_engine(_engine_service)
+                AsyncSessionLocal.configure(bind=async_engine)
+    return async_engine
+
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker que crea el engine asíncrono al abrir la primera sesión"""
+
+    def __call__(self, **local_kw) -> AsyncSession:
+        if async_engine is None:
+            get_async_engine()
+        return super().__call__(**local_kw)
+
 
 # Crear sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sesión asíncrona: expire_on_commit=False porque en async no hay carga perezosa tras el commit
+AsyncSessionLocal = _LazyAsyncSessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base para los modelos
 Base = declarative_base()
 
+
+def current_pools() -> Iterator[Tuple[str, Pool]]:
+    """Pools de los engines actuales del proceso: (sync|async, pool); el asíncrono sólo si ya se creó"""
+    yield "sync", engine.pool
+    if async_engine is not None:
+        yield "async", async_engine.sync_engine.pool
+
+
+def configure_engine(service: str) -> Engine:
+    """Reemplazar los engines del proceso por unos con la configuración del servicio"""
+    global engine, async_engine, _engine_service
+    _engine_service = service
+    previous, engine = engine, create_db_engine(service)
+    SessionLocal.configure(bind=engine)
+    previous.dispose()
+    with _async_engine_lock:
+        previous_async, async_engine = async_engine, None
+        if previous_async is not None:
+            async_engine = create_async_db_engine(service)
+            AsyncSessionLocal.configure(bind=async_engine)
+            previous_async.sync_engine.dispose()  # Aún sin conexiones: no requiere event loop
+    return engine
+
+
+def pool_status() -> dict:
+    """Estado actual de los pools del proceso, por engine"""
+    return {
+        kind: {
+            "service": pool.logging_name,
+            "size": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "timeout": pool.timeout(),
+        }
+        for kind, pool in current_pools()
+    }
+
 def get_db():
     """Función para obtener una sesión de base de datos"""
     db = SessionLocal()
@@ -39,7 +304,13 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    """Inicializar la base de datos"""
-    Base.metadata.create_all(bind=engine)
+async def get_async_db():
+    """Función para obtener una sesión asíncrona de base de datos"""
+    async with AsyncSessionLocal() as db:
+        yield db
 
+def init_db(service: Optional[str] = None):
+    """Inicializar la base de datos (con el pool del servicio, si se indica)"""
+    if service:
+        configure_engine(service)
+    Base.metadata.create_all(bind=engine)
@@ -124,4 +124,17 @@ CREATE INDEX idx_espacios_tipo ON espacios(tipo);
 CREATE INDEX idx_incidencias_estado ON incidencias(estado);
 CREATE INDEX idx_auditoria_fecha ON auditoria(fecha_accion);
 
+-- Índices del orden de los listados paginados por keyset (fecha, id); las fechas NULL se ordenan como la
+-- mínima con la misma expresión que database/models.py (fecha_orden)
+CREATE INDEX IF NOT EXISTS idx_reservas_solicitud_id
+    ON reservas((COALESCE(fecha_solicitud, '0001-01-01 00:00:00.000000')), id_reserva);
+CREATE INDEX IF NOT EXISTS idx_reservas_usuario_solicitud
+    ON reservas(id_usuario, (COALESCE(fecha_solicitud, '0001-01-01 00:00:00.000000')), id_reserva);
+CREATE INDEX IF NOT EXISTS idx_incidencias_reporte_id
+    ON incidencias((COALESCE(fecha_reporte, '0001-01-01 00:00:00.000000')), id_incidencia);
+CREATE INDEX IF NOT EXISTS idx_notificaciones_creacion_id
+    ON notificaciones((COALESCE(fecha_creacion, '0001-01-01 00:00:00.000000')), id_notificacion);
+CREATE INDEX IF NOT EXISTS idx_auditoria_fecha_id
+    ON auditoria((COALESCE(fecha_accion, '0001-01-01 00:00:00.000000')), id_auditoria);
+
 ALTER TABLE usuarios ADD COLUMN IF NOT EXISTS password_hash VARCHAR(255);
@@ -1,11 +1,20 @@
 """
 Modelos de base de datos para el Sistema de Reservación UDP
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Time, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Time, ForeignKey, JSON, Index, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db_config import Base
 
+# Fecha con que se ordenan las filas sin fecha en los listados paginados: la mínima, así quedan al final
+# en orden descendente. Es el formato con que SQLite guarda las fechas, y el mismo texto va en los índices
+# y en las consultas (PostgreSQL sólo usa un índice de expresión si coincide).
+FECHA_NULA = literal_column("'0001-01-01 00:00:00.000000'")
+
+def fecha_orden(column):
+    """Fecha de orden de un listado paginado: las fechas NULL se ordenan como FECHA_NULA"""
+    return func.coalesce(column, FECHA_NULA)
+
 class Usuario(Base):
     __tablename__ = "usuarios"
     
@@ -63,6 +72,12 @@ class Reserva(Base):
     administrador_aprobador = relationship("Usuario", foreign_keys=[id_administrador_aprobador])
     notificaciones = relationship("Notificacion", back_populates="reserva")
 
+    # Índices del orden de los listados paginados (keyset, ver database/queries.py)
+    __table_args__ = (
+        Index("idx_reservas_solicitud_id", fecha_orden(fecha_solicitud), id_reserva),
+        Index("idx_reservas_usuario_solicitud", id_usuario, fecha_orden(fecha_solicitud), id_reserva),
+    )
+
 class Configuracion(Base):
     __tablename__ = "configuraciones"
     
@@ -93,6 +108,8 @@ class Incidencia(Base):
     usuario_reporta = relationship("Usuario", foreign_keys=[id_usuario_reporta], back_populates="incidencias_reportadas")
     usuario_resuelve = relationship("Usuario", foreign_keys=[id_usuario_resuelve], back_populates="incidencias_resueltas")
 
+    __table_args__ = (Index("idx_incidencias_reporte_id", fecha_orden(fecha_reporte), id_incidencia),)
+
 class Auditoria(Base):
     __tablename__ = "auditoria"
     
@@ -108,6 +125,8 @@ class Auditoria(Base):
     # Relaciones
     usuario = relationship("Usuario", back_populates="auditorias")
 
+    __table_args__ = (Index("idx_auditoria_fecha_id", fecha_orden(fecha_accion), id_auditoria),)
+
 class Notificacion(Base):
     __tablename__ = "notificaciones"
     
@@ -125,3 +144,5 @@ class Notificacion(Base):
     # Relaciones
     reserva = relationship("Reserva", back_populates="notificaciones")
 
+    __table_args__ = (Index("idx_notificaciones_creacion_id", fecha_orden(fecha_creacion), id_notificacion),)
+
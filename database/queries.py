@@ -0,0 +1,314 @@
+"""
+Consultas de listados para los servicios del Sistema de Reservación UDP
+Cada listado selecciona sólo las columnas de su respuesta y trae los nombres relacionados
+(espacio, usuario) con joins explícitos en la misma consulta, así un listado cuesta un
+número fijo de consultas sin importar cuántas filas tenga. Las filas se serializan
+directo a JSON, sin construir un objeto ORM ni un modelo Pydantic por fila.
+Los listados grandes se paginan por keyset: el cursor opaco guarda los valores de las
+columnas de orden de la última fila entregada y la página siguiente empieza justo
+después, usando el índice de esas columnas en vez de un OFFSET que recorre lo ya leído.
+Sólo se pagina si el cliente pide cursor o limit: sin ellos el listado se entrega completo,
+como antes de paginar. Las fechas de orden que admiten NULL se ordenan con fecha_orden
+(coalesce a la fecha mínima), así una fila sin fecha no corta la paginación.
+Las exportaciones completas (NDJSON o CSV) se transmiten mientras se leen: un cursor del
+servidor entrega las filas por lotes de EXPORT_BATCH_SIZE y cada lote se envía apenas llega,
+así la memoria no crece con el total de filas.
+"""
+import base64
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, func, select, tuple_
+
+from .db_config import AsyncSessionLocal
+from .models import FECHA_NULA, Auditoria, Espacio, Incidencia, Notificacion, Reserva, Usuario, fecha_orden
+
+DESCONOCIDO = "Desconocido"  # Nombre cuando el espacio o el usuario relacionado ya no existe
+
+
+def select_reservas(*condiciones) -> Select:
+    """Reservas con los campos de ReservaResponse y los nombres de espacio y usuario"""
+    return select(
+        Reserva.id_reserva.label("id"),
+        Reserva.id_usuario,
+        Reserva.id_espacio,
+        Reserva.fecha_inicio,
+        Reserva.fecha_fin,
+        Reserva.estado,
+        Reserva.motivo,
+        Reserva.fecha_solicitud,
+        Reserva.recurrente,
+        func.coalesce(Espacio.nombre, DESCONOCIDO).label("espacio_nombre"),
+        func.coalesce(Usuario.nombre, DESCONOCIDO).label("usuario_nombre"),
+    ).outerjoin(Espacio, Espacio.id_espacio == Reserva.id_espacio).outerjoin(
+        Usuario, Usuario.id_usuario == Reserva.id_usuario
+    ).where(*condiciones)
+
+
+def select_incidencias(*condiciones) -> Select:
+    """Incidencias con los campos de IncidenciaResponse y los nombres de espacio y usuario que reporta"""
+    return select(
+        Incidencia.id_incidencia.label("id"),
+        Incidencia.id_espacio,
+        Incidencia.tipo_incidencia,
+        Incidencia.descripcion,
+        Incidencia.estado,
+        Incidencia.fecha_reporte,
+        func.coalesce(Espacio.nombre, DESCONOCIDO).label("espacio_nombre"),
+        func.coalesce(Usuario.nombre, DESCONOCIDO).label("usuario_reporta_nombre"),
+    ).outerjoin(Espacio, Espacio.id_espacio == Incidencia.id_espacio).outerjoin(
+        Usuario, Usuario.id_usuario == Incidencia.id_usuario_reporta
+    ).where(*condiciones)
+
+
+def select_usuarios(*condiciones) -> Select:
+    """Usuarios con los campos de UsuarioResponse"""
+    return select(
+        Usuario.id_usuario.label("id"),
+        Usuario.rut,
+        Usuario.correo_institucional,
+        Usuario.nombre,
+        Usuario.tipo_usuario,
+        Usuario.activo,
+        Usuario.fecha_creacion,
+    ).where(*condiciones)
+
+
+def select_espacios(*condiciones) -> Select:
+    """Espacios con los campos de EspacioResponse"""
+    return select(
+        Espacio.id_espacio.label("id"),
+        Espacio.nombre,
+        Espacio.tipo,
+        Espacio.capacidad,
+        Espacio.activo,
+        Espacio.fecha_creacion,
+    ).where(*condiciones)
+
+
+def select_notificaciones(*condiciones) -> Select:
+    """Historial de notificaciones"""
+    return select(
+        Notificacion.id_notificacion.label("id"),
+        Notificacion.tipo_notificacion.label("tipo"),
+        Notificacion.destinatario_email.label("destinatario"),
+        Notificacion.asunto,
+        Notificacion.enviada,
+        Notificacion.fecha_creacion,
+        Notificacion.fecha_envio,
+        Notificacion.id_reserva.label("reserva_id"),
+    ).where(*condiciones)
+
+
+def select_auditoria(*condiciones) -> Select:
+    """Registros de auditoría con los campos de AuditoriaResponse"""
+    return select(
+        Auditoria.id_auditoria.label("id"),
+        Auditoria.tabla_afectada,
+        Auditoria.accion,
+        Auditoria.id_registro,
+        Auditoria.fecha_accion,
+        Auditoria.id_usuario.label("usuario_id"),
+    ).where(*condiciones)
+
+
+def select_calendario(*condiciones) -> Select:
+    """Reservas del calendario de un espacio con el nombre del usuario"""
+    return select(
+        Reserva.id_reserva,
+        Reserva.fecha_inicio,
+        Reserva.fecha_fin,
+        Reserva.estado,
+        func.coalesce(Usuario.nombre, DESCONOCIDO).label("usuario"),
+    ).outerjoin(Usuario, Usuario.id_usuario == Reserva.id_usuario).where(*condiciones)
+
+
+def as_dicts(result) -> List[dict]:
+    """Filas de un resultado (síncrono o ya esperado) como diccionarios"""
+    return [dict(row) for row in result.mappings()]
+
+
+def _encode(value: Any):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Respuesta JSON serializada directamente (FastAPI no valida contra response_model)"""
+    body = json.dumps(content, default=_encode, ensure_ascii=False)
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+# Tamaño de página por defecto y máximo de los listados paginados (parámetro limit)
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    """El cursor no es de este listado o está corrupto"""
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Tamaño de página pedido (también como texto, desde un mensaje SOA), acotado a [1, PAGE_SIZE_MAX]"""
+    return max(1, min(int(limit) if limit else PAGE_SIZE, PAGE_SIZE_MAX))
+
+
+def requested_limit(cursor: Optional[str], limit: Optional[int]) -> Optional[int]:
+    """Filas a pedir: None (el listado completo) si el cliente no pidió cursor ni limit"""
+    return page_size(limit) if cursor or limit else None
+
+
+class Keyset:
+    """
+    Orden único de un listado para paginar por keyset
+    columns son pares (columna, llave de la fila); la última debe ser única (el id).
+    Las fechas que admiten NULL se ordenan con fecha_orden y en el cursor quedan como null.
+    """
+
+    def __init__(self, name: str, *columns: Tuple[Any, str], descending: bool = True):
+        self.name = name
+        self.columns = columns
+        self.descending = descending
+        self.keys = []
+        for column, _ in columns:
+            if column.nullable and column.type.python_type is not datetime:
+                raise ValueError(f"Columna de orden {column} admite NULL y no es fecha")
+            self.keys.append(fecha_orden(column) if column.nullable else column)
+
+    def encode(self, row: dict) -> str:
+        values = [row[key] for _, key in self.columns]
+        payload = json.dumps([self.name] + values, default=_encode, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str) -> list:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(payload, list) or len(payload) != len(self.columns) + 1 or payload[0] != self.name:
+                raise InvalidCursor(f"Cursor inválido para {self.name}")
+            return [self._value(column, value) for (column, _), value in zip(self.columns, payload[1:])]
+        except InvalidCursor:
+            raise
+        except (ValueError, TypeError, NotImplementedError) as e:
+            raise InvalidCursor(f"Cursor inválido: {e}")
+
+    def _value(self, column: Any, value: Any) -> Any:
+        """Valor del cursor con el tipo de su columna (las fechas vienen en ISO 8601)"""
+        python_type = column.type.python_type
+        if value is None and column.nullable:
+            return None
+        if python_type is datetime and isinstance(value, str):
+            return datetime.fromisoformat(value)
+        if python_type is not datetime and isinstance(value, python_type) and not isinstance(value, bool):
+            return value
+        raise InvalidCursor(f"Cursor inválido para {self.name}")
+
+    def apply(self, query: Select, cursor: Optional[str], limit: Optional[int]) -> Select:
+        """
+        Ordenar, saltar hasta después del cursor y pedir una fila extra para saber si hay más
+        (limit None: todas las filas, en el mismo orden)
+        """
+        if cursor:
+            # Una fecha null del cursor se compara con el mismo literal con que se ordena
+            values = [FECHA_NULA if value is None else value for value in self.decode(cursor)]
+            key, after = tuple_(*self.keys), tuple_(*values)
+            query = query.where(key < after if self.descending else key > after)
+        query = query.order_by(*[key.desc() if self.descending else key.asc() for key in self.keys])
+        return query if limit is None else query.limit(limit + 1)
+
+    def page(self, rows: List[dict], limit: Optional[int]) -> Tuple[List[dict], Optional[str]]:
+        """Recortar la fila extra; retorna (filas, cursor siguiente o None si es la última página)"""
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.encode(rows[-1])
+
+
+RESERVAS_KEYSET = Keyset("reservas", (Reserva.fecha_solicitud, "fecha_solicitud"), (Reserva.id_reserva, "id"))
+INCIDENCIAS_KEYSET = Keyset(
+    "incidencias", (Incidencia.fecha_reporte, "fecha_reporte"), (Incidencia.id_incidencia, "id")
+)
+USUARIOS_KEYSET = Keyset("usuarios", (Usuario.id_usuario, "id"), descending=False)
+ESPACIOS_KEYSET = Keyset("espacios", (Espacio.id_espacio, "id"), descending=False)
+NOTIFICACIONES_KEYSET = Keyset(
+    "notificaciones", (Notificacion.fecha_creacion, "fecha_creacion"), (Notificacion.id_notificacion, "id")
+)
+AUDITORIA_KEYSET = Keyset("auditoria", (Auditoria.fecha_accion, "fecha_accion"), (Auditoria.id_auditoria, "id"))
+
+
+def page_response(rows: List[dict], next_cursor: Optional[str]) -> Response:
+    """
+    Página como arreglo JSON (el mismo cuerpo que antes de paginar, para los clientes existentes)
+    con el cursor de la siguiente en el header X-Next-Cursor
+    """
+    return json_response(rows, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
+
+
+def fetch_page(db, keyset: Keyset, query: Select, cursor: Optional[str], limit: Optional[int]):
+    """
+    Ejecutar una página con una sesión síncrona; retorna (filas, cursor siguiente)
+    Sin cursor ni limit retorna el listado completo (clientes que no siguen el cursor)
+    """
+    limit = requested_limit(cursor, limit)
+    return keyset.page(as_dicts(db.execute(keyset.apply(query, cursor, limit))), limit)
+
+
+async def fetch_page_async(db, keyset: Keyset, query: Select, cursor: Optional[str], limit: Optional[int]):
+    """Ejecutar una página con una sesión asíncrona; retorna (filas, cursor siguiente), como fetch_page"""
+    limit = requested_limit(cursor, limit)
+    return keyset.page(as_dicts(await db.execute(keyset.apply(query, cursor, limit))), limit)
+
+
+# Filas por lote de las exportaciones (tamaño del fetch del cursor del servidor)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}  # Starlette agrega el charset
+
+
+def _csv_value(value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_encode, ensure_ascii=False)
+    if isinstance(value, (datetime, date, time, Decimal)):
+        return _encode(value)
+    return value
+
+
+async def _export_chunks(query: Select, formato: str) -> AsyncIterator[str]:
+    """Lotes de la exportación; la sesión vive mientras dura la respuesta y se cierra si el cliente corta"""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if formato == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerow(result.keys())
+            yield buffer.getvalue()  # El encabezado sale antes de la primera fila
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+        else:
+            async for rows in result.mappings().partitions():
+                yield "".join(
+                    json.dumps(dict(row), default=_encode, ensure_ascii=False) + "\n" for row in rows
+                )
+
+
+def export_response(query: Select, formato: str, filename: str) -> StreamingResponse:
+    """Exportación completa de una consulta en NDJSON (una fila JSON por línea) o CSV, transmitida por lotes"""
+    return StreamingResponse(
+        _export_chunks(query, formato),
+        media_type=EXPORT_MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{formato}"'},
+    )
@@ -11,16 +11,23 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, date
-import uvicorn
 
 from database.db_config import get_db, init_db
 from database.models import Configuracion, Auditoria
+from database.queries import AUDITORIA_KEYSET, InvalidCursor, fetch_page, page_response, select_auditoria
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 
 app = FastAPI(title="Servicio de Administración - ADMIN")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("ADMIN")
+init_db("ADMIN")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "ADMIN", registries=[db_metrics])
 
 # Modelos Pydantic
 class ConfigUpdate(BaseModel):
@@ -129,29 +136,25 @@ async def update_config(config_data: ConfigUpdate, db: Session = Depends(get_db)
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+def audit_page(db: Session, fecha: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Página del log de auditoría desde una fecha, más reciente primero; retorna (registros, cursor siguiente)"""
+    query = select_auditoria()
+    
+    if fecha:
+        fecha_parseada = datetime.strptime(fecha, "%Y-%m-%d").date()
+        query = query.where(Auditoria.fecha_accion >= fecha_parseada)
+    
+    return fetch_page(db, AUDITORIA_KEYSET, query, cursor, limit)
+
 @app.get("/admin/audit", response_model=List[AuditoriaResponse])
-async def get_audit_log(fecha: Optional[str] = None, db: Session = Depends(get_db)):
-    """Obtener log de auditoría"""
+async def get_audit_log(fecha: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                        db: Session = Depends(get_db)):
+    """Obtener log de auditoría, más reciente primero; paginado si se pide cursor o limit (X-Next-Cursor)"""
     try:
-        query = db.query(Auditoria)
-        
-        if fecha:
-            fecha_parseada = datetime.strptime(fecha, "%Y-%m-%d").date()
-            query = query.filter(Auditoria.fecha_accion >= fecha_parseada)
-        
-        audit_logs = query.order_by(Auditoria.fecha_accion.desc()).limit(100).all()
-        
-        return [
-            AuditoriaResponse(
-                id=log.id_auditoria,
-                tabla_afectada=log.tabla_afectada,
-                accion=log.accion,
-                id_registro=log.id_registro,
-                fecha_accion=log.fecha_accion,
-                usuario_id=log.id_usuario
-            )
-            for log in audit_logs
-        ]
+        audit_logs, next_cursor = audit_page(db, fecha, cursor, limit)
+        return page_response(audit_logs, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -183,12 +186,12 @@ async def handle_soa_message(message: str):
             
             elif "getaudit" in data and "fecha" in data["getaudit"]:
                 # Consultar auditoría
-                results = await get_audit_log(data["getaudit"]["fecha"], db)
+                results, _ = audit_page(db, data["getaudit"]["fecha"], limit=100)
                 response_data = [
                     {
-                        "accion": log.accion,
-                        "usuario": str(log.usuario_id),
-                        "fecha": log.fecha_accion.isoformat()
+                        "accion": log["accion"],
+                        "usuario": str(log["usuario_id"]),
+                        "fecha": log["fecha_accion"].isoformat()
                     }
                     for log in results
                 ]
@@ -206,7 +209,7 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("admin", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5007)
+    run_service(app, "ADMIN", port=5007)
 
 
 
@@ -10,18 +10,24 @@ from fastapi import FastAPI, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-import uvicorn
 
 from database.db_config import get_db, init_db
 from database.models import Usuario
 from services.common.auth_utils import verify_password, get_password_hash, create_access_token, verify_token
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 from datetime import timedelta
 
 app = FastAPI(title="Servicio de Autenticación - AUTH")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("AUTH")
+init_db("AUTH")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "AUTH", registries=[db_metrics])
 
 # Modelos Pydantic
 class LoginRequest(BaseModel):
@@ -214,5 +220,5 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("auth", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5001)
+    run_service(app, "AUTH", port=5001)
 
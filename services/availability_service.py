@@ -7,21 +7,28 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
-import uvicorn
 
-from database.db_config import get_db, init_db
+from database.db_config import AsyncSessionLocal, get_async_db, init_db
 from database.models import Reserva, Espacio, Configuracion
+from database.queries import as_dicts, json_response, select_calendario
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 
 app = FastAPI(title="Servicio de Disponibilidad - AVAIL")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("AVAIL")
+init_db("AVAIL")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "AVAIL", registries=[db_metrics])
 
 # Modelos Pydantic
 class DisponibilidadRequest(BaseModel):
@@ -59,18 +66,18 @@ class EspacioDisponible(BaseModel):
     capacidad: int
     disponible: bool
 
-def get_configuracion(db: Session) -> Configuracion:
+async def get_configuracion(db: AsyncSession) -> Configuracion:
     """Obtener configuración actual del sistema"""
-    config = db.query(Configuracion).first()
+    config = (await db.execute(select(Configuracion).limit(1))).scalar_one_or_none()
     if not config:
         config = Configuracion()
         db.add(config)
-        db.commit()
-        db.refresh(config)
+        await db.commit()
+        await db.refresh(config)
     return config
 
 @app.post("/availability/check", response_model=DisponibilidadResponse)
-async def check_availability(request: DisponibilidadRequest, db: Session = Depends(get_db)):
+async def check_availability(request: DisponibilidadRequest, db: AsyncSession = Depends(get_async_db)):
     """Verificar disponibilidad de un espacio en un rango de fechas"""
     try:
         # Parsear fechas
@@ -78,7 +85,7 @@ async def check_availability(request: DisponibilidadRequest, db: Session = Depen
         fecha_fin = datetime.fromisoformat(request.fecha_fin.replace('Z', '+00:00'))
         
         # Verificar que el espacio existe
-        espacio = db.query(Espacio).filter(Espacio.id_espacio == request.id_espacio).first()
+        espacio = await db.get(Espacio, request.id_espacio)
         if not espacio:
             raise HTTPException(status_code=404, detail="Espacio no encontrado")
         
@@ -93,7 +100,7 @@ async def check_availability(request: DisponibilidadRequest, db: Session = Depen
             )
         
         # Buscar reservas que se solapen
-        reservas_conflicto = db.query(Reserva).filter(
+        reservas_conflicto = (await db.execute(select(Reserva).where(
             and_(
                 Reserva.id_espacio == request.id_espacio,
                 Reserva.estado.in_(['aprobada', 'pendiente']),
@@ -103,7 +110,7 @@ async def check_availability(request: DisponibilidadRequest, db: Session = Depen
                     and_(Reserva.fecha_inicio >= fecha_inicio, Reserva.fecha_fin <= fecha_fin)
                 )
             )
-        ).all()
+        ))).scalars().all()
         
         conflictos = []
         if reservas_conflicto:
@@ -130,19 +137,19 @@ async def check_availability(request: DisponibilidadRequest, db: Session = Depen
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/availability/slots", response_model=List[SlotDisponible])
-async def get_available_slots(request: HorariosDisponiblesRequest, db: Session = Depends(get_db)):
+async def get_available_slots(request: HorariosDisponiblesRequest, db: AsyncSession = Depends(get_async_db)):
     """Obtener slots horarios disponibles para un espacio en una fecha específica"""
     try:
         # Parsear fecha
         fecha = datetime.fromisoformat(request.fecha).date()
         
         # Verificar que el espacio existe
-        espacio = db.query(Espacio).filter(Espacio.id_espacio == request.id_espacio).first()
+        espacio = await db.get(Espacio, request.id_espacio)
         if not espacio:
             raise HTTPException(status_code=404, detail="Espacio no encontrado")
         
         # Obtener configuración
-        config = get_configuracion(db)
+        config = await get_configuracion(db)
         
         # Generar slots horarios
         hora_actual = datetime.combine(fecha, config.hora_inicio)
@@ -153,7 +160,7 @@ async def get_available_slots(request: HorariosDisponiblesRequest, db: Session =
             slot_fin = hora_actual + timedelta(hours=request.duracion_horas)
             
             # Verificar si el slot está disponible
-            reservas_conflicto = db.query(Reserva).filter(
+            reservas_conflicto = (await db.execute(select(Reserva.id_reserva).where(
                 and_(
                     Reserva.id_espacio == request.id_espacio,
                     Reserva.estado.in_(['aprobada', 'pendiente']),
@@ -163,7 +170,7 @@ async def get_available_slots(request: HorariosDisponiblesRequest, db: Session =
                         and_(Reserva.fecha_inicio >= hora_actual, Reserva.fecha_fin <= slot_fin)
                     )
                 )
-            ).first()
+            ).limit(1))).first()
             
             disponible = reservas_conflicto is None
             
@@ -182,7 +189,7 @@ async def get_available_slots(request: HorariosDisponiblesRequest, db: Session =
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/availability/spaces", response_model=List[EspacioDisponible])
-async def get_available_spaces(request: EspaciosDisponiblesRequest, db: Session = Depends(get_db)):
+async def get_available_spaces(request: EspaciosDisponiblesRequest, db: AsyncSession = Depends(get_async_db)):
     """Obtener espacios disponibles en un rango de fechas"""
     try:
         # Parsear fechas
@@ -190,19 +197,19 @@ async def get_available_spaces(request: EspaciosDisponiblesRequest, db: Session
         fecha_fin = datetime.fromisoformat(request.fecha_fin.replace('Z', '+00:00'))
         
         # Obtener espacios según filtro de tipo
-        query = db.query(Espacio).filter(Espacio.activo == True)
+        query = select(Espacio).where(Espacio.activo == True)
         
         if request.tipo:
             if request.tipo not in ['sala', 'cancha']:
                 raise HTTPException(status_code=400, detail="Tipo debe ser 'sala' o 'cancha'")
-            query = query.filter(Espacio.tipo == request.tipo)
+            query = query.where(Espacio.tipo == request.tipo)
         
-        espacios = query.all()
+        espacios = (await db.execute(query)).scalars().all()
         
         resultado = []
         for espacio in espacios:
             # Verificar si el espacio tiene reservas en ese rango
-            reservas_conflicto = db.query(Reserva).filter(
+            reservas_conflicto = (await db.execute(select(Reserva.id_reserva).where(
                 and_(
                     Reserva.id_espacio == espacio.id_espacio,
                     Reserva.estado.in_(['aprobada', 'pendiente']),
@@ -212,7 +219,7 @@ async def get_available_spaces(request: EspaciosDisponiblesRequest, db: Session
                         and_(Reserva.fecha_inicio >= fecha_inicio, Reserva.fecha_fin <= fecha_fin)
                     )
                 )
-            ).first()
+            ).limit(1))).first()
             
             disponible = reservas_conflicto is None
             
@@ -234,12 +241,12 @@ async def get_space_calendar(
     space_id: int,
     fecha_inicio: str,
     fecha_fin: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener calendario de reservas de un espacio"""
     try:
         # Verificar que el espacio existe
-        espacio = db.query(Espacio).filter(Espacio.id_espacio == space_id).first()
+        espacio = await db.get(Espacio, space_id)
         if not espacio:
             raise HTTPException(status_code=404, detail="Espacio no encontrado")
         
@@ -247,43 +254,33 @@ async def get_space_calendar(
         fecha_inicio_dt = datetime.fromisoformat(fecha_inicio)
         fecha_fin_dt = datetime.fromisoformat(fecha_fin)
         
-        # Obtener reservas del espacio en el rango
-        reservas = db.query(Reserva).filter(
+        # Obtener reservas del espacio en el rango, con el nombre del usuario en la misma consulta
+        calendario = as_dicts(await db.execute(select_calendario(
             and_(
                 Reserva.id_espacio == space_id,
                 Reserva.estado.in_(['aprobada', 'pendiente']),
                 Reserva.fecha_inicio >= fecha_inicio_dt,
                 Reserva.fecha_fin <= fecha_fin_dt
             )
-        ).order_by(Reserva.fecha_inicio).all()
-        
-        calendario = []
-        for reserva in reservas:
-            calendario.append({
-                "id_reserva": reserva.id_reserva,
-                "fecha_inicio": reserva.fecha_inicio.isoformat(),
-                "fecha_fin": reserva.fecha_fin.isoformat(),
-                "estado": reserva.estado,
-                "usuario": reserva.usuario.nombre if reserva.usuario else "Desconocido"
-            })
+        ).order_by(Reserva.fecha_inicio)))
         
-        return {
+        return json_response({
             "espacio": {
                 "id": espacio.id_espacio,
                 "nombre": espacio.nombre,
                 "tipo": espacio.tipo
             },
             "reservas": calendario
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/availability/config")
-async def get_availability_config(db: Session = Depends(get_db)):
+async def get_availability_config(db: AsyncSession = Depends(get_async_db)):
     """Obtener configuración de disponibilidad"""
     try:
-        config = get_configuracion(db)
+        config = await get_configuracion(db)
         
         return {
             "ventana_anticipacion_dias": config.ventana_anticipacion_dias,
@@ -305,70 +302,70 @@ async def handle_soa_message(message: str):
         service_code, data = protocol.parse_message(message)
         
         if service_code.strip() == "avail":
-            db = next(get_db())
+            async with AsyncSessionLocal() as db:
             
-            if "check" in data:
-                # Verificar disponibilidad
-                check_data = data["check"]
-                request = DisponibilidadRequest(
-                    id_espacio=int(check_data["espacio"]),
-                    fecha_inicio=check_data["inicio"],
-                    fecha_fin=check_data["fin"]
-                )
-                result = await check_availability(request, db)
-                response_data = {
-                    "disponible": result.disponible,
-                    "espacio": result.espacio_nombre,
-                    "conflictos": len(result.conflictos)
-                }
+                if "check" in data:
+                    # Verificar disponibilidad
+                    check_data = data["check"]
+                    request = DisponibilidadRequest(
+                        id_espacio=int(check_data["espacio"]),
+                        fecha_inicio=check_data["inicio"],
+                        fecha_fin=check_data["fin"]
+                    )
+                    result = await check_availability(request, db)
+                    response_data = {
+                        "disponible": result.disponible,
+                        "espacio": result.espacio_nombre,
+                        "conflictos": len(result.conflictos)
+                    }
             
-            elif "slots" in data:
-                # Obtener slots disponibles
-                slots_data = data["slots"]
-                request = HorariosDisponiblesRequest(
-                    id_espacio=int(slots_data["espacio"]),
-                    fecha=slots_data["fecha"],
-                    duracion_horas=slots_data.get("duracion", 2)
-                )
-                result = await get_available_slots(request, db)
-                response_data = {
-                    "slots": [
-                        {
-                            "inicio": slot.hora_inicio,
-                            "fin": slot.hora_fin,
-                            "disponible": slot.disponible
-                        }
-                        for slot in result
-                    ]
-                }
+                elif "slots" in data:
+                    # Obtener slots disponibles
+                    slots_data = data["slots"]
+                    request = HorariosDisponiblesRequest(
+                        id_espacio=int(slots_data["espacio"]),
+                        fecha=slots_data["fecha"],
+                        duracion_horas=slots_data.get("duracion", 2)
+                    )
+                    result = await get_available_slots(request, db)
+                    response_data = {
+                        "slots": [
+                            {
+                                "inicio": slot.hora_inicio,
+                                "fin": slot.hora_fin,
+                                "disponible": slot.disponible
+                            }
+                            for slot in result
+                        ]
+                    }
             
-            elif "spaces" in data:
-                # Obtener espacios disponibles
-                spaces_data = data["spaces"]
-                request = EspaciosDisponiblesRequest(
-                    tipo=spaces_data.get("tipo"),
-                    fecha_inicio=spaces_data["inicio"],
-                    fecha_fin=spaces_data["fin"]
-                )
-                result = await get_available_spaces(request, db)
-                response_data = {
-                    "espacios": [
-                        {
-                            "id": esp.id,
-                            "nombre": esp.nombre,
-                            "disponible": esp.disponible
-                        }
-                        for esp in result
-                    ]
-                }
+                elif "spaces" in data:
+                    # Obtener espacios disponibles
+                    spaces_data = data["spaces"]
+                    request = EspaciosDisponiblesRequest(
+                        tipo=spaces_data.get("tipo"),
+                        fecha_inicio=spaces_data["inicio"],
+                        fecha_fin=spaces_data["fin"]
+                    )
+                    result = await get_available_spaces(request, db)
+                    response_data = {
+                        "espacios": [
+                            {
+                                "id": esp.id,
+                                "nombre": esp.nombre,
+                                "disponible": esp.disponible
+                            }
+                            for esp in result
+                        ]
+                    }
             
-            elif "config" in data:
-                # Obtener configuración
-                result = await get_availability_config(db)
-                response_data = result
+                elif "config" in data:
+                    # Obtener configuración
+                    result = await get_availability_config(db)
+                    response_data = result
             
-            else:
-                response_data = {"error": "Comando no reconocido"}
+                else:
+                    response_data = {"error": "Comando no reconocido"}
         
         else:
             response_data = {"error": "Servicio no reconocido"}
@@ -380,4 +377,4 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("avail", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5004)
+    run_service(app, "AVAIL", port=5004)
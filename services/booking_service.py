@@ -7,16 +7,24 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, or_, select
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
-import uvicorn
 
-from database.db_config import get_db, init_db
+from database.db_config import AsyncSessionLocal, get_async_db, init_db
 from database.models import Reserva, Usuario, Espacio, Configuracion, Auditoria, Notificacion
+from database.queries import (
+    PAGE_SIZE, RESERVAS_KEYSET, InvalidCursor, as_dicts, export_response, fetch_page_async, page_response,
+    select_reservas
+)
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 import requests
 
 app = FastAPI(title="Servicio de Reservas - BOOK")
@@ -25,7 +33,11 @@ app = FastAPI(title="Servicio de Reservas - BOOK")
 NOTIFICATION_SERVICE = "http://localhost:5008"
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("BOOK")
+init_db("BOOK")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "BOOK", registries=[db_metrics])
 
 # Modelos Pydantic
 class ReservaCreate(BaseModel):
@@ -56,18 +68,18 @@ class AprobarReservaRequest(BaseModel):
     id_administrador: int
     motivo: Optional[str] = None
 
-def log_audit(db: Session, tabla: str, accion: str, id_registro: int, datos_anteriores: dict, datos_nuevos: dict, id_usuario: int):
-    """Registrar acción en auditoría"""
-    audit = Auditoria(
+async def log_audit_async(db: AsyncSession, tabla: str, accion: str, id_registro: int,
+                          datos_anteriores: dict, datos_nuevos: dict, id_usuario: int):
+    """Registrar acción en auditoría (sesión asíncrona)"""
+    db.add(Auditoria(
         tabla_afectada=tabla,
         accion=accion,
         id_registro=id_registro,
         datos_anteriores=datos_anteriores,
         datos_nuevos=datos_nuevos,
         id_usuario=id_usuario
-    )
-    db.add(audit)
-    db.commit()
+    ))
+    await db.commit()
 
 def create_notification(db: Session, tipo: str, id_reserva: int, email_destinatario: str, asunto: str, contenido: str):
     """Crear notificación"""
@@ -100,14 +112,14 @@ def send_notification_async(tipo: str, reserva_id: int, usuario_id: int):
     except Exception as e:
         print(f"Error al conectar con servicio de notificaciones: {e}")
 
-def get_configuracion(db: Session) -> Configuracion:
-    """Obtener configuración actual del sistema"""
-    config = db.query(Configuracion).first()
+async def get_configuracion_async(db: AsyncSession) -> Configuracion:
+    """Obtener configuración actual del sistema (sesión asíncrona)"""
+    config = (await db.execute(select(Configuracion).limit(1))).scalar_one_or_none()
     if not config:
         config = Configuracion()
         db.add(config)
-        db.commit()
-        db.refresh(config)
+        await db.commit()
+        await db.refresh(config)
     return config
 
 def validate_reserva_times(fecha_inicio: datetime, fecha_fin: datetime, config: Configuracion) -> tuple:
@@ -133,7 +145,7 @@ def validate_reserva_times(fecha_inicio: datetime, fecha_fin: datetime, config:
     return True, "OK"
 
 @app.post("/bookings/create", response_model=ReservaResponse)
-async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_db)):
+async def create_booking(booking_data: ReservaCreate, db: AsyncSession = Depends(get_async_db)):
     """Crear nueva reserva"""
     try:
         # Parsear fechas
@@ -141,16 +153,16 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
         fecha_fin = datetime.fromisoformat(booking_data.fecha_fin.replace('Z', '+00:00'))
         
         # Verificar que el usuario y espacio existen
-        usuario = db.query(Usuario).filter(Usuario.id_usuario == booking_data.id_usuario).first()
+        usuario = await db.get(Usuario, booking_data.id_usuario)
         if not usuario:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        espacio = db.query(Espacio).filter(Espacio.id_espacio == booking_data.id_espacio).first()
+        espacio = await db.get(Espacio, booking_data.id_espacio)
         if not espacio:
             raise HTTPException(status_code=404, detail="Espacio no encontrado")
         
         # Obtener configuración
-        config = get_configuracion(db)
+        config = await get_configuracion_async(db)
         
         # Validar horarios
         is_valid, error_msg = validate_reserva_times(fecha_inicio, fecha_fin, config)
@@ -158,13 +170,13 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
             raise HTTPException(status_code=400, detail=error_msg)
         
         # Verificar límite de reservas por usuario
-        reservas_activas = db.query(Reserva).filter(
+        reservas_activas = await db.scalar(select(func.count()).select_from(Reserva).where(
             and_(
                 Reserva.id_usuario == booking_data.id_usuario,
                 Reserva.estado.in_(['pendiente', 'aprobada']),
                 Reserva.fecha_fin >= datetime.now()
             )
-        ).count()
+        ))
         
         if reservas_activas >= config.max_reservas_usuario:
             raise HTTPException(
@@ -173,7 +185,7 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
             )
         
         # Verificar disponibilidad (no solape)
-        reservas_conflicto = db.query(Reserva).filter(
+        reservas_conflicto = (await db.execute(select(Reserva.id_reserva).where(
             and_(
                 Reserva.id_espacio == booking_data.id_espacio,
                 Reserva.estado.in_(['aprobada', 'pendiente']),
@@ -183,7 +195,7 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
                     and_(Reserva.fecha_inicio >= fecha_inicio, Reserva.fecha_fin <= fecha_fin)
                 )
             )
-        ).first()
+        ).limit(1))).first()
         
         if reservas_conflicto:
             raise HTTPException(status_code=400, detail="El espacio no está disponible en ese horario")
@@ -201,11 +213,11 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
         )
         
         db.add(new_booking)
-        db.commit()
-        db.refresh(new_booking)
+        await db.commit()
+        await db.refresh(new_booking)
         
         # Registrar en auditoría
-        log_audit(db, "reservas", "crear", new_booking.id_reserva, {}, {
+        await log_audit_async(db, "reservas", "crear", new_booking.id_reserva, {}, {
             "id_usuario": booking_data.id_usuario,
             "id_espacio": booking_data.id_espacio,
             "fecha_inicio": booking_data.fecha_inicio,
@@ -213,8 +225,8 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
             "estado": "pendiente"
         }, booking_data.id_usuario)
         
-        # Enviar notificación de creación
-        send_notification_async("creacion", new_booking.id_reserva, booking_data.id_usuario)
+        # Enviar notificación de creación (HTTP bloqueante: fuera del event loop)
+        await run_in_threadpool(send_notification_async, "creacion", new_booking.id_reserva, booking_data.id_usuario)
         
         return ReservaResponse(
             id=new_booking.id_reserva,
@@ -231,49 +243,37 @@ async def create_booking(booking_data: ReservaCreate, db: Session = Depends(get_
         )
         
     except HTTPException as he:
-        db.rollback()
+        await db.rollback()
         raise he
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error creating booking: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+async def user_bookings(db: AsyncSession, user_id: int) -> List[dict]:
+    """Reservas de un usuario con los nombres de espacio y usuario, en una sola consulta"""
+    return as_dicts(await db.execute(
+        select_reservas(Reserva.id_usuario == user_id).order_by(Reserva.fecha_solicitud.desc())
+    ))
+
+async def user_bookings_page(db: AsyncSession, user_id: int, cursor: Optional[str] = None,
+                             limit: Optional[int] = None):
+    """Página de reservas de un usuario (más recientes primero); retorna (reservas, cursor siguiente)"""
+    return await fetch_page_async(db, RESERVAS_KEYSET, select_reservas(Reserva.id_usuario == user_id), cursor, limit)
+
 @app.get("/bookings/user/{user_id}", response_model=List[ReservaResponse])
-async def get_user_bookings(user_id: int, db: Session = Depends(get_db)):
-    """Obtener reservas de un usuario"""
+async def get_user_bookings(user_id: int, cursor: Optional[str] = None, limit: Optional[int] = None,
+                            db: AsyncSession = Depends(get_async_db)):
+    """Obtener reservas de un usuario; paginadas si se pide cursor o limit (cursor siguiente en X-Next-Cursor)"""
     try:
         print(f"Buscando reservas para usuario ID: {user_id}")
-        reservas = db.query(Reserva).filter(
-            Reserva.id_usuario == user_id
-        ).order_by(Reserva.fecha_solicitud.desc()).all()
-        
+        reservas, next_cursor = await user_bookings_page(db, user_id, cursor, limit)
         print(f"Encontradas {len(reservas)} reservas")
-        
-        result = []
-        for reserva in reservas:
-            # Obtener espacio y usuario relacionados
-            espacio = db.query(Espacio).filter(Espacio.id_espacio == reserva.id_espacio).first()
-            usuario = db.query(Usuario).filter(Usuario.id_usuario == reserva.id_usuario).first()
-            
-            print(f"Reserva ID {reserva.id_reserva}: {espacio.nombre if espacio else 'N/A'} - Estado: {reserva.estado}")
-            
-            result.append(ReservaResponse(
-                id=reserva.id_reserva,
-                id_usuario=reserva.id_usuario,
-                id_espacio=reserva.id_espacio,
-                fecha_inicio=reserva.fecha_inicio,
-                fecha_fin=reserva.fecha_fin,
-                estado=reserva.estado,
-                motivo=reserva.motivo,
-                fecha_solicitud=reserva.fecha_solicitud,
-                recurrente=reserva.recurrente,
-                espacio_nombre=espacio.nombre if espacio else "Desconocido",
-                usuario_nombre=usuario.nombre if usuario else "Desconocido"
-            ))
-        
-        return result
+        return page_response(reservas, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error obteniendo reservas: {str(e)}")
         import traceback
@@ -281,50 +281,55 @@ async def get_user_bookings(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/bookings", response_model=List[ReservaResponse])
-async def get_all_bookings(estado: Optional[str] = None, db: Session = Depends(get_db)):
-    """Obtener todas las reservas, opcionalmente filtradas por estado"""
+async def get_all_bookings(estado: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+                           db: AsyncSession = Depends(get_async_db)):
+    """Obtener las reservas, opcionalmente filtradas por estado; paginadas si se pide cursor o limit (X-Next-Cursor)"""
     try:
         print(f"Obteniendo todas las reservas. Estado filtro: {estado}")
         
-        query = db.query(Reserva)
+        query = select_reservas()
         if estado:
-            query = query.filter(Reserva.estado == estado)
+            query = query.where(Reserva.estado == estado)
         
-        reservas = query.order_by(Reserva.fecha_solicitud.desc()).all()
+        reservas, next_cursor = await fetch_page_async(db, RESERVAS_KEYSET, query, cursor, limit)
         print(f"Encontradas {len(reservas)} reservas")
-        
-        result = []
-        for reserva in reservas:
-            # Obtener espacio y usuario relacionados
-            espacio = db.query(Espacio).filter(Espacio.id_espacio == reserva.id_espacio).first()
-            usuario = db.query(Usuario).filter(Usuario.id_usuario == reserva.id_usuario).first()
-            
-            result.append(ReservaResponse(
-                id=reserva.id_reserva,
-                id_usuario=reserva.id_usuario,
-                id_espacio=reserva.id_espacio,
-                fecha_inicio=reserva.fecha_inicio,
-                fecha_fin=reserva.fecha_fin,
-                estado=reserva.estado,
-                motivo=reserva.motivo,
-                fecha_solicitud=reserva.fecha_solicitud,
-                recurrente=reserva.recurrente,
-                espacio_nombre=espacio.nombre if espacio else "Desconocido",
-                usuario_nombre=usuario.nombre if usuario else "Desconocido"
-            ))
-        
-        return result
+        return page_response(reservas, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error obteniendo todas las reservas: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/bookings/export")
+async def export_bookings(
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    estado: Optional[str] = None,
+    formato: Literal["ndjson", "csv"] = "ndjson"
+):
+    """
+    Exportar las reservas que empiezan entre desde y hasta (YYYY-MM-DD, ej. un semestre),
+    transmitidas en NDJSON o CSV
+    """
+    try:
+        query = select_reservas()
+        if desde:
+            query = query.where(Reserva.fecha_inicio >= datetime.strptime(desde, "%Y-%m-%d"))
+        if hasta:
+            query = query.where(Reserva.fecha_inicio < datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1))
+        if estado:
+            query = query.where(Reserva.estado == estado)
+        return export_response(query.order_by(Reserva.id_reserva), formato, "reservas")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fecha inválida: {e}")
+
 @app.post("/bookings/approve")
-async def approve_booking(request: AprobarReservaRequest, db: Session = Depends(get_db)):
+async def approve_booking(request: AprobarReservaRequest, db: AsyncSession = Depends(get_async_db)):
     """Aprobar o rechazar reserva"""
     try:
-        reserva = db.query(Reserva).filter(Reserva.id_reserva == request.id_reserva).first()
+        reserva = await db.get(Reserva, request.id_reserva)
         if not reserva:
             raise HTTPException(status_code=404, detail="Reserva no encontrada")
         
@@ -341,27 +346,28 @@ async def approve_booking(request: AprobarReservaRequest, db: Session = Depends(
         if request.motivo:
             reserva.motivo = request.motivo
         
-        db.commit()
+        await db.commit()
         
         # Registrar en auditoría
         datos_nuevos = {"estado": request.estado}
-        log_audit(db, "reservas", "aprobar", request.id_reserva, datos_anteriores, datos_nuevos, request.id_administrador)
+        await log_audit_async(db, "reservas", "aprobar", request.id_reserva, datos_anteriores, datos_nuevos,
+                              request.id_administrador)
         
-        # Enviar notificación
+        # Enviar notificación (HTTP bloqueante: fuera del event loop)
         tipo_notif = "aprobacion" if request.estado == "aprobada" else "rechazo"
-        send_notification_async(tipo_notif, reserva.id_reserva, reserva.id_usuario)
+        await run_in_threadpool(send_notification_async, tipo_notif, reserva.id_reserva, reserva.id_usuario)
         
         return {"updated": True, "notificado": True}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/bookings/{booking_id}")
-async def cancel_booking(booking_id: int, db: Session = Depends(get_db)):
+async def cancel_booking(booking_id: int, db: AsyncSession = Depends(get_async_db)):
     """Cancelar reserva"""
     try:
-        reserva = db.query(Reserva).filter(Reserva.id_reserva == booking_id).first()
+        reserva = await db.get(Reserva, booking_id)
         if not reserva:
             raise HTTPException(status_code=404, detail="Reserva no encontrada")
         
@@ -373,19 +379,20 @@ async def cancel_booking(booking_id: int, db: Session = Depends(get_db)):
         
         # Cancelar reserva
         reserva.estado = 'cancelada'
-        db.commit()
+        await db.commit()
         
         # Registrar en auditoría
         datos_nuevos = {"estado": "cancelada"}
-        log_audit(db, "reservas", "cancelar", booking_id, datos_anteriores, datos_nuevos, reserva.id_usuario)
+        await log_audit_async(db, "reservas", "cancelar", booking_id, datos_anteriores, datos_nuevos,
+                              reserva.id_usuario)
         
-        # Enviar notificación de cancelación
-        send_notification_async("cancelacion", reserva.id_reserva, reserva.id_usuario)
+        # Enviar notificación de cancelación (HTTP bloqueante: fuera del event loop)
+        await run_in_threadpool(send_notification_async, "cancelacion", reserva.id_reserva, reserva.id_usuario)
         
         return {"cancelado": True}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint para el protocolo SOA
@@ -397,53 +404,67 @@ async def handle_soa_message(message: str):
         service_code, data = protocol.parse_message(message)
         
         if service_code.strip() == "book":
-            db = next(get_db())
+            async with AsyncSessionLocal() as db:
             
-            if "user" in data and "space" in data and "inicio" in data and "fin" in data:
-                # Crear reserva
-                booking_data = ReservaCreate(
-                    id_usuario=int(data["user"]),
-                    id_espacio=int(data["space"]),
-                    fecha_inicio=data["inicio"],
-                    fecha_fin=data["fin"]
-                )
-                result = await create_booking(booking_data, db)
-                response_data = {
-                    "id": result.id,
-                    "estado": result.estado
-                }
-            
-            elif "approve" in data and "reserva" in data["approve"] and "estado" in data["approve"]:
-                # Aprobar/Rechazar reserva
-                request = AprobarReservaRequest(
-                    id_reserva=int(data["approve"]["reserva"]),
-                    estado=data["approve"]["estado"],
-                    id_administrador=1  # ID del administrador
-                )
-                result = await approve_booking(request, db)
-                response_data = {"updated": result["updated"], "notificado": result["notificado"]}
-            
-            elif "getmyreservas" in data:
-                # Obtener reservas del usuario
-                user_id = int(data["getmyreservas"])
-                results = await get_user_bookings(user_id, db)
-                response_data = [
-                    {
+                if "user" in data and "space" in data and "inicio" in data and "fin" in data:
+                    # Crear reserva
+                    booking_data = ReservaCreate(
+                        id_usuario=int(data["user"]),
+                        id_espacio=int(data["space"]),
+                        fecha_inicio=data["inicio"],
+                        fecha_fin=data["fin"]
+                    )
+                    result = await create_booking(booking_data, db)
+                    response_data = {
                         "id": result.id,
-                        "espacio": result.espacio_nombre,
                         "estado": result.estado
                     }
-                    for result in results
-                ]
             
-            elif "cancel" in data:
-                # Cancelar reserva
-                booking_id = int(data["cancel"])
-                result = await cancel_booking(booking_id, db)
-                response_data = {"cancelado": result["cancelado"]}
+                elif "approve" in data and "reserva" in data["approve"] and "estado" in data["approve"]:
+                    # Aprobar/Rechazar reserva
+                    request = AprobarReservaRequest(
+                        id_reserva=int(data["approve"]["reserva"]),
+                        estado=data["approve"]["estado"],
+                        id_administrador=1  # ID del administrador
+                    )
+                    result = await approve_booking(request, db)
+                    response_data = {"updated": result["updated"], "notificado": result["notificado"]}
+            
+                elif "getmyreservaspage" in data:
+                    # Obtener una página de reservas del usuario: {"user", "cursor", "limit"}
+                    params = data["getmyreservaspage"]
+                    results, next_cursor = await user_bookings_page(
+                        db, int(params["user"]), params.get("cursor"), params.get("limit") or PAGE_SIZE
+                    )
+                    response_data = {
+                        "items": [
+                            {"id": result["id"], "espacio": result["espacio_nombre"], "estado": result["estado"]}
+                            for result in results
+                        ],
+                        "next": next_cursor
+                    }
+            
+                elif "getmyreservas" in data:
+                    # Obtener reservas del usuario
+                    user_id = int(data["getmyreservas"])
+                    results = await user_bookings(db, user_id)
+                    response_data = [
+                        {
+                            "id": result["id"],
+                            "espacio": result["espacio_nombre"],
+                            "estado": result["estado"]
+                        }
+                        for result in results
+                    ]
+            
+                elif "cancel" in data:
+                    # Cancelar reserva
+                    booking_id = int(data["cancel"])
+                    result = await cancel_booking(booking_id, db)
+                    response_data = {"cancelado": result["cancelado"]}
             
-            else:
-                response_data = {"error": "Comando no reconocido"}
+                else:
+                    response_data = {"error": "Comando no reconocido"}
         
         else:
             response_data = {"error": "Servicio no reconocido"}
@@ -455,7 +476,7 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("book", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5005)
+    run_service(app, "BOOK", port=5005)
 
 
 
@@ -0,0 +1,200 @@
+"""
+Supervisor multiproceso del Bus de Servicios SOA
+Levanta N procesos del bus que comparten el puerto (SO_REUSEPORT, o un socket
+pre-enlazado que heredan), reinicia los que terminan inesperadamente y publica
+las métricas combinadas de todos en un único endpoint /metrics.
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+import multiprocessing
+import queue
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+from services.common.metrics import MetricsRegistry, start_metrics_server
+from services.common.structured_logging import configure_logging
+from services.common.traffic_capture import worker_capture_path
+
+logger = logging.getLogger("bus_supervisor")
+
+# Reinicios: espera inicial, máxima, y tiempo de vida a partir del cual un worker se considera estable
+RESTART_BACKOFF = 0.5
+MAX_RESTART_BACKOFF = 30.0
+STABLE_AFTER = 10.0
+
+
+def run_worker(worker_id: int, mode: str, host: str, port: int, listen_socket: Optional[socket.socket],
+               service_config: Optional[dict], metrics_queue, push_interval: float):
+    """Proceso worker: un bus completo que envía sus métricas al supervisor"""
+    from services.service_bus import AsyncServiceBus, ServiceBus
+
+    configure_logging()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # El supervisor coordina el apagado
+    if os.getenv("BUS_CAPTURE_FILE"):
+        os.environ["BUS_CAPTURE_FILE"] = worker_capture_path(os.environ["BUS_CAPTURE_FILE"], worker_id)
+    bus_class = AsyncServiceBus if mode == "async" else ServiceBus
+    bus = bus_class(host=host, port=port, service_config=service_config,
+                    listen_socket=listen_socket, reuse_port=listen_socket is None)
+    bus.metrics_port = 0  # El endpoint HTTP lo sirve el supervisor
+
+    def push_metrics():
+        while True:
+            time.sleep(push_interval)
+            try:
+                metrics_queue.put_nowait((worker_id, bus.metrics.snapshot()))
+            except queue.Full:
+                pass  # El supervisor está atrasado: se envía el siguiente
+
+    threading.Thread(target=push_metrics, name="bus-metrics-push", daemon=True).start()
+    logger.info("Worker %s iniciado (pid %s)", worker_id, os.getpid())
+    bus.start()
+
+
+class BusSupervisor:
+    """Supervisa los workers del bus y combina sus métricas"""
+
+    def __init__(self, workers: int, mode: str = "async", host: str = "localhost", port: int = 5000,
+                 shared_socket: bool = None, metrics_port: int = 0, push_interval: float = 1.0,
+                 service_config: Dict[str, dict] = None):
+        self.workers = workers
+        self.mode = mode
+        self.host = host
+        self.port = port
+        # Sin SO_REUSEPORT los workers heredan un socket ya enlazado por el supervisor
+        self.shared_socket = not hasattr(socket, "SO_REUSEPORT") if shared_socket is None else shared_socket
+        self.metrics_port = metrics_port
+        self.push_interval = push_interval
+        self.service_config = service_config  # None: configuración por defecto del bus
+
+        self.context = multiprocessing.get_context("spawn")
+        self.metrics_queue = self.context.Queue(maxsize=workers * 4)
+        self.listen_socket = None
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.started_at: Dict[int, float] = {}
+        self.backoff: Dict[int, float] = {}
+        self.restart_at: Dict[int, float] = {}
+        self.restarts = 0
+        self.latest: Dict[int, dict] = {}  # Último snapshot de métricas por worker
+        self.metrics_server = None
+        self.running = False
+
+    def bind(self):
+        """Enlazar el socket compartido que heredarán los workers"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(int(os.getenv("BUS_BACKLOG", "4096")))
+        self.listen_socket = sock
+
+    def spawn(self, worker_id: int):
+        process = self.context.Process(
+            target=run_worker, name=f"bus-worker-{worker_id}",
+            args=(worker_id, self.mode, self.host, self.port, self.listen_socket,
+                  self.service_config, self.metrics_queue, self.push_interval),
+            daemon=True
+        )
+        process.start()
+        self.processes[worker_id] = process
+        self.started_at[worker_id] = time.monotonic()
+
+    def collect(self):
+        """Recibir los snapshots de métricas que envían los workers"""
+        while self.running:
+            try:
+                worker_id, snapshot = self.metrics_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            self.latest[worker_id] = snapshot
+
+    def aggregate(self) -> MetricsRegistry:
+        """Métricas de todos los workers sumadas, más las del propio supervisor"""
+        registry = MetricsRegistry()
+        for worker_id, snapshot in sorted(self.latest.items()):
+            registry.merge(snapshot, worker=str(worker_id))
+        alive = sum(process.is_alive() for process in self.processes.values())
+        registry.describe("soa_bus_workers_up", "Workers del bus en ejecución")
+        registry.describe("soa_bus_worker_restarts_total", "Workers reiniciados por el supervisor")
+        registry.add("workers_up", alive)
+        registry.inc("worker_restarts_total", self.restarts)
+        return registry
+
+    def supervise(self):
+        """Reiniciar los workers que terminaron, con espera creciente si fallan al arrancar"""
+        now = time.monotonic()
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive():
+                if now - self.started_at[worker_id] > STABLE_AFTER:
+                    self.backoff.pop(worker_id, None)
+                continue
+            if worker_id not in self.restart_at:
+                delay = self.backoff.get(worker_id, RESTART_BACKOFF)
+                self.backoff[worker_id] = min(delay * 2, MAX_RESTART_BACKOFF)
+                self.restart_at[worker_id] = now + delay
+                logger.warning("Worker %s terminó (código %s); reinicio en %.1fs",
+                               worker_id, process.exitcode, delay)
+            elif now >= self.restart_at[worker_id]:
+                del self.restart_at[worker_id]
+                self.latest.pop(worker_id, None)
+                self.restarts += 1
+                self.spawn(worker_id)
+
+    def start(self):
+        """Levantar los workers y supervisarlos hasta recibir SIGINT o SIGTERM"""
+        if self.shared_socket:
+            self.bind()
+        self.running = True
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+        threading.Thread(target=self.collect, name="bus-metrics-collect", daemon=True).start()
+        if self.metrics_port:
+            registry = _AggregatedMetrics(self)
+            self.metrics_server = start_metrics_server(registry, self.host, self.metrics_port)
+        logger.info("Supervisor del bus: %s workers (%s) en %s:%s, socket %s", self.workers, self.mode,
+                    self.host, self.port, "compartido" if self.shared_socket else "SO_REUSEPORT")
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.request_stop())
+        try:
+            while self.running:
+                self.supervise()
+                time.sleep(0.2)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def request_stop(self):
+        self.running = False
+
+    def stop(self):
+        """Detener los workers y el endpoint de métricas"""
+        self.running = False
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout=5)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+        logger.info("Supervisor del bus detenido")
+
+
+class _AggregatedMetrics:
+    """Adaptador para start_metrics_server: combina las métricas en cada scrape"""
+
+    def __init__(self, supervisor: BusSupervisor):
+        self.supervisor = supervisor
+
+    def render(self) -> str:
+        return self.supervisor.aggregate().render()
@@ -0,0 +1,290 @@
+"""
+Pool de conexiones persistentes para el Bus de Servicios SOA
+Mantiene conexiones reutilizables (TCP o socket Unix) hacia cada servicio registrado
+"""
+import asyncio
+import socket
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from services.common.soa_protocol import read_frame, read_frame_async
+
+
+class PoolTimeoutError(Exception):
+    """No se pudo obtener una conexión del pool a tiempo"""
+
+
+class PoolConnectError(ConnectionError):
+    """No se pudo abrir una conexión ni enviar el mensaje: el servicio no lo recibió y se puede reintentar"""
+
+
+def open_socket(host: str, port: int, unix: Optional[str] = None, timeout: Optional[float] = None) -> socket.socket:
+    """Conectar con un servicio por TCP o, si se indica `unix`, por su socket Unix"""
+    if unix is None:
+        return socket.create_connection((host, port), timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(unix)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+async def open_stream(host: str, port: int, unix: Optional[str] = None) -> tuple:
+    """Versión asyncio de open_socket: retorna (reader, writer)"""
+    if unix is None:
+        return await asyncio.open_connection(host, port)
+    return await asyncio.open_unix_connection(unix)
+
+
+class ServiceConnectionPool:
+    """Pool de conexiones persistentes hacia un único servicio"""
+
+    def __init__(self, host: str, port: int, max_size: int = 8,
+                 idle_timeout: float = 60.0, connect_timeout: float = 5.0, unix: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.unix = unix  # Socket Unix del servicio (None = TCP)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+
+        self._idle: List[Tuple[socket.socket, float]] = []  # (socket, último uso)
+        self._total = 0  # Conexiones abiertas (ociosas + en uso)
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def _connect(self) -> socket.socket:
+        """Abrir una nueva conexión hacia el servicio"""
+        sock = open_socket(self.host, self.port, self.unix, timeout=self.connect_timeout)
+        sock.settimeout(None)
+        if self.unix is None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    @property
+    def target(self) -> str:
+        return f"{self.host}:{self.port}" if self.unix is None else f"unix:{self.unix}"
+
+    @staticmethod
+    def _is_healthy(sock: socket.socket) -> bool:
+        """Verificar que una conexión ociosa sigue abierta y sin datos pendientes"""
+        try:
+            sock.setblocking(False)
+            try:
+                sock.recv(1, socket.MSG_PEEK)
+            finally:
+                sock.setblocking(True)
+        except (BlockingIOError, InterruptedError):
+            return True  # Sin datos y abierta: estado esperado
+        except OSError:
+            return False
+        # b"" indica cierre remoto; datos inesperados desincronizan el protocolo
+        return False
+
+    def _discard(self, sock: socket.socket):
+        """Cerrar una conexión y liberar su cupo"""
+        try:
+            sock.close()
+        except OSError:
+            pass
+        with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    def _evict_idle(self):
+        """Cerrar conexiones ociosas que superaron idle_timeout (requiere el lock)"""
+        now = time.monotonic()
+        fresh = []
+        for sock, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+                self._total -= 1
+            else:
+                fresh.append((sock, last_used))
+        self._idle = fresh
+
+    def acquire(self, timeout: Optional[float] = None) -> socket.socket:
+        """Obtener una conexión sana del pool, abriendo una nueva si es necesario"""
+        return self._checkout(timeout)[0]
+
+    def _checkout(self, timeout: Optional[float]) -> Tuple[socket.socket, bool]:
+        """Obtener (conexión, reutilizada)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            sock = None
+            with self._condition:
+                if self._closed:
+                    raise PoolConnectError("Pool cerrado")
+                self._evict_idle()
+                if self._idle:
+                    sock, _ = self._idle.pop()
+                elif self._total < self.max_size:
+                    self._total += 1
+                else:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeoutError(f"Pool agotado para {self.target}")
+                    self._condition.wait(remaining)
+                    continue
+
+            if sock is not None:
+                if self._is_healthy(sock):
+                    return sock, True
+                self._discard(sock)
+                continue
+
+            try:
+                return self._connect(), False
+            except OSError as e:
+                with self._condition:
+                    self._total -= 1
+                    self._condition.notify()
+                raise PoolConnectError(f"No se pudo conectar a {self.target}: {e}") from e
+
+    def release(self, sock: socket.socket, reusable: bool = True):
+        """Devolver una conexión al pool, o cerrarla si quedó en mal estado"""
+        if not reusable or self._closed:
+            self._discard(sock)
+            return
+        with self._condition:
+            self._idle.append((sock, time.monotonic()))
+            self._condition.notify()
+
+    def request(self, message: bytes, timeout: Optional[float] = None) -> bytearray:
+        """
+        Enviar un mensaje y leer la respuesta completa, reconectando si la conexión reutilizada
+        falló antes de enviarlo (una vez enviado, el servicio pudo ejecutarlo y no se reenvía)
+        timeout limita el tiempo total: espera de conexión, envío y respuesta
+        Si el mensaje no llegó a enviarse lanza PoolTimeoutError o PoolConnectError; cualquier otro error
+        puede ocurrir con el mensaje ya enviado
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise PoolTimeoutError(f"Plazo agotado esperando a {self.target}")
+            sock, reused = self._checkout(remaining)
+            sent = False
+            try:
+                if deadline is not None:
+                    sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                sock.sendall(message)
+                sent = True
+                response = read_frame(sock)
+                if deadline is not None:
+                    sock.settimeout(None)
+            except socket.timeout:
+                # Una respuesta a medio leer deja la conexión desincronizada
+                self.release(sock, reusable=False)
+                raise
+            except (OSError, ValueError) as e:
+                self.release(sock, reusable=False)
+                # Una conexión reutilizada puede haber sido cerrada por el servicio: reconectar sólo si
+                # el envío falló; un mensaje enviado (ej. book create) no se repite
+                if sent:
+                    raise
+                if reused:
+                    continue
+                raise PoolConnectError(f"No se pudo enviar a {self.target}: {e}") from e
+            self.release(sock)
+            return response
+
+    def stats(self) -> dict:
+        """Estado actual del pool"""
+        with self._condition:
+            return {"abiertas": self._total, "ociosas": len(self._idle), "max": self.max_size}
+
+    def close(self):
+        """Cerrar todas las conexiones ociosas del pool"""
+        with self._condition:
+            self._closed = True
+            for sock, _ in self._idle:
+                try:
+                    sock.close()
+                except OSError:
+                    pass
+                self._total -= 1
+            self._idle = []
+            self._condition.notify_all()
+
+
+class AsyncServiceConnectionPool:
+    """Pool de conexiones persistentes asyncio hacia un único servicio"""
+
+    def __init__(self, host: str, port: int, max_size: int = 8,
+                 idle_timeout: float = 60.0, connect_timeout: float = 5.0, unix: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.unix = unix  # Socket Unix del servicio (None = TCP)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+
+        self._idle: List[tuple] = []  # (reader, writer, último uso)
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def _connect(self) -> tuple:
+        """Abrir una nueva conexión hacia el servicio"""
+        return await asyncio.wait_for(open_stream(self.host, self.port, self.unix), self.connect_timeout)
+
+    def _checkout_idle(self) -> Optional[tuple]:
+        """Tomar una conexión ociosa sana, descartando las vencidas o cerradas"""
+        now = time.monotonic()
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            if now - last_used > self.idle_timeout or writer.is_closing() or reader.at_eof():
+                writer.close()
+                continue
+            return reader, writer
+        return None
+
+    async def request(self, message: bytes) -> bytes:
+        """
+        Enviar un mensaje y leer la respuesta completa, reconectando si la conexión reutilizada
+        falló antes de enviarlo (una vez enviado no se reenvía)
+        """
+        async with self._slots:
+            while True:
+                conn = self._checkout_idle()
+                reused = conn is not None
+                reader, writer = conn if reused else await self._connect()
+                sent = False
+                try:
+                    writer.write(message)
+                    await writer.drain()
+                    sent = True
+                    response = await read_frame_async(reader)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    writer.close()
+                    if reused and not sent:
+                        continue
+                    raise
+                except asyncio.CancelledError:
+                    # Cancelada por un plazo: la conexión queda a medio leer
+                    writer.close()
+                    raise
+                self._idle.append((reader, writer, time.monotonic()))
+                return response
+
+    def stats(self) -> dict:
+        """Estado actual del pool"""
+        return {"ociosas": len(self._idle), "max": self.max_size}
+
+    def close(self):
+        """Cerrar todas las conexiones ociosas del pool"""
+        for _, writer, _ in self._idle:
+            writer.close()
+        self._idle = []
+
+    async def aclose(self):
+        """Cerrar las conexiones ociosas y esperar a que terminen de cerrarse (con el event loop en marcha)"""
+        writers = [writer for _, writer, _ in self._idle]
+        self.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
@@ -0,0 +1,50 @@
+"""
+Métricas del pool de base de datos de los servicios
+Los engines de database.db_config registran sus eventos (espera de checkout, conexiones,
+overflow, invalidaciones, pings) en este registro, que se exporta junto al detector de
+bloqueos en /metrics y, si está definido, en <SERVICIO>_DB_METRICS_PORT.
+"""
+from database import db_config
+from services.common.metrics import MetricsRegistry, start_metrics_server
+
+# Buckets de espera de checkout: casi siempre inmediata, segundos cuando el pool se agota
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+# Métricas del pool de todos los engines del proceso (etiquetas service y engine: sync/async)
+metrics = MetricsRegistry(prefix="soa_db", buckets=POOL_WAIT_BUCKETS)
+metrics.describe("soa_db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool")
+metrics.describe("soa_db_pool_checkouts_total", "Conexiones entregadas por el pool")
+metrics.describe("soa_db_pool_overflow_checkouts_total", "Conexiones entregadas por encima de pool_size")
+metrics.describe("soa_db_pool_timeouts_total", "Checkouts que agotaron pool_timeout")
+metrics.describe("soa_db_pool_connects_total", "Conexiones nuevas abiertas contra la base de datos")
+metrics.describe("soa_db_pool_invalidations_total", "Conexiones invalidadas (soft = se reemplazan al devolverse)")
+metrics.describe("soa_db_pool_pre_pings_total", "Pings previos al checkout, por resultado")
+metrics.describe("soa_db_pool_in_use", "Conexiones prestadas en este momento")
+metrics.describe("soa_db_pool_overflow", "Conexiones abiertas por encima de pool_size")
+
+_metrics_server = None
+
+
+def _collect_pool():
+    """Gauges de los pools actuales (los reemplazados por configure_engine ya no se reportan)"""
+    for kind, pool in db_config.current_pools():
+        labels = {"service": pool.logging_name, "engine": kind}
+        yield ("pool_in_use", "gauge", labels, pool.checkedout())
+        yield ("pool_overflow", "gauge", labels, max(0, pool.overflow()))
+
+
+metrics.add_collector(_collect_pool)
+
+
+def install_db_metrics(service: str) -> MetricsRegistry:
+    """
+    Medir el pool del proceso en el registro de métricas y servirlo en <SERVICIO>_DB_METRICS_PORT
+    (o DB_METRICS_PORT), si está definido. Llamar antes de init_db para contar las primeras conexiones.
+    """
+    global _metrics_server
+    db_config.set_pool_metrics(metrics)
+    port = int(db_config.db_setting("DB_METRICS_PORT", service, "0"))
+    if port and _metrics_server is None:
+        host = db_config.db_setting("DB_METRICS_HOST", service, "0.0.0.0")
+        _metrics_server = start_metrics_server(metrics, host, port)
+    return metrics
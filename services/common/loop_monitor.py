@@ -0,0 +1,198 @@
+"""
+Detector de bloqueos del event loop de los servicios FastAPI
+Un callback del loop se reprograma cada LOOP_MONITOR_INTERVAL segundos y mide cuánto se
+atrasó (lag). Un hilo vigía revisa ese latido: si el loop lleva más de LOOP_STALL_THRESHOLD
+sin responder, captura la pila del hilo del loop mientras sigue bloqueado, es decir, la
+línea de la corrutina culpable (una consulta síncrona, un requests.post, etc.). El lag,
+los bloqueos y su duración se exportan por servicio en /metrics y los últimos bloqueos
+con su pila en /debug/loop. Cada variable LOOP_* se puede redefinir por servicio
+(ej. REPORT_LOOP_STALL_THRESHOLD=0.5).
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Iterable, List, Optional
+
+from services.common.metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry
+from services.common.structured_logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Buckets de lag en segundos: bajo 1ms es lo normal, sobre 100ms ya se nota en las respuestas
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def loop_setting(name: str, service: Optional[str], default: str) -> str:
+    """Valor de LOOP_<name>, redefinible por servicio con <SERVICIO>_LOOP_<name>"""
+    if service:
+        value = os.getenv(f"{service.upper()}_{name}")
+        if value:
+            return value
+    return os.getenv(name) or default
+
+
+def _loop_frames(frame, depth: int) -> List[str]:
+    """Pila del hilo del loop sin los marcos de asyncio/uvicorn que están debajo del callback actual"""
+    stack = traceback.extract_stack(frame)
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i].name == "_run" and stack[i].filename.endswith(os.path.join("asyncio", "events.py")):
+            stack = stack[i + 1:]
+            break
+    return [line.rstrip("\n") for line in traceback.format_list(stack[-depth:])]
+
+
+class LoopMonitor:
+    """Mide el lag de un event loop y captura la pila de los bloqueos"""
+
+    def __init__(self, service: str, interval: float = 0.05, threshold: float = 0.1,
+                 stack_depth: int = 20, history: int = 20, registry: Optional[MetricsRegistry] = None):
+        self.service = service.lower()
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+
+        self.metrics = registry or MetricsRegistry(prefix="soa_service", buckets=LAG_BUCKETS)
+        self.metrics.describe("soa_service_loop_lag_seconds", "Atraso del event loop en cada latido")
+        self.metrics.describe("soa_service_loop_stalls_total", "Bloqueos del event loop sobre el umbral")
+        self.metrics.describe("soa_service_loop_stall_seconds", "Duración de los bloqueos del event loop")
+        self.metrics.describe("soa_service_loop_max_lag_seconds", "Mayor atraso observado del event loop")
+
+        self.recent: Deque[dict] = deque(maxlen=history)  # Últimos bloqueos con su pila
+        self.stalls = 0
+        self.max_lag = 0.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._expected = 0.0
+        self._last_beat = 0.0
+        self._captured: Optional[dict] = None  # Pila tomada por el vigía durante el bloqueo en curso
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self.metrics.add_collector(self._collect)
+
+    @classmethod
+    def from_env(cls, service: str, **kwargs) -> "LoopMonitor":
+        return cls(
+            service,
+            interval=float(loop_setting("LOOP_MONITOR_INTERVAL", service, "0.05")),
+            threshold=float(loop_setting("LOOP_STALL_THRESHOLD", service, "0.1")),
+            stack_depth=int(loop_setting("LOOP_STACK_DEPTH", service, "20")),
+            **kwargs
+        )
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Empezar a medir (llamar desde el hilo del loop)"""
+        if self._loop is not None:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._last_beat = time.monotonic()
+        self._expected = self._last_beat + self.interval
+        self._handle = self._loop.call_later(self.interval, self._tick)
+        self._watchdog = threading.Thread(target=self._watch, name=f"loop-monitor-{self.service}", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        self._loop = None
+
+    def _tick(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._expected)
+        self.metrics.observe("loop_lag_seconds", lag, service=self.service)
+        self.max_lag = max(self.max_lag, lag)
+        with self._lock:
+            self._last_beat = now
+            captured, self._captured = self._captured, None
+        if lag > self.threshold:
+            self._record_stall(lag, captured)
+        self._expected = now + self.interval
+        if self._loop is not None:
+            self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _record_stall(self, lag: float, captured: Optional[dict]):
+        self.stalls += 1
+        self.metrics.inc("loop_stalls_total", service=self.service)
+        self.metrics.observe("loop_stall_seconds", lag, service=self.service)
+        stall = {"ts": round(time.time(), 3), "lag_ms": round(lag * 1000, 3)}
+        stall.update(captured or {"task": None, "stack": []})  # Sin pila: el bloqueo terminó antes de la revisión
+        self.recent.append(stall)
+        logger.warning("Event loop bloqueado", extra={"fields": {
+            "service": self.service, "lag_ms": stall["lag_ms"], "task": stall["task"],
+            "stack": "\n" + "\n".join(stall["stack"]) if stall["stack"] else "",
+        }})
+
+    def _watch(self):
+        """Hilo vigía: captura la pila del loop una vez por bloqueo, mientras aún está bloqueado"""
+        period = max(0.005, min(self.interval, self.threshold) / 2)
+        while not self._stop.wait(period):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat - self.interval
+                if overdue <= self.threshold or self._captured is not None:
+                    continue
+            captured = self.capture()
+            with self._lock:
+                if self._captured is None and time.monotonic() - self._last_beat - self.interval > self.threshold:
+                    self._captured = captured
+
+    def capture(self) -> dict:
+        """Tarea y pila actuales del hilo del loop"""
+        frame = sys._current_frames().get(self._loop_thread)
+        task = None
+        try:
+            current = asyncio.current_task(self._loop) if self._loop is not None else None
+            if current is not None:
+                task = f"{current.get_name()} {current.get_coro().__qualname__}"
+        except Exception:
+            pass  # La tarea cambió mientras se leía
+        return {"task": task, "stack": _loop_frames(frame, self.stack_depth) if frame is not None else []}
+
+    def _collect(self) -> Iterable[tuple]:
+        yield ("loop_max_lag_seconds", "gauge", {"service": self.service}, self.max_lag)
+
+    def stats(self) -> dict:
+        return {
+            "service": self.service,
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "recent": list(self.recent),
+        }
+
+
+def install_loop_monitor(app, service: str, registries: Iterable[MetricsRegistry] = ()) -> Optional[LoopMonitor]:
+    """
+    Instalar el detector en una app FastAPI: arranca con la app y agrega /metrics
+    (el lag y, si se pasan, otros registros como las métricas del pool de base de datos)
+    y /debug/loop. LOOP_MONITOR_ENABLED=0 lo desactiva.
+    """
+    if loop_setting("LOOP_MONITOR_ENABLED", service, "1") == "0":
+        return None
+    from fastapi.responses import Response
+
+    configure_logging()
+    monitor = LoopMonitor.from_env(service)
+    registries = [monitor.metrics] + list(registries)
+
+    async def metrics_endpoint():
+        return Response("".join(registry.render() for registry in registries), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    async def debug_loop():
+        return monitor.stats()
+
+    app.add_event_handler("startup", monitor.start)
+    app.add_event_handler("shutdown", monitor.stop)
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/debug/loop", debug_loop, methods=["GET"], include_in_schema=False)
+    return monitor
@@ -0,0 +1,214 @@
+"""
+Métricas en proceso del Bus de Servicios SOA
+Contadores, gauges e histogramas por código de servicio, exportados en formato
+de texto de Prometheus (comando _bus {"metrics": true} o endpoint HTTP /metrics).
+Con varios procesos, cada worker envía snapshot() y el supervisor los combina con merge().
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Límites de los buckets de latencia en segundos
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append((float("inf"), self.count))
+        return result
+
+
+class MetricsRegistry:
+    """Registro de métricas del bus, seguro entre hilos"""
+
+    def __init__(self, prefix: str = "soa_bus", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+        self._merged: List[tuple] = []  # Métricas calculadas recibidas de otros procesos
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str):
+        """Registrar el texto HELP de una métrica"""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """Sumar (o restar) a un gauge"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        """
+        Agregar métricas calculadas al exportar (estado de caché, circuit breakers, etc.)
+        El collector produce tuplas (nombre, tipo, {labels}, valor)
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        """Copia serializable de todas las métricas, para agregarlas en otro proceso"""
+        def flat(series: Dict[str, Dict[tuple, float]]) -> dict:
+            return {name: [[dict(key), value] for key, value in values.items()] for name, values in series.items()}
+
+        with self._lock:
+            return {
+                "counters": flat(self._counters),
+                "gauges": flat(self._gauges),
+                "histograms": {
+                    name: [[dict(key), {"sum": h.sum, "count": h.count, "buckets": list(h.counts)}]
+                           for key, h in values.items()]
+                    for name, values in self._histograms.items()
+                },
+                "collected": [list(sample) for collector in self._collectors for sample in collector()],
+            }
+
+    def merge(self, snapshot: dict, **labels):
+        """
+        Sumar el snapshot de otro proceso: contadores, gauges e histogramas se agregan;
+        las métricas calculadas se conservan por separado con las etiquetas extra
+        """
+        with self._lock:
+            for kind, target in (("counters", self._counters), ("gauges", self._gauges)):
+                for name, samples in snapshot.get(kind, {}).items():
+                    series = target.setdefault(name, {})
+                    for sample_labels, value in samples:
+                        key = tuple(sorted(sample_labels.items()))
+                        series[key] = series.get(key, 0) + value
+            for name, samples in snapshot.get("histograms", {}).items():
+                series = self._histograms.setdefault(name, {})
+                for sample_labels, data in samples:
+                    key = tuple(sorted(sample_labels.items()))
+                    histogram = series.get(key)
+                    if histogram is None:
+                        histogram = series[key] = Histogram(self.buckets)
+                    histogram.sum += data["sum"]
+                    histogram.count += data["count"]
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, data["buckets"])]
+            for name, kind, sample_labels, value in snapshot.get("collected", []):
+                self._merged.append((name, kind, dict(sample_labels, **labels), value))
+
+    def render(self) -> str:
+        """Exportar todas las métricas en formato de texto de Prometheus"""
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for short, series in sorted(self._counters.items()):
+                name = f"{self.prefix}_{short}"
+                header(name, "counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for short, series in sorted(self._gauges.items()):
+                name = f"{self.prefix}_{short}"
+                header(name, "gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for short, series in sorted(self._histograms.items()):
+                name = f"{self.prefix}_{short}"
+                header(name, "histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {count}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+
+        collected: Dict[str, list] = {}
+        samples = [sample for collector in self._collectors for sample in collector()] + list(self._merged)
+        for short, kind, labels, value in samples:
+            collected.setdefault(short, [kind, []])[1].append((tuple(sorted(labels.items())), value))
+        for short, (kind, samples) in sorted(collected.items()):
+            name = f"{self.prefix}_{short}"
+            header(name, kind)
+            for key, value in samples:
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Los scrapes no se registran
+
+
+def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> ThreadingHTTPServer:
+    """Servir /metrics por HTTP en un hilo de fondo"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="bus-metrics", daemon=True).start()
+    return server
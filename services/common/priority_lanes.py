@@ -0,0 +1,245 @@
+"""
+Carriles de prioridad del Bus de Servicios SOA
+Cada petición se clasifica en un carril según su cliente, su comando o su servicio
+(BUS_LANE_MAP) y espera turno para ocupar uno de los cupos de reenvío del bus
+(BUS_LANE_SLOTS). Mientras haya cupos libres nadie espera; cuando se agotan, los
+turnos se asignan con weighted fair queuing: cada carril recibe cupos en proporción
+a su peso (BUS_LANES), así una cola llena de reportes no retrasa las consultas de
+disponibilidad. Un carril puede además tener un máximo de cupos (BUS_LANE_LIMITS).
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.common.soa_commands import command_of
+
+# Pesos por carril: con cupos agotados, interactive recibe 8 turnos por cada uno de bulk
+DEFAULT_LANES: Dict[str, float] = {"interactive": 8.0, "normal": 4.0, "bulk": 1.0}
+DEFAULT_LANE = "normal"
+
+# Reglas por cliente (client:<host>), por comando (servicio.comando) o por servicio, en ese orden
+DEFAULT_LANE_MAP: Dict[str, str] = {
+    "auth": "interactive",
+    "avail": "interactive",
+    "book": "interactive",  # create, cancel y getmyreservas: operaciones de estudiantes
+    "admin": "bulk",
+    "report": "bulk",
+}
+CLIENT_PREFIX = "client:"
+
+
+def parse_lane_map(spec: str) -> Dict[str, str]:
+    """Parsear reglas 'regla=carril,...' (ej. 'avail=interactive,book.cancel=interactive,client:10.0.0.9=bulk')"""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        rule, _, lane = item.partition("=")
+        if not rule.strip() or not lane.strip():
+            raise ValueError(f"Regla de carril inválida: {item!r}")
+        rules[rule.strip()] = lane.strip()
+    return rules
+
+
+class LaneTimeout(Exception):
+    """La petición esperó su turno en el carril más que el plazo del servicio"""
+
+
+class _Waiter:
+    """Petición en espera de un cupo"""
+
+    def __init__(self, tag: float, timeout: float, grant: Callable[[Optional[float]], None]):
+        self.tag = tag  # Etiqueta virtual de fin: menor = antes
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout
+        self.grant = grant  # Recibe los segundos esperados, o None si el plazo venció en la cola
+        self.granted = False
+
+
+class _Lane:
+    def __init__(self, name: str, weight: float, limit: int):
+        if weight <= 0:
+            raise ValueError(f"El peso del carril {name} debe ser positivo")
+        self.name = name
+        self.weight = weight
+        self.limit = limit  # Máximo de cupos simultáneos (0 = sin límite propio)
+        self.queue: Deque[_Waiter] = deque()
+        self.active = 0
+        self.finish = 0.0  # Etiqueta del último turno encolado
+        self.admitted = 0
+        self.expired = 0
+
+
+class LaneScheduler:
+    """Cupos de reenvío compartidos, repartidos entre carriles con weighted fair queuing"""
+
+    def __init__(self, slots: int, lanes: Optional[Dict[str, float]] = None,
+                 lane_map: Optional[Dict[str, str]] = None, limits: Optional[Dict[str, float]] = None,
+                 default_lane: str = DEFAULT_LANE):
+        weights = dict(DEFAULT_LANES if lanes is None else lanes)
+        weights.setdefault(default_lane, 1.0)
+        limits = limits or {}
+        self.lane_map = dict(DEFAULT_LANE_MAP if lane_map is None else lane_map)
+        for name in list(limits) + list(self.lane_map.values()):
+            if name not in weights:
+                raise ValueError(f"Carril desconocido: {name!r}")
+
+        self.slots = slots
+        self.default_lane = default_lane
+        self.lanes: Dict[str, _Lane] = {
+            name: _Lane(name, float(weight), int(limits.get(name, 0))) for name, weight in weights.items()
+        }
+        self.active = 0
+        self.virtual_time = 0.0
+        self._lock = threading.Lock()
+
+    def lane_for(self, service_code: str, data: Any, client: str = "") -> str:
+        """Carril de una petición: regla del cliente, luego del comando, luego del servicio"""
+        rules = self.lane_map
+        if client and CLIENT_PREFIX + client in rules:
+            return rules[CLIENT_PREFIX + client]
+        return rules.get(f"{service_code}.{command_of(data)}") or rules.get(service_code) or self.default_lane
+
+    def _has_room(self, lane: _Lane) -> bool:
+        return self.active < self.slots and (not lane.limit or lane.active < lane.limit)
+
+    def _take(self, lane: _Lane):
+        lane.active += 1
+        lane.admitted += 1
+        self.active += 1
+
+    def _try_enter(self, lane: _Lane, timeout: float,
+                   grant: Callable[[Optional[float]], None]) -> Optional[_Waiter]:
+        """Tomar un cupo de inmediato (retorna None) o encolar la petición (el llamador sincroniza)"""
+        if not lane.queue and self._has_room(lane):
+            self._take(lane)
+            return None
+        lane.finish = max(self.virtual_time, lane.finish) + 1.0 / lane.weight
+        waiter = _Waiter(lane.finish, timeout, grant)
+        lane.queue.append(waiter)
+        return waiter
+
+    def _dispatch(self) -> List[Tuple[_Waiter, Optional[float]]]:
+        """Asignar los cupos libres por orden de etiqueta (el llamador sincroniza y luego notifica)"""
+        granted = []
+        now = time.monotonic()
+        while self.active < self.slots:
+            best = None
+            for lane in self.lanes.values():
+                if lane.queue and (not lane.limit or lane.active < lane.limit):
+                    if best is None or lane.queue[0].tag < best.queue[0].tag:
+                        best = lane
+            if best is None:
+                break
+            waiter = best.queue.popleft()
+            self.virtual_time = max(self.virtual_time, waiter.tag)
+            if now > waiter.deadline:
+                best.expired += 1
+                granted.append((waiter, None))
+                continue
+            self._take(best)
+            waiter.granted = True
+            granted.append((waiter, now - waiter.enqueued))
+        return granted
+
+    def _abandon(self, lane: _Lane, waiter: _Waiter) -> bool:
+        """Retirar una espera vencida o cancelada; retorna True si ya había recibido cupo"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            try:
+                lane.queue.remove(waiter)
+                lane.expired += 1
+            except ValueError:
+                pass  # Ya vencida en _dispatch
+            return False
+
+    def submit(self, lane_name: str, timeout: float, grant: Callable[[Optional[float]], None]):
+        """Llamar grant(espera) al obtener cupo, o grant(None) si el plazo vence en la cola, sin bloquear"""
+        lane = self.lanes[lane_name]
+        with self._lock:
+            waiter = self._try_enter(lane, timeout, grant)
+        if waiter is None:
+            grant(0.0)
+
+    def acquire(self, lane_name: str, timeout: float) -> float:
+        """Esperar un cupo en el carril; retorna los segundos esperados"""
+        lane = self.lanes[lane_name]
+        event = threading.Event()
+        result: List[Optional[float]] = []
+
+        def grant(waited: Optional[float]):
+            result.append(waited)
+            event.set()
+
+        with self._lock:
+            waiter = self._try_enter(lane, timeout, grant)
+        if waiter is None:
+            return 0.0
+        if not event.wait(timeout) and not self._abandon(lane, waiter):
+            raise LaneTimeout(f"Tiempo de espera agotado en el carril {lane_name} ({timeout:g}s)")
+        event.wait()  # Cupo asignado justo al vencer: la notificación está en camino
+        if result[0] is None:
+            raise LaneTimeout(f"Tiempo de espera agotado en el carril {lane_name} ({timeout:g}s)")
+        return result[0]
+
+    async def acquire_async(self, lane_name: str, timeout: float) -> float:
+        """Esperar un cupo en el carril sin bloquear el event loop"""
+        lane = self.lanes[lane_name]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant(waited: Optional[float]):
+            loop.call_soon_threadsafe(_resolve, future, waited)
+
+        with self._lock:
+            waiter = self._try_enter(lane, timeout, grant)
+        if waiter is None:
+            return 0.0
+        try:
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+            if not done and not self._abandon(lane, waiter):
+                raise LaneTimeout(f"Tiempo de espera agotado en el carril {lane_name} ({timeout:g}s)")
+            waited = await future
+        except asyncio.CancelledError:
+            if self._abandon(lane, waiter):
+                self.release(lane_name)
+            raise
+        if waited is None:
+            raise LaneTimeout(f"Tiempo de espera agotado en el carril {lane_name} ({timeout:g}s)")
+        return waited
+
+    def release(self, lane_name: str):
+        """Devolver un cupo y asignarlo a la siguiente petición en espera"""
+        lane = self.lanes[lane_name]
+        with self._lock:
+            lane.active -= 1
+            self.active -= 1
+            granted = self._dispatch()
+        for waiter, waited in granted:
+            waiter.grant(waited)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "active": self.active,
+                "lanes": {
+                    name: {
+                        "weight": lane.weight,
+                        "limit": lane.limit,
+                        "active": lane.active,
+                        "queued": len(lane.queue),
+                        "oldest_wait": round(now - lane.queue[0].enqueued, 4) if lane.queue else 0.0,
+                        "admitted": lane.admitted,
+                        "expired": lane.expired,
+                    }
+                    for name, lane in self.lanes.items()
+                },
+            }
+
+
+def _resolve(future: asyncio.Future, waited: Optional[float]):
+    if not future.done():
+        future.set_result(waited)
@@ -0,0 +1,114 @@
+"""
+Límite de peticiones por cliente del Bus de Servicios SOA
+Token bucket por (servicio, dirección del cliente) y, opcionalmente, además por el
+usuario que indica el payload: cada petición gasta un token del bucket de su dirección y,
+si trae usuario, otro del de ese usuario (variar el usuario no evita el límite por dirección).
+Las peticiones sobre el límite se rechazan en el bus sin llegar al servicio. Los buckets
+viven en un diccionario LRU acotado: los de clientes inactivos se desalojan primero (un
+bucket desalojado vuelve a empezar lleno, como tras esperar).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+# Llaves del payload que identifican al usuario (book create, auth login, book getmyreservas[page])
+DEFAULT_USER_KEYS = ("user", "rut", "getmyreservas", "getmyreservaspage")
+
+
+class TokenBucket:
+    """Tokens disponibles y última recarga de un cliente"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets por servicio y cliente, con desalojo LRU"""
+
+    def __init__(self, rates: Dict[str, float], bursts: Optional[Dict[str, float]] = None,
+                 default_rate: float = 0.0, by_user: bool = False,
+                 user_keys: Sequence[str] = DEFAULT_USER_KEYS, max_keys: int = 100000):
+        self.rates = dict(rates)  # Peticiones por segundo por servicio (0 = sin límite)
+        self.bursts = dict(bursts or {})  # Ráfaga máxima; por defecto el doble de la tasa
+        self.default_rate = default_rate
+        self.by_user = by_user
+        self.user_keys = tuple(user_keys)
+        self.max_keys = max_keys
+
+        self._buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.limited: Dict[str, int] = {}  # Rechazos por servicio
+        self.evictions = 0
+
+    def limit_for(self, service_code: str) -> tuple:
+        """(tasa, ráfaga) de un servicio; tasa 0 = sin límite"""
+        rate = self.rates.get(service_code, self.default_rate)
+        burst = self.bursts.get(service_code, max(1.0, rate * 2))
+        return rate, burst
+
+    def user_of(self, data: Any) -> str:
+        """Usuario indicado en el payload (vacío si no trae uno reconocible)"""
+        if not isinstance(data, dict):
+            return ""
+        for key in self.user_keys:
+            value = data.get(key)
+            if isinstance(value, dict):
+                value = value.get("user")  # Comando con parámetros, ej. {"getmyreservaspage": {"user": 1}}
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                return str(value)
+        return ""
+
+    def _bucket(self, key: tuple, rate: float, burst: float, now: float) -> TokenBucket:
+        """Bucket de una llave, recargado hasta now (con el lock tomado)"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        return bucket
+
+    def check(self, service_code: str, data: Any, client: str) -> Optional[float]:
+        """
+        Consumir un token del bucket de la dirección y, con by_user, también del usuario del payload;
+        retorna None si se admite o los segundos hasta el próximo token (sin gastar ninguno)
+        """
+        rate, burst = self.limit_for(service_code)
+        if rate <= 0:
+            return None
+        user = self.user_of(data) if self.by_user else ""
+        now = time.monotonic()
+        with self._lock:
+            # El bucket del usuario se crea sólo si la dirección tiene tokens: variar el usuario
+            # desde una dirección limitada no llena el LRU
+            buckets = [self._bucket((service_code, "addr", client), rate, burst, now)]
+            if user and buckets[0].tokens >= 1.0:
+                buckets.append(self._bucket((service_code, "user", user), rate, burst, now))
+            lowest = min(bucket.tokens for bucket in buckets)
+            if lowest >= 1.0:
+                for bucket in buckets:
+                    bucket.tokens -= 1.0
+                self.allowed += 1
+                return None
+            self.limited[service_code] = self.limited.get(service_code, 0) + 1
+            return (1.0 - lowest) / rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys": len(self._buckets),
+                "max_keys": self.max_keys,
+                "allowed": self.allowed,
+                "limited": dict(self.limited),
+                "evictions": self.evictions,
+            }
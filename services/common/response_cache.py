@@ -0,0 +1,129 @@
+"""
+Caché de respuestas del Bus de Servicios SOA para comandos de lectura
+Read-through con TTL por comando, límite de memoria con desalojo LRU
+e invalidación automática cuando pasa una escritura del mismo servicio
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+from services.common.soa_commands import DEPENDENT_SERVICES, command_of, is_read
+
+# TTL en segundos por (servicio, comando); solo estos comandos se cachean
+DEFAULT_TTLS: Dict[Tuple[str, str], float] = {
+    ("avail", "config"): 60.0,
+    ("space", "getall"): 30.0,
+    ("user", "getall"): 30.0,
+    ("space", "getallpage"): 30.0,
+    ("user", "getallpage"): 30.0,
+}
+
+
+def parse_ttls(spec: str) -> Dict[Tuple[str, str], float]:
+    """Parsear TTLs con formato 'servicio.comando=segundos,...' (ej. 'avail.config=60')"""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        service_code, _, command = name.strip().partition(".")
+        if not service_code or not command or not seconds:
+            raise ValueError(f"TTL de caché inválido: {item!r}")
+        ttls[(service_code, command)] = float(seconds)
+    return ttls
+
+
+class ResponseCache:
+    """Caché LRU de respuestas SOA acotada en bytes"""
+
+    def __init__(self, ttls: Optional[Dict[Tuple[str, str], float]] = None, max_bytes: int = 32 * 1024 * 1024):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_bytes = max_bytes
+
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expira, respuesta)
+        self._bytes = 0
+        self._generations: Dict[str, int] = {}  # Cambia con cada escritura del servicio
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key_for(self, service_code: str, data: Any) -> Optional[tuple]:
+        """Llave de caché (servicio, payload normalizado), o None si el comando no es cacheable"""
+        command = command_of(data)
+        if (service_code, command) not in self.ttls:
+            return None
+        payload = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return service_code, command, payload
+
+    def get(self, key: tuple) -> Tuple[Optional[Union[str, bytes]], int]:
+        """Buscar una respuesta vigente; retorna (respuesta o None, generación del servicio)"""
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generations.get(key[0], 0)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, response = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return response, generation
+                self._remove(key)
+            self.misses += 1
+            return None, generation
+
+    def put(self, key: tuple, response: Union[str, bytes], generation: int):
+        """Guardar una respuesta si no hubo escrituras del servicio desde la lectura"""
+        size = len(response)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttls[(key[0], key[1])]
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return  # Una escritura concurrente pudo dejar esta respuesta obsoleta
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, response)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def observe(self, service_code: str, data: Any):
+        """Invalidar el servicio (y sus dependientes) si el mensaje es una escritura"""
+        if is_read(service_code, data):
+            return
+        self.invalidate(service_code)
+        for dependent in DEPENDENT_SERVICES.get(service_code, ()):
+            self.invalidate(dependent)
+
+    def invalidate(self, service_code: str):
+        """Descartar todas las respuestas de un servicio"""
+        with self._lock:
+            self._generations[service_code] = self._generations.get(service_code, 0) + 1
+            for key in [key for key in self._entries if key[0] == service_code]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: tuple):
+        """Quitar una entrada (requiere el lock)"""
+        _, response = self._entries.pop(key)
+        self._bytes -= len(response)
+
+    def stats(self) -> dict:
+        """Contadores de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,124 @@
+"""
+Protección del Bus de Servicios SOA frente a servicios lentos o caídos
+Cada servicio tiene un plazo máximo por petición, un límite de peticiones en vuelo
+con rechazo inmediato al superarlo y un circuit breaker que corta el tráfico tras
+fallos repetidos y lo reabre con una petición de prueba.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+
+def parse_service_values(spec: str) -> Dict[str, float]:
+    """Parsear valores por servicio con formato 'servicio=valor,...' (ej. 'report=30,avail=2')"""
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        service_code, _, value = item.partition("=")
+        if not service_code.strip() or not value:
+            raise ValueError(f"Valor por servicio inválido: {item!r}")
+        values[service_code.strip()] = float(value)
+    return values
+
+
+class CircuitBreaker:
+    """Circuit breaker closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0  # Fallos consecutivos
+        self.opened_at = None
+        self.opens = 0  # Veces que se abrió el circuito
+        self._probing = False  # Petición de prueba en curso (half_open)
+
+    def allow(self) -> bool:
+        """Decidir si una petición puede pasar (el llamador sincroniza)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        # half_open: una sola petición de prueba a la vez
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record(self, ok: bool):
+        """Registrar el resultado de una petición admitida"""
+        self._probing = False
+        if ok:
+            self.state = self.CLOSED
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opens += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opens": self.opens,
+            "retry_in": (round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 3)
+                         if self.state == self.OPEN else None),
+        }
+
+
+class ServiceGuard:
+    """Plazo, límite de concurrencia y circuit breaker de un servicio"""
+
+    def __init__(self, service_code: str, deadline: float, max_in_flight: int,
+                 breaker: CircuitBreaker):
+        self.service_code = service_code
+        self.deadline = deadline
+        self.max_in_flight = max_in_flight
+        self.breaker = breaker
+
+        self.in_flight = 0
+        self.rejected_overload = 0
+        self.rejected_open = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def admit(self) -> Optional[str]:
+        """Admitir una petición; retorna el motivo del rechazo o None si se admite"""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.rejected_overload += 1
+                return f"Servicio {self.service_code} saturado, intente más tarde"
+            if not self.breaker.allow():
+                self.rejected_open += 1
+                return f"Servicio {self.service_code} no disponible (circuito abierto)"
+            self.in_flight += 1
+            return None
+
+    def finish(self, ok: bool, timed_out: bool = False):
+        """Registrar el fin de una petición admitida"""
+        with self._lock:
+            self.in_flight -= 1
+            if timed_out:
+                self.timeouts += 1
+            self.breaker.record(ok)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "breaker": self.breaker.snapshot(),
+                "deadline": self.deadline,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "rejected_overload": self.rejected_overload,
+                "rejected_open": self.rejected_open,
+                "timeouts": self.timeouts,
+            }
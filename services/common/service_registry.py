@@ -0,0 +1,259 @@
+"""
+Registro de réplicas de servicios para el Bus de Servicios SOA
+Cada código de servicio puede tener varias réplicas, elegidas con una estrategia
+de balanceo y vigiladas con sondeos de salud activos. Una réplica se alcanza por TCP
+(host, port) o, si corre en el mismo equipo que el bus, por un socket Unix (unix).
+"""
+import logging
+import random
+import threading
+from typing import Callable, Dict, List, Optional
+
+from services.common.connection_pool import open_socket
+
+logger = logging.getLogger(__name__)
+
+
+class NoReplicaAvailable(LookupError):
+    """El servicio no tiene réplicas sanas registradas"""
+
+
+class Replica:
+    """Instancia de un servicio y su estado de balanceo"""
+
+    def __init__(self, host: str, port: int, unix: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.unix = unix  # Ruta del socket Unix; None = TCP
+        self.healthy = True
+        self.outstanding = 0  # Peticiones en vuelo
+        self.latency = None  # Promedio móvil exponencial (segundos)
+        self.failures = 0  # Fallos consecutivos (sondeos o peticiones)
+
+    @property
+    def key(self) -> tuple:
+        return (self.host, self.port) if self.unix is None else ("unix", self.unix)
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}:{self.port}" if self.unix is None else f"unix:{self.unix}"
+
+    def to_dict(self) -> dict:
+        return {
+            "host": self.host,
+            "port": self.port,
+            "unix": self.unix,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency * 1000, 3) if self.latency is not None else None,
+            "failures": self.failures,
+        }
+
+
+class Strategy:
+    """Estrategia de balanceo: elige una réplica entre las sanas"""
+
+    name = ""
+
+    def choose(self, replicas: List[Replica]) -> Replica:
+        raise NotImplementedError
+
+
+class RoundRobin(Strategy):
+    """Turnos rotativos"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._next = 0
+
+    def choose(self, replicas: List[Replica]) -> Replica:
+        replica = replicas[self._next % len(replicas)]
+        self._next += 1
+        return replica
+
+
+class LeastOutstanding(Strategy):
+    """La réplica con menos peticiones en vuelo (desempate aleatorio)"""
+
+    name = "least_outstanding"
+
+    def choose(self, replicas: List[Replica]) -> Replica:
+        fewest = min(replica.outstanding for replica in replicas)
+        return random.choice([replica for replica in replicas if replica.outstanding == fewest])
+
+
+class LatencyWeighted(Strategy):
+    """Elección aleatoria con peso inverso a la latencia observada"""
+
+    name = "latency_weighted"
+
+    def choose(self, replicas: List[Replica]) -> Replica:
+        known = [replica.latency for replica in replicas if replica.latency is not None]
+        # Las réplicas sin mediciones reciben la mejor latencia conocida para que se prueben
+        default = min(known) if known else 1.0
+        weights = [1.0 / max(replica.latency if replica.latency is not None else default, 1e-6)
+                   for replica in replicas]
+        return random.choices(replicas, weights=weights)[0]
+
+
+STRATEGIES: Dict[str, Callable[[], Strategy]] = {
+    RoundRobin.name: RoundRobin,
+    LeastOutstanding.name: LeastOutstanding,
+    LatencyWeighted.name: LatencyWeighted,
+}
+
+
+def register_strategy(name: str, factory: Callable[[], Strategy]):
+    """Registrar una estrategia de balanceo adicional"""
+    STRATEGIES[name] = factory
+
+
+class ServiceRegistry:
+    """Réplicas por código de servicio, con balanceo y sondeo de salud"""
+
+    def __init__(self, default_strategy: str = RoundRobin.name, max_failures: int = 2,
+                 latency_alpha: float = 0.2, probe_timeout: float = 1.0):
+        if default_strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia de balanceo desconocida: {default_strategy}")
+        self.default_strategy = default_strategy
+        self.max_failures = max_failures
+        self.latency_alpha = latency_alpha
+        self.probe_timeout = probe_timeout
+
+        self._replicas: Dict[str, List[Replica]] = {}
+        self._strategies: Dict[str, Strategy] = {}
+        self._lock = threading.Lock()
+        self._probe_stop = threading.Event()
+        self._probe_thread = None
+
+    @classmethod
+    def from_config(cls, service_config: Dict[str, dict], **kwargs) -> "ServiceRegistry":
+        """
+        Construir el registro desde service_config
+        Cada entrada es {"host", "port"}, {"unix": ruta} o {"replicas": [...], "strategy": ...}
+        """
+        registry = cls(**kwargs)
+        for service_code, config in service_config.items():
+            replicas = config.get("replicas", [config])
+            for replica in replicas:
+                registry.register(service_code, replica.get("host", "localhost"), int(replica.get("port", 0)),
+                                  unix=replica.get("unix"))
+            if "strategy" in config:
+                registry.set_strategy(service_code, config["strategy"])
+        return registry
+
+    def __contains__(self, service_code: str) -> bool:
+        with self._lock:
+            return bool(self._replicas.get(service_code))
+
+    def register(self, service_code: str, host: str, port: int, unix: Optional[str] = None) -> Replica:
+        """Agregar una réplica (idempotente)"""
+        new = Replica(host, port, unix)
+        with self._lock:
+            replicas = self._replicas.setdefault(service_code, [])
+            for replica in replicas:
+                if replica.key == new.key:
+                    return replica
+            replica = new
+            replicas.append(replica)
+            self._strategies.setdefault(service_code, STRATEGIES[self.default_strategy]())
+            return replica
+
+    def deregister(self, service_code: str, host: str, port: int, unix: Optional[str] = None) -> Optional[Replica]:
+        """Quitar una réplica; retorna la réplica quitada o None"""
+        key = Replica(host, port, unix).key
+        with self._lock:
+            replicas = self._replicas.get(service_code, [])
+            for replica in replicas:
+                if replica.key == key:
+                    replicas.remove(replica)
+                    return replica
+            return None
+
+    def set_strategy(self, service_code: str, name: str):
+        """Cambiar la estrategia de balanceo de un servicio"""
+        if name not in STRATEGIES:
+            raise ValueError(f"Estrategia de balanceo desconocida: {name}")
+        with self._lock:
+            self._strategies[service_code] = STRATEGIES[name]()
+
+    def choose(self, service_code: str) -> Replica:
+        """Elegir una réplica sana y marcarla con una petición en vuelo"""
+        with self._lock:
+            healthy = [replica for replica in self._replicas.get(service_code, []) if replica.healthy]
+            if not healthy:
+                raise NoReplicaAvailable(f"Sin réplicas disponibles para {service_code}")
+            replica = self._strategies[service_code].choose(healthy)
+            replica.outstanding += 1
+            return replica
+
+    def release(self, replica: Replica, latency: float, ok: bool):
+        """Registrar el fin de una petición: latencia observada y éxito/fallo"""
+        with self._lock:
+            replica.outstanding -= 1
+            if ok:
+                replica.failures = 0
+                if replica.latency is None:
+                    replica.latency = latency
+                else:
+                    replica.latency += self.latency_alpha * (latency - replica.latency)
+            else:
+                self._record_failure(replica)
+
+    def _record_failure(self, replica: Replica):
+        """Contar un fallo y expulsar la réplica al superar max_failures (requiere el lock)"""
+        replica.failures += 1
+        if replica.failures >= self.max_failures and replica.healthy:
+            replica.healthy = False
+            logger.warning("Réplica %s expulsada por fallos", replica.name)
+
+    def probe(self, replica: Replica) -> bool:
+        """Sondear una réplica abriendo una conexión"""
+        try:
+            with open_socket(replica.host, replica.port, replica.unix, timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def probe_all(self):
+        """Sondear todas las réplicas: expulsa las caídas y readmite las recuperadas"""
+        with self._lock:
+            replicas = [replica for group in self._replicas.values() for replica in group]
+        for replica in replicas:
+            ok = self.probe(replica)
+            with self._lock:
+                if ok:
+                    replica.failures = 0
+                    if not replica.healthy:
+                        replica.healthy = True
+                        logger.info("Réplica %s readmitida", replica.name)
+                else:
+                    self._record_failure(replica)
+
+    def start_probing(self, interval: float):
+        """Iniciar el sondeo periódico en un hilo de fondo"""
+        if interval <= 0 or self._probe_thread is not None:
+            return
+
+        def loop():
+            while not self._probe_stop.wait(interval):
+                self.probe_all()
+
+        self._probe_thread = threading.Thread(target=loop, name="bus-health-probe", daemon=True)
+        self._probe_thread.start()
+
+    def stop_probing(self):
+        """Detener el sondeo periódico"""
+        self._probe_stop.set()
+
+    def snapshot(self) -> dict:
+        """Estado de todas las réplicas por servicio"""
+        with self._lock:
+            return {
+                service_code: {
+                    "strategy": self._strategies[service_code].name,
+                    "replicas": [replica.to_dict() for replica in replicas],
+                }
+                for service_code, replicas in self._replicas.items()
+            }
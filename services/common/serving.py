@@ -0,0 +1,38 @@
+"""
+Arranque de los servicios FastAPI con uvicorn
+Cada servicio escucha siempre en su puerto TCP (clientes web, admin y llamadas HTTP entre servicios).
+Si <SERVICIO>_SERVICE_SOCKET está definido, escucha además en ese socket Unix, por donde lo alcanza
+el bus cuando corre en el mismo equipo.
+"""
+import os
+import socket
+from typing import Optional
+
+import uvicorn
+
+
+def bind_unix_socket(path: str) -> socket.socket:
+    """Socket Unix en escucha en path (reemplaza un socket que haya quedado de una ejecución anterior)"""
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o666)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_service(app, service: str, port: int, host: str = "0.0.0.0", uds: Optional[str] = None):
+    """Servir app en host:port y, si hay socket (uds o <SERVICIO>_SERVICE_SOCKET), también en él"""
+    uds = uds or os.getenv(f"{service}_SERVICE_SOCKET") or None
+    config = uvicorn.Config(app, host=host, port=port)
+    sockets = [config.bind_socket()]
+    if uds:
+        sockets.append(bind_unix_socket(uds))
+    try:
+        uvicorn.Server(config).run(sockets=sockets)
+    finally:
+        for sock in sockets:
+            sock.close()
+        if uds and os.path.exists(uds):
+            os.unlink(uds)
@@ -0,0 +1,114 @@
+"""
+Coalescencia de lecturas idénticas en vuelo (single-flight) del Bus de Servicios SOA
+Las peticiones concurrentes con el mismo servicio y payload normalizado, para comandos de
+lectura idempotentes, comparten una sola llamada al servicio y reciben la misma respuesta.
+Una escritura del servicio abre una nueva generación: las lecturas posteriores no se unen
+a una llamada iniciada antes de ella.
+"""
+import asyncio
+import json
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.common.soa_commands import DEPENDENT_SERVICES, is_read
+
+
+class _Call:
+    """Llamada en curso compartida por los hilos que esperan el mismo resultado"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Agrupa lecturas idénticas concurrentes en una sola llamada al servicio"""
+
+    def __init__(self):
+        self._calls: Dict[tuple, _Call] = {}
+        self._tasks: Dict[tuple, asyncio.Future] = {}  # Solo se usa desde el event loop
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.calls: Dict[str, int] = {}      # Llamadas realmente enviadas, por servicio
+        self.coalesced: Dict[str, int] = {}  # Peticiones atendidas con la llamada de otra
+
+    def key_for(self, service_code: str, data: Any) -> Optional[tuple]:
+        """
+        Llave (servicio, generación, payload normalizado), o None si el mensaje no es una lectura
+        conocida del catálogo (un solo comando de READ_COMMANDS): nunca se une una escritura a una lectura
+        """
+        if not is_read(service_code, data):
+            return None
+        try:
+            payload = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        except (TypeError, ValueError):
+            return None  # Payload sin forma JSON canónica (ej. bytes de MessagePack): no se agrupa
+        return service_code, self._generations.get(service_code, 0), payload
+
+    def observe(self, service_code: str, data: Any):
+        """Una escritura separa las lecturas anteriores de las siguientes (también en servicios dependientes)"""
+        if is_read(service_code, data):
+            return
+        with self._lock:
+            for code in (service_code, *DEPENDENT_SERVICES.get(service_code, ())):
+                self._generations[code] = self._generations.get(code, 0) + 1
+
+    def _count(self, service_code: str, leader: bool):
+        counters = self.calls if leader else self.coalesced
+        counters[service_code] = counters.get(service_code, 0) + 1
+
+    def do(self, key: tuple, call: Callable[[], Any]) -> Any:
+        """Ejecutar call() una sola vez por llave entre los hilos concurrentes"""
+        with self._lock:
+            current = self._calls.get(key)
+            leader = current is None
+            if leader:
+                current = self._calls[key] = _Call()
+            self._count(key[0], leader)
+
+        if not leader:
+            current.done.wait()
+            if current.error is not None:
+                raise current.error
+            return current.result
+
+        try:
+            current.result = call()
+            return current.result
+        except BaseException as e:
+            current.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            current.done.set()
+
+    async def do_async(self, key: tuple, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Variante asyncio: la llamada corre en una tarea propia, de modo que si se cancela
+        la petición que la inició las demás siguen esperando el resultado
+        """
+        task = self._tasks.get(key)
+        leader = task is None
+        if leader:
+            task = self._tasks[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        with self._lock:
+            self._count(key[0], leader)
+        return await asyncio.shield(task)
+
+    def _finished(self, key: tuple, task: asyncio.Future):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # Marcar como leída si ya no quedaban peticiones esperando
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "coalesced": dict(self.coalesced),
+                "in_flight": len(self._calls) + len(self._tasks),
+            }
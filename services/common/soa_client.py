@@ -0,0 +1,390 @@
+"""
+Clientes del Bus de Servicios SOA con conexiones persistentes
+AsyncSOAClient multiplexa muchas peticiones concurrentes de un event loop sobre unas
+pocas conexiones (correlation IDs); SOAClient es la variante síncrona, segura entre
+hilos, sobre un pool de conexiones. Ambos aplican plazos y reintentos con jitter y
+reportan los fallos con excepciones tipadas en lugar de cadenas "Error: ...".
+"""
+import asyncio
+import itertools
+import random
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+from services.common.connection_pool import PoolConnectError, PoolTimeoutError, ServiceConnectionPool
+from services.common.soa_codecs import JSON_CODEC, Codec, get_codec
+from services.common.soa_commands import is_read
+from services.common.soa_compression import COMPRESS_MIN_BYTES, available_compressors
+from services.common.soa_protocol import (
+    CAPS_SERVICE, MAX_CORRELATION_ID, FrameError, build_correlation, compress_frame, decode_frame, encode_frame,
+    negotiated_compressor, read_frame, read_frame_async, split_correlation
+)
+
+
+class SOAClientError(Exception):
+    """Error base de los clientes SOA"""
+
+
+class SOAConnectionError(SOAClientError, ConnectionError):
+    """No se pudo conectar con el bus o la conexión se cerró"""
+
+
+class SOATimeoutError(SOAClientError, TimeoutError):
+    """El bus no respondió dentro del plazo"""
+
+
+class SOAProtocolError(SOAClientError):
+    """Respuesta con formato inválido"""
+
+
+class SOAServiceError(SOAClientError):
+    """El bus o el servicio respondió {"error": ...}"""
+
+    def __init__(self, service_code: str, data: Dict[str, Any]):
+        super().__init__(f"{service_code}: {data.get('error')}")
+        self.service_code = service_code
+        self.data = data
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Espera antes del reintento `attempt` (backoff exponencial con jitter completo)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def check_response(service_code: str, data: Any, raise_errors: bool) -> Any:
+    """Convertir una respuesta {"error": ...} en SOAServiceError"""
+    if raise_errors and isinstance(data, dict) and "error" in data:
+        raise SOAServiceError(service_code, data)
+    return data
+
+
+def caps_request(codec: Codec, corr: bool, compression: bool = True) -> Dict[str, Any]:
+    caps = {"ext": True, "corr": corr, "codecs": [codec.name]}
+    if compression:
+        caps["compress"] = available_compressors()
+    return caps
+
+
+def parse_caps(frame: bytes) -> Dict[str, Any]:
+    """Capacidades anunciadas por el bus; {} si es un bus antiguo"""
+    _, data, _ = decode_frame(frame)
+    if not isinstance(data, dict) or "error" in data:
+        return {}
+    return data
+
+
+class _AsyncBusConnection:
+    """Conexión persistente al bus; con correlation IDs admite muchas peticiones en vuelo"""
+
+    def __init__(self, client: "AsyncSOAClient"):
+        self.client = client
+        self.reader = None
+        self.writer = None
+        self.multiplexed = False
+        self.extended = False
+        self.codec = JSON_CODEC
+        self.compressor = None
+        self.closed = False
+
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._write_lock = asyncio.Lock()
+        self._exclusive = asyncio.Lock()  # Sin correlación: una petición a la vez
+        self._reader_task = None
+
+    async def open(self):
+        client = self.client
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(client.bus_host, client.bus_port), client.connect_timeout
+            )
+            caps = caps_request(client.codec, corr=True, compression=client.compression)
+            self.writer.write(encode_frame(CAPS_SERVICE, caps))
+            await self.writer.drain()
+            caps = parse_caps(await asyncio.wait_for(read_frame_async(self.reader), client.connect_timeout))
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            self.close()
+            raise SOAConnectionError(f"No se pudo conectar al bus {client.bus_host}:{client.bus_port}: {e}")
+
+        self.multiplexed = caps.get("corr") is True
+        self.extended = client.extended and caps.get("ext") is True
+        self.codec = client.codec if client.codec.name in caps.get("codecs", []) else JSON_CODEC
+        self.compressor = negotiated_compressor(caps)
+        if self.multiplexed:
+            self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _read_loop(self):
+        """Despachar cada respuesta al Future de su correlation ID"""
+        error: Exception = SOAConnectionError("Conexión con el bus cerrada")
+        try:
+            while True:
+                correlation_id, frame = split_correlation(await read_frame_async(self.reader))
+                future = self._pending.pop(correlation_id, None)
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            if not self.closed:
+                error = SOAConnectionError(f"Conexión con el bus perdida: {e}")
+        finally:
+            self.close()
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def request(self, service_code: str, data: Any, timeout: float) -> bytes:
+        """Enviar una petición y esperar su frame de respuesta"""
+        message = compress_frame(encode_frame(service_code, data, self.codec, self.extended),
+                                 self.compressor, self.client.compress_min)
+        if not self.multiplexed:
+            async with self._exclusive:
+                try:
+                    self.writer.write(message)
+                    await self.writer.drain()
+                    return await asyncio.wait_for(read_frame_async(self.reader), timeout)
+                except BaseException:
+                    # Respuesta pendiente o conexión rota: no se puede reutilizar
+                    self.close()
+                    raise
+
+        correlation_id = next(self._ids) % MAX_CORRELATION_ID
+        future = asyncio.get_running_loop().create_future()
+        self._pending[correlation_id] = future
+        try:
+            async with self._write_lock:
+                self.writer.write(build_correlation(correlation_id).encode('ascii') + message)
+                await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            # La respuesta tardía de una petición vencida se descarta en _read_loop
+            self._pending.pop(correlation_id, None)
+
+    def close(self):
+        self.closed = True
+        if self.writer is not None:
+            self.writer.close()
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+
+
+class AsyncSOAClient:
+    """
+    Cliente asyncio del bus con conexiones persistentes
+    Uso:
+        async with AsyncSOAClient() as client:
+            data = await client.request("avail", {"config": True})
+    """
+
+    def __init__(self, bus_host: str = "localhost", bus_port: int = 5000, connections: int = 4,
+                 timeout: float = 10.0, connect_timeout: float = 5.0, retries: int = 2,
+                 backoff: float = 0.05, max_backoff: float = 1.0, codec: str = "json",
+                 extended: bool = True, raise_errors: bool = True, compression: bool = True,
+                 compress_min: int = COMPRESS_MIN_BYTES):
+        self.bus_host = bus_host
+        self.bus_port = bus_port
+        self.size = max(1, connections)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.codec = get_codec(codec)
+        self.extended = extended
+        self.raise_errors = raise_errors
+        self.compression = compression  # Ofrecer compresión de mensajes grandes al negociar
+        self.compress_min = compress_min
+
+        self._connections: List[Optional[_AsyncBusConnection]] = [None] * self.size
+        self._opening: Dict[int, asyncio.Task] = {}
+        self._next = itertools.count()
+        self._closed = False
+
+    async def _connection(self) -> _AsyncBusConnection:
+        """Tomar la siguiente conexión en turno, abriéndola si no existe o se cerró"""
+        if self._closed:
+            raise SOAConnectionError("Cliente cerrado")
+        slot = next(self._next) % self.size
+        conn = self._connections[slot]
+        if conn is not None and not conn.closed:
+            return conn
+        # Las peticiones concurrentes del mismo turno esperan una sola apertura
+        task = self._opening.get(slot)
+        if task is None:
+            task = self._opening[slot] = asyncio.ensure_future(self._open(slot))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._opening.pop(slot, None)
+
+    async def _open(self, slot: int) -> _AsyncBusConnection:
+        conn = _AsyncBusConnection(self)
+        await conn.open()
+        self._connections[slot] = conn
+        return conn
+
+    async def request(self, service_code: str, data: Any, timeout: Optional[float] = None,
+                      idempotent: Optional[bool] = None) -> Any:
+        """
+        Enviar una petición y retornar los datos de la respuesta
+        Las lecturas del catálogo (o idempotent=True) se reintentan también tras un
+        plazo vencido; las escrituras solo si la conexión falló antes de enviarse.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retry_sent = is_read(service_code, data) if idempotent is None else idempotent
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                conn = await self._connection()
+                sent = True
+                frame = await conn.request(service_code, data, timeout)
+                _, response, _ = decode_frame(frame)
+                return check_response(service_code, response, self.raise_errors)
+            except FrameError as e:
+                raise SOAProtocolError(str(e))
+            except asyncio.TimeoutError:
+                error: SOAClientError = SOATimeoutError(f"{service_code}: sin respuesta en {timeout:g}s")
+            except (SOAConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                error = e if isinstance(e, SOAConnectionError) else SOAConnectionError(str(e))
+            except ValueError as e:
+                raise SOAProtocolError(str(e))
+
+            if attempt >= self.retries or (sent and not retry_sent):
+                raise error
+            await asyncio.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+            attempt += 1
+
+    async def gather(self, requests: List[tuple], return_exceptions: bool = True) -> list:
+        """Enviar varias peticiones (service_code, data) en paralelo y retornar sus respuestas en orden"""
+        return await asyncio.gather(
+            *(self.request(service_code, data) for service_code, data in requests),
+            return_exceptions=return_exceptions
+        )
+
+    async def close(self):
+        self._closed = True
+        for task in self._opening.values():
+            task.cancel()
+        for conn in self._connections:
+            if conn is not None:
+                conn.close()
+        self._connections = [None] * self.size
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class _BusConnectionPool(ServiceConnectionPool):
+    """Pool de conexiones al bus que negocia capacidades al abrir cada conexión"""
+
+    def __init__(self, client: "SOAClient", **kwargs):
+        super().__init__(client.bus_host, client.bus_port, **kwargs)
+        self.client = client
+
+    def _connect(self) -> socket.socket:
+        sock = super()._connect()
+        try:
+            sock.settimeout(self.connect_timeout)
+            caps = caps_request(self.client.codec, corr=False, compression=self.client.compression)
+            sock.sendall(encode_frame(CAPS_SERVICE, caps))
+            self.client.caps = parse_caps(read_frame(sock))
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+        except ValueError as e:
+            sock.close()
+            raise ConnectionError(f"Respuesta inválida al negociar con el bus: {e}")
+        return sock
+
+
+class SOAClient:
+    """
+    Cliente síncrono del bus, seguro entre hilos, sobre un pool de conexiones persistentes
+    Uso:
+        client = SOAClient()
+        data = client.request("avail", {"config": True})
+    """
+
+    def __init__(self, bus_host: str = "localhost", bus_port: int = 5000, pool_size: int = 8,
+                 timeout: float = 10.0, connect_timeout: float = 5.0, retries: int = 2,
+                 backoff: float = 0.05, max_backoff: float = 1.0, idle_timeout: float = 60.0,
+                 codec: str = "json", extended: bool = True, raise_errors: bool = True,
+                 compression: bool = True, compress_min: int = COMPRESS_MIN_BYTES):
+        self.bus_host = bus_host
+        self.bus_port = bus_port
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.codec = get_codec(codec)
+        self.extended = extended
+        self.raise_errors = raise_errors
+        self.compression = compression
+        self.compress_min = compress_min
+        self.caps: Dict[str, Any] = {}  # Capacidades anunciadas por el bus (última negociación)
+
+        self.pool = _BusConnectionPool(
+            self, max_size=pool_size, idle_timeout=idle_timeout, connect_timeout=connect_timeout
+        )
+
+    def _encode(self, service_code: str, data: Any) -> bytes:
+        codec = self.codec if self.codec.name in self.caps.get("codecs", []) else JSON_CODEC
+        extended = self.extended and self.caps.get("ext") is True
+        return compress_frame(encode_frame(service_code, data, codec, extended),
+                              negotiated_compressor(self.caps), self.compress_min)
+
+    def request(self, service_code: str, data: Any, timeout: Optional[float] = None,
+                idempotent: Optional[bool] = None) -> Any:
+        """
+        Enviar una petición y retornar los datos de la respuesta
+        Mismos reintentos que AsyncSOAClient.request
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retry_sent = is_read(service_code, data) if idempotent is None else idempotent
+        attempt = 0
+        while True:
+            sent = False
+            try:
+                if not self.caps:
+                    # Primera conexión: negociar antes de codificar el mensaje
+                    self.pool.release(self.pool.acquire(timeout))
+                message = self._encode(service_code, data)
+                frame = self.pool.request(message, timeout=timeout)
+                _, response, _ = decode_frame(frame)
+                return check_response(service_code, response, self.raise_errors)
+            except FrameError as e:
+                raise SOAProtocolError(str(e))
+            except PoolTimeoutError:
+                # Sin conexión a tiempo: el mensaje no se envió
+                error: SOAClientError = SOATimeoutError(f"{service_code}: sin respuesta en {timeout:g}s")
+            except PoolConnectError as e:
+                error = SOAConnectionError(str(e))
+            except socket.timeout:
+                # El pool ya envió el mensaje (o parte): el bus pudo reenviarlo al servicio
+                sent = True
+                error = SOATimeoutError(f"{service_code}: sin respuesta en {timeout:g}s")
+            except OSError as e:
+                sent = True
+                error = SOAConnectionError(str(e))
+            except ValueError as e:
+                raise SOAProtocolError(str(e))
+
+            if attempt >= self.retries or (sent and not retry_sent):
+                raise error
+            time.sleep(backoff_delay(attempt, self.backoff, self.max_backoff))
+            attempt += 1
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,88 @@
+"""
+Codecs de datos para el protocolo SOA
+JSON es el formato por defecto; los codecs binarios se negocian con el bus vía _caps
+y cada mensaje binario se marca con el prefijo $<id> antes de la cabecera.
+Sólo se ofrecen codecs con implementación en C (msgpack): uno en Python puro es más lento que json.
+"""
+import json
+from typing import Any, Dict, List
+
+try:
+    import msgpack
+except ImportError:  # Instalaciones sin requirements.txt completo: sólo JSON
+    msgpack = None
+
+
+class Codec:
+    """Codec de datos SOA: serializa el cuerpo del mensaje (sin cabecera ni servicio)"""
+
+    name = ""
+    prefix_id = ""  # Carácter del prefijo $<id>; vacío para JSON (sin prefijo)
+
+    def encode(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, payload: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    """JSON UTF-8, formato clásico del protocolo"""
+
+    name = "json"
+    prefix_id = ""
+
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload) if payload else {}
+
+
+class MsgPackCodec(Codec):
+    """MessagePack (paquete msgpack, con extensión en C)"""
+
+    name = "msgpack"
+    prefix_id = "m"
+
+    def encode(self, data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, payload: bytes) -> Any:
+        return msgpack.unpackb(payload, raw=False) if payload else {}
+
+
+JSON_CODEC = JSONCodec()
+
+_CODECS: Dict[str, Codec] = {JSON_CODEC.name: JSON_CODEC}
+if msgpack is not None:
+    _CODECS[MsgPackCodec.name] = MsgPackCodec()
+
+_BY_PREFIX: Dict[str, Codec] = {codec.prefix_id: codec for codec in _CODECS.values()}
+
+
+def register_codec(codec: Codec):
+    """Registrar un codec adicional"""
+    _CODECS[codec.name] = codec
+    _BY_PREFIX[codec.prefix_id] = codec
+
+
+def available_codecs() -> List[str]:
+    """Nombres de los codecs disponibles en este proceso"""
+    return list(_CODECS)
+
+
+def get_codec(name: str) -> Codec:
+    """Obtener un codec por nombre"""
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(f"Codec no disponible: {name}")
+
+
+def codec_for_prefix(prefix_id: str) -> Codec:
+    """Obtener el codec indicado por el prefijo $<id> de un mensaje"""
+    try:
+        return _BY_PREFIX[prefix_id]
+    except KeyError:
+        raise ValueError(f"Codec desconocido en el mensaje: {prefix_id!r}")
@@ -0,0 +1,40 @@
+"""
+Catálogo de comandos SOA conocidos por el bus
+Permite distinguir lecturas idempotentes de escrituras sin abrir el mensaje en cada servicio
+"""
+from typing import Any, Dict, FrozenSet
+
+# Comandos de solo lectura por código de servicio (llave principal del mensaje)
+READ_COMMANDS: Dict[str, FrozenSet[str]] = {
+    "avail": frozenset({"check", "slots", "spaces", "config"}),
+    "space": frozenset({"getall", "getallpage"}),
+    "user": frozenset({"getall", "getallpage"}),
+    "book": frozenset({"getmyreservas", "getmyreservaspage"}),
+    "admin": frozenset({"getconfig", "getaudit"}),
+    "report": frozenset({"uso", "audit"}),
+}
+
+# Servicios cuyos datos cambian cuando otro servicio escribe
+# (ej. admin config modifica la configuración que expone avail config)
+DEPENDENT_SERVICES: Dict[str, FrozenSet[str]] = {
+    "admin": frozenset({"avail"}),
+    "book": frozenset({"avail"}),
+    "incid": frozenset({"space", "avail"}),
+    "space": frozenset({"avail"}),
+}
+
+
+def command_of(data: Any) -> str:
+    """
+    Comando de un mensaje: su única llave. Con varias llaves (ej. book create con user, space,
+    inicio y fin, o {"getall": {}, "create": {...}}) cada servicio elige según su propio orden de
+    despacho, así que el comando queda vacío y el mensaje no cuenta como lectura
+    """
+    if isinstance(data, dict) and len(data) == 1:
+        return str(next(iter(data)))
+    return ""
+
+
+def is_read(service_code: str, data: Any) -> bool:
+    """Indica si el mensaje es una lectura idempotente conocida"""
+    return command_of(data) in READ_COMMANDS.get(service_code, ())
@@ -0,0 +1,133 @@
+"""
+Compresión de mensajes para el protocolo SOA
+Los cuerpos que superan un umbral se comprimen y se marcan con el prefijo ~<id>
+(entre el prefijo de codec y la cabecera). El algoritmo se negocia por conexión vía
+_caps: el cliente ofrece "compress": [...] y el bus responde el que eligió.
+La descompresión se detiene en MAX_DECOMPRESSED_BYTES: un mensaje pequeño que se expande
+a gigabytes se rechaza sin reservar esa memoria.
+"""
+import os
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Dependencia opcional
+    lz4_frame = None
+
+# Bajo este tamaño (bytes del mensaje) comprimir cuesta más CPU de lo que ahorra en la red
+COMPRESS_MIN_BYTES = 4096
+
+# Tamaño máximo de un cuerpo descomprimido (bytes)
+MAX_DECOMPRESSED_BYTES = int(os.getenv("SOA_MAX_DECOMPRESSED_BYTES", str(64 * 1024 * 1024)))
+
+
+def _too_large(max_length: int) -> ValueError:
+    return ValueError(f"Mensaje comprimido excede {max_length} bytes al descomprimir")
+
+
+class Compressor:
+    """Algoritmo de compresión del cuerpo de un mensaje (sin cabecera ni servicio)"""
+
+    name = ""
+    prefix_id = ""  # Carácter del prefijo ~<id>
+
+    def compress(self, payload: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, payload: bytes, max_length: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+        """Descomprimir sin producir más de `max_length` bytes (ValueError si el cuerpo los excede)"""
+        raise NotImplementedError
+
+
+class ZlibCompressor(Compressor):
+    """zlib (biblioteca estándar); nivel 1 por defecto: la mayor parte de la ganancia con poca CPU"""
+
+    name = "zlib"
+    prefix_id = "z"
+
+    def __init__(self, level: int = 1):
+        self.level = level
+
+    def compress(self, payload: bytes) -> bytes:
+        return zlib.compress(payload, self.level)
+
+    def decompress(self, payload: bytes, max_length: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+        decompressor = zlib.decompressobj()
+        try:
+            data = decompressor.decompress(payload, max_length)
+        except zlib.error as e:
+            raise ValueError(f"Mensaje comprimido corrupto: {e}")
+        if decompressor.unconsumed_tail:
+            raise _too_large(max_length)
+        if not decompressor.eof:
+            raise ValueError("Mensaje comprimido corrupto: datos incompletos")
+        return data
+
+
+class LZ4Compressor(Compressor):
+    """LZ4 (requiere el paquete opcional lz4): menor ratio que zlib, varias veces más rápido"""
+
+    name = "lz4"
+    prefix_id = "l"
+
+    def compress(self, payload: bytes) -> bytes:
+        return lz4_frame.compress(payload)
+
+    def decompress(self, payload: bytes, max_length: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+        decompressor = lz4_frame.LZ4FrameDecompressor()
+        try:
+            data = decompressor.decompress(payload, max_length=max_length)
+        except RuntimeError as e:
+            raise ValueError(f"Mensaje comprimido corrupto: {e}")
+        if not decompressor.eof:
+            if not decompressor.needs_input:
+                raise _too_large(max_length)  # Quedó salida pendiente: el cuerpo es más grande
+            raise ValueError("Mensaje comprimido corrupto: datos incompletos")
+        return data
+
+
+# En orden de preferencia: el más rápido primero
+_COMPRESSORS: Dict[str, Compressor] = {}
+if lz4_frame is not None:
+    _COMPRESSORS[LZ4Compressor.name] = LZ4Compressor()
+_COMPRESSORS[ZlibCompressor.name] = ZlibCompressor()
+
+_BY_PREFIX: Dict[str, Compressor] = {compressor.prefix_id: compressor for compressor in _COMPRESSORS.values()}
+
+
+def register_compressor(compressor: Compressor):
+    """Registrar (o reemplazar, ej. con otro nivel de zlib) un algoritmo de compresión"""
+    _COMPRESSORS[compressor.name] = compressor
+    _BY_PREFIX[compressor.prefix_id] = compressor
+
+
+def available_compressors() -> List[str]:
+    """Nombres de los algoritmos disponibles en este proceso, en orden de preferencia"""
+    return list(_COMPRESSORS)
+
+
+def get_compressor(name: str) -> Compressor:
+    """Obtener un algoritmo por nombre"""
+    try:
+        return _COMPRESSORS[name]
+    except KeyError:
+        raise ValueError(f"Compresión no disponible: {name}")
+
+
+def compressor_for_prefix(prefix_id: str) -> Compressor:
+    """Obtener el algoritmo indicado por el prefijo ~<id> de un mensaje"""
+    try:
+        return _BY_PREFIX[prefix_id]
+    except KeyError:
+        raise ValueError(f"Compresión desconocida en el mensaje: {prefix_id!r}")
+
+
+def choose_compressor(offered: List[str]) -> Optional[Compressor]:
+    """Elegir el primer algoritmo ofrecido por el cliente que esté disponible (None si ninguno)"""
+    if not isinstance(offered, list):
+        return None
+    for name in offered:
+        if name in _COMPRESSORS:
+            return _COMPRESSORS[name]
+    return None
@@ -1,28 +1,304 @@
 """
 Protocolo de comunicación SOA para el Sistema de Reservación UDP
 Formato: NNNNNSSSSSDATOS
+Formato extendido (payloads > 99999 bytes): XNNNNNNNNNNNNSSSSSDATOS
+Prefijo opcional de correlación (pipelining): #CCCCCCCC antes de la cabecera
+Prefijo opcional de codec binario: $<id> entre la correlación y la cabecera
+Prefijo opcional de compresión: ~<id> entre el codec y la cabecera (cuerpos sobre un umbral)
 """
+import itertools
 import json
 import socket
-from typing import Dict, Any
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from services.common.soa_codecs import JSON_CODEC, Codec, codec_for_prefix, get_codec
+from services.common.soa_compression import (
+    COMPRESS_MIN_BYTES, Compressor, available_compressors, compressor_for_prefix, get_compressor
+)
+
+# Cabecera clásica: 5 dígitos con la longitud en bytes de SERVICIO + DATOS
+HEADER_SIZE = 5
+MAX_LEGACY_LENGTH = 99999
+
+# Cabecera extendida: marcador "X" + 12 dígitos. Solo se envía a pares que la negociaron.
+EXTENDED_MARKER = "X"
+EXTENDED_HEADER_SIZE = 13
+
+# Prefijo de correlación: marcador "#" + 8 dígitos. Solo se envía a buses que anuncian "corr".
+CORRELATION_MARKER = "#"
+CORRELATION_PREFIX_SIZE = 9
+MAX_CORRELATION_ID = 10 ** 8
+
+# Prefijo de codec: marcador "$" + id de un carácter. JSON (por defecto) no lleva prefijo.
+CODEC_MARKER = "$"
+CODEC_PREFIX_SIZE = 2
+
+# Prefijo de compresión: marcador "~" + id de un carácter. Solo se envía a pares que la negociaron;
+# la cabecera que le sigue declara la longitud del cuerpo comprimido.
+COMPRESSION_MARKER = "~"
+COMPRESSION_PREFIX_SIZE = 2
+
+# Código reservado para negociar capacidades con el bus ({"ext": true, "corr": true, "codecs": [...]})
+CAPS_SERVICE = "_caps"
+
+# Capacidades respondidas por cada bus (host, puerto) en la primera negociación del proceso ({} = bus antiguo)
+_bus_caps: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+# Código reservado para comandos de operación del propio bus (estadísticas, registro, etc.)
+BUS_SERVICE = "_bus"
+
+# Código reservado para lotes: {"requests": [{"service": ..., "data": ...}, ...]}
+# El bus responde {"responses": [...]} en el mismo orden, con un error por elemento fallido
+BATCH_SERVICE = "_bulk"
+
+
+class FrameError(ValueError):
+    """Cabecera SOA inválida o mensaje que no cabe en el formato negociado"""
+
+
+def build_header(length: int, extended: bool = False) -> str:
+    """Construir la cabecera de longitud, usando la extendida solo si es necesario y está permitida"""
+    if length <= MAX_LEGACY_LENGTH:
+        return str(length).zfill(HEADER_SIZE)
+    if not extended:
+        raise FrameError(f"Mensaje de {length} bytes excede {MAX_LEGACY_LENGTH} sin cabecera extendida")
+    return EXTENDED_MARKER + str(length).zfill(EXTENDED_HEADER_SIZE - 1)
+
+
+def header_size(message: Union[str, bytes, bytearray]) -> int:
+    """Tamaño de la cabecera del mensaje (5 clásica, 13 extendida)"""
+    first = message[:1]
+    if first in (EXTENDED_MARKER, EXTENDED_MARKER.encode('ascii')):
+        return EXTENDED_HEADER_SIZE
+    return HEADER_SIZE
+
+
+def is_extended(frame: Union[str, bytes, bytearray]) -> bool:
+    """Indica si el mensaje usa la cabecera extendida"""
+    return header_size(frame) == EXTENDED_HEADER_SIZE
+
+
+def _declared_length(header: Union[bytes, bytearray]) -> int:
+    """Longitud declarada en una cabecera completa"""
+    digits = header[1:] if header_size(header) == EXTENDED_HEADER_SIZE else header
+    if not bytes(digits).isdigit():
+        raise FrameError(f"Cabecera inválida: {bytes(header)!r}")
+    return int(bytes(digits))
+
+
+def build_correlation(correlation_id: int) -> str:
+    """Construir el prefijo de correlación de un mensaje"""
+    return CORRELATION_MARKER + str(correlation_id % MAX_CORRELATION_ID).zfill(CORRELATION_PREFIX_SIZE - 1)
+
+
+def split_correlation(frame: Union[str, bytes, bytearray]) -> Tuple[Optional[int], Union[str, bytes, bytearray]]:
+    """Separar (correlation_id, mensaje sin prefijo); correlation_id es None si no viene prefijo"""
+    if frame[:1] not in (CORRELATION_MARKER, CORRELATION_MARKER.encode('ascii')):
+        return None, frame
+    digits = frame[1:CORRELATION_PREFIX_SIZE]
+    if not isinstance(digits, str):
+        digits = bytes(digits).decode('ascii')
+    if not digits.isdigit():
+        raise FrameError(f"Correlation ID inválido: {digits!r}")
+    return int(digits), frame[CORRELATION_PREFIX_SIZE:]
+
+
+def recv_exact_into(sock: socket.socket, view: memoryview):
+    """Llenar completamente `view` leyendo del socket"""
+    received = 0
+    size = len(view)
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Conexión cerrada antes de completar el mensaje")
+        received += n
+
+
+def build_codec_prefix(codec: Codec) -> bytes:
+    """Construir el prefijo de codec ($<id>); JSON no lleva prefijo"""
+    if not codec.prefix_id:
+        return b""
+    return (CODEC_MARKER + codec.prefix_id).encode('ascii')
+
+
+def split_codec(frame: Union[bytes, bytearray]) -> Tuple[Codec, Union[bytes, bytearray]]:
+    """Separar (codec, mensaje sin prefijo); sin prefijo el codec es JSON"""
+    if frame[:1] != CODEC_MARKER.encode('ascii'):
+        return JSON_CODEC, frame
+    return codec_for_prefix(bytes(frame[1:CODEC_PREFIX_SIZE]).decode('ascii')), frame[CODEC_PREFIX_SIZE:]
+
+
+def build_compression_prefix(compressor: Compressor) -> bytes:
+    """Construir el prefijo de compresión (~<id>)"""
+    return (COMPRESSION_MARKER + compressor.prefix_id).encode('ascii')
+
+
+def split_compression(frame: Union[bytes, bytearray]) -> Tuple[Optional[Compressor], Union[bytes, bytearray]]:
+    """Separar (algoritmo, mensaje sin prefijo); sin prefijo el algoritmo es None"""
+    if frame[:1] != COMPRESSION_MARKER.encode('ascii'):
+        return None, frame
+    compressor = compressor_for_prefix(bytes(frame[1:COMPRESSION_PREFIX_SIZE]).decode('ascii'))
+    return compressor, frame[COMPRESSION_PREFIX_SIZE:]
+
+
+def compress_frame(frame: Union[bytes, bytearray], compressor: Optional[Compressor],
+                   min_bytes: int = COMPRESS_MIN_BYTES) -> bytes:
+    """
+    Comprimir el cuerpo de un mensaje (sin prefijo de correlación) si supera `min_bytes`
+    El código de servicio queda sin comprimir; si no hay ganancia se envía tal cual.
+    """
+    if compressor is None or len(frame) < min_bytes:
+        return bytes(frame)
+    codec_prefix = frame[:CODEC_PREFIX_SIZE] if frame[:1] == CODEC_MARKER.encode('ascii') else b""
+    message = frame[len(codec_prefix):]
+    if message[:1] == COMPRESSION_MARKER.encode('ascii'):
+        return bytes(frame)
+    size = header_size(message)
+    payload = bytes(message[size + 5:])
+    compressed = compressor.compress(payload)
+    if len(compressed) >= len(payload):
+        return bytes(frame)
+    header = build_header(5 + len(compressed), extended=size == EXTENDED_HEADER_SIZE)
+    return (bytes(codec_prefix) + build_compression_prefix(compressor) + header.encode('ascii')
+            + bytes(message[size:size + 5]) + compressed)
+
+
+def decompress_frame(frame: Union[bytes, bytearray]) -> bytes:
+    """Mensaje equivalente sin compresión (conserva los prefijos de correlación y codec)"""
+    correlation_id, message = split_correlation(frame)
+    codec_prefix = message[:CODEC_PREFIX_SIZE] if message[:1] == CODEC_MARKER.encode('ascii') else b""
+    compressor, message = split_compression(message[len(codec_prefix):])
+    if compressor is None:
+        return bytes(frame)
+    size = header_size(message)
+    payload = compressor.decompress(bytes(message[size + 5:]))
+    header = build_header(5 + len(payload), extended=True)
+    prefix = build_correlation(correlation_id).encode('ascii') if correlation_id is not None else b""
+    return prefix + bytes(codec_prefix) + header.encode('ascii') + bytes(message[size:size + 5]) + payload
+
+
+def check_compression(frame: Union[bytes, bytearray], negotiated: Optional[Compressor]):
+    """Rechazar un mensaje (sin prefijo de correlación) comprimido con un algoritmo no negociado vía _caps"""
+    compressor, _ = split_compression(split_codec(frame)[1])
+    if compressor is not None and (negotiated is None or compressor.name != negotiated.name):
+        raise FrameError(f"Compresión {compressor.name} no negociada con _caps")
+
+
+def negotiated_compressor(caps: Dict[str, Any]) -> Optional[Compressor]:
+    """Algoritmo elegido por el bus en la respuesta a _caps (None si no comprime)"""
+    name = caps.get("compress")
+    return get_compressor(name) if name in available_compressors() else None
+
+
+def _fill(sock: socket.socket, view: memoryview, filled: int, upto: int) -> int:
+    """Completar `view` hasta `upto` bytes, leyendo solo lo que falta"""
+    if upto > filled:
+        recv_exact_into(sock, view[filled:upto])
+        return upto
+    return filled
+
+
+def read_frame(sock: socket.socket) -> bytearray:
+    """
+    Leer un mensaje SOA completo del socket (incluidos los prefijos de correlación y codec)
+    Lee exactamente la longitud declarada en un buffer preasignado, sin concatenaciones
+    """
+    header = bytearray(CORRELATION_PREFIX_SIZE + CODEC_PREFIX_SIZE + COMPRESSION_PREFIX_SIZE + EXTENDED_HEADER_SIZE)
+    view = memoryview(header)
+    filled = _fill(sock, view, 0, HEADER_SIZE)
+    offset = 0
+    if header[offset:offset + 1] == CORRELATION_MARKER.encode('ascii'):
+        offset += CORRELATION_PREFIX_SIZE
+        filled = _fill(sock, view, filled, offset + HEADER_SIZE)
+    if header[offset:offset + 1] == CODEC_MARKER.encode('ascii'):
+        offset += CODEC_PREFIX_SIZE
+        filled = _fill(sock, view, filled, offset + HEADER_SIZE)
+    if header[offset:offset + 1] == COMPRESSION_MARKER.encode('ascii'):
+        offset += COMPRESSION_PREFIX_SIZE
+        filled = _fill(sock, view, filled, offset + HEADER_SIZE)
+    size = header_size(header[offset:offset + 1])
+    filled = _fill(sock, view, filled, offset + size)
+    length = _declared_length(view[offset:offset + size])
+
+    frame = bytearray(offset + size + length)
+    frame[:offset + size] = view[:offset + size]
+    recv_exact_into(sock, memoryview(frame)[offset + size:])
+    return frame
+
+
+async def read_frame_async(reader) -> bytes:
+    """Leer un mensaje SOA completo desde un asyncio.StreamReader (incluidos los prefijos)"""
+    prefix = b""
+    header = await reader.readexactly(HEADER_SIZE)
+    if header[:1] == CORRELATION_MARKER.encode('ascii'):
+        prefix = header + await reader.readexactly(CORRELATION_PREFIX_SIZE - HEADER_SIZE)
+        header = await reader.readexactly(HEADER_SIZE)
+    if header[:1] == CODEC_MARKER.encode('ascii'):
+        prefix += header[:CODEC_PREFIX_SIZE]
+        header = header[CODEC_PREFIX_SIZE:] + await reader.readexactly(CODEC_PREFIX_SIZE)
+    if header[:1] == COMPRESSION_MARKER.encode('ascii'):
+        prefix += header[:COMPRESSION_PREFIX_SIZE]
+        header = header[COMPRESSION_PREFIX_SIZE:] + await reader.readexactly(COMPRESSION_PREFIX_SIZE)
+    if header_size(header) > HEADER_SIZE:
+        header += await reader.readexactly(EXTENDED_HEADER_SIZE - HEADER_SIZE)
+    return prefix + header + await reader.readexactly(_declared_length(header))
+
+
+def split_frame(message: Union[str, bytes, bytearray]) -> Tuple[str, Union[str, bytes, bytearray]]:
+    """Separar (service_code, datos) de un mensaje con cualquiera de las dos cabeceras"""
+    _, message = split_correlation(message)
+    size = header_size(message)
+    if len(message) < size + 5:
+        raise FrameError("Mensaje muy corto")
+    service_code = message[size:size + 5]
+    if not isinstance(service_code, str):
+        service_code = bytes(service_code).decode('utf-8')
+    return service_code.strip(), message[size + 5:]
+
+
+def encode_frame(service_code: str, data: Any, codec: Codec = JSON_CODEC, extended: bool = False) -> bytes:
+    """Codificar un mensaje SOA completo con el codec indicado"""
+    body = service_code.ljust(5)[:5].encode('utf-8') + codec.encode(data)
+    return build_codec_prefix(codec) + build_header(len(body), extended).encode('ascii') + body
+
+
+def decode_frame(frame: Union[bytes, bytearray]) -> Tuple[str, Any, Codec]:
+    """Decodificar un mensaje SOA sin prefijo de correlación: (service_code, data, codec)"""
+    codec, frame = split_codec(frame)
+    compressor, frame = split_compression(frame)
+    service_code, payload = split_frame(frame)
+    if compressor is not None:
+        payload = compressor.decompress(bytes(payload))
+    try:
+        return service_code, codec.decode(bytes(payload)), codec
+    except (ValueError, TypeError, IndexError) as e:
+        raise ValueError(f"Error al decodificar datos ({codec.name}): {e}")
+
 
 class SOAProtocol:
     """Clase para manejar el protocolo SOA del sistema"""
     
-    def __init__(self, bus_host: str = "localhost", bus_port: int = 5000):
+    def __init__(self, bus_host: str = "localhost", bus_port: int = 5000, extended: bool = True,
+                 codec: str = "json", compression: bool = True, compress_min: int = COMPRESS_MIN_BYTES):
         self.bus_host = bus_host
         self.bus_port = bus_port
+        self.extended = extended  # Negociar cabecera extendida con el bus
+        self.codec = get_codec(codec)  # Codec preferido para conexiones persistentes (SOAPipeline)
+        self.compression = compression  # Ofrecer compresión de mensajes grandes al negociar
+        self.compress_min = compress_min
     
-    def format_message(self, service_code: str, data: Dict[str, Any]) -> str:
+    def format_message(self, service_code: str, data: Dict[str, Any], extended: bool = False) -> str:
         """
         Formatear mensaje según protocolo SOA
-        Formato: NNNNNSSSSSDATOS
+        Formato: NNNNNSSSSSDATOS (o XNNNNNNNNNNNNSSSSSDATOS si extended y excede 99999 bytes)
         """
         json_data = json.dumps(data, ensure_ascii=False)
         service_code = service_code.ljust(5)[:5]  # Asegurar 5 caracteres
         message = service_code + json_data
-        message_length = len(message)
-        length_str = str(message_length).zfill(5)  # 5 dígitos con ceros a la izquierda
+        message_length = len(message.encode('utf-8'))  # Longitud en bytes UTF-8
+        length_str = build_header(message_length, extended)
         
         return length_str + message
     
@@ -31,30 +307,69 @@ class SOAProtocol:
         Parsear mensaje recibido
         Retorna: (service_code, data)
         """
-        if len(message) < 10:  # Mínimo 5 (longitud) + 5 (servicio)
-            raise ValueError("Mensaje muy corto")
-        
-        length_str = message[:5]
-        service_code = message[5:10]
-        data_str = message[10:]
+        service_code, data_str = split_frame(message)
+        if not isinstance(data_str, str):
+            data_str = bytes(data_str).decode('utf-8')
         
         try:
             data = json.loads(data_str)
-            return service_code.strip(), data
+            return service_code, data
         except json.JSONDecodeError:
             raise ValueError("Error al decodificar JSON")
     
+    def negotiate(self, sock: socket.socket, **caps) -> dict:
+        """
+        Negociar capacidades (cabecera extendida, correlación) sobre una conexión abierta
+        Un bus antiguo responde con error y se continúa con el protocolo clásico
+        """
+        sock.sendall(self.caps_frame(**caps))
+        return self.read_caps(sock)
+    
+    def caps_frame(self, **caps) -> bytes:
+        """Mensaje _caps con las capacidades pedidas"""
+        request = {"ext": True}
+        request.update(caps)
+        return self.format_message(CAPS_SERVICE, request).encode('utf-8')
+    
+    def read_caps(self, sock: socket.socket) -> dict:
+        """Leer la respuesta a _caps ({} si el bus no la entiende)"""
+        _, data = self.parse_message(read_frame(sock).decode('utf-8'))
+        if not isinstance(data, dict) or "error" in data:
+            return {}
+        return data
+    
+    def caps_offer(self) -> Dict[str, Any]:
+        """Capacidades opcionales que se ofrecen al bus al negociar"""
+        return {"compress": available_compressors()} if self.compression else {}
+    
     def send_to_bus(self, message: str) -> str:
         """
         Enviar mensaje al bus de servicios
+        Sólo la primera conexión del proceso a cada bus espera la respuesta a _caps; las siguientes
+        usan las capacidades ya conocidas y envían _caps junto con el mensaje, sin otra ida y vuelta
+        (el bus atiende los mensajes de una conexión en orden, así que el mensaje ya llega negociado)
         """
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.connect((self.bus_host, self.bus_port))
-                s.sendall(message.encode('utf-8'))
+                caps, pending_caps = {}, b""
+                if self.extended or self.compression:
+                    offer = dict(ext=self.extended, **self.caps_offer())
+                    known = _bus_caps.get((self.bus_host, self.bus_port))
+                    if known is None:
+                        caps = _bus_caps[(self.bus_host, self.bus_port)] = self.negotiate(s, **offer)
+                    elif known:
+                        caps, pending_caps = known, self.caps_frame(**offer)
+                negotiated = self.extended and caps.get("ext") is True
+                if is_extended(message) and not negotiated:
+                    return "Error: el bus no soporta mensajes mayores a 99999 bytes"
+                s.sendall(pending_caps + compress_frame(message.encode('utf-8'), negotiated_compressor(caps),
+                                                        self.compress_min))
+                if pending_caps:
+                    _bus_caps[(self.bus_host, self.bus_port)] = self.read_caps(s)
                 
-                # Recibir respuesta
-                response = s.recv(4096).decode('utf-8')
+                # Recibir respuesta completa según la longitud declarada (descomprimida si venía comprimida)
+                response = decompress_frame(read_frame(s)).decode('utf-8')
                 return response
         except Exception as e:
             return f"Error: {str(e)}"
@@ -63,6 +378,118 @@ class SOAProtocol:
         """
         Enviar petición a un servicio específico
         """
-        message = self.format_message(service_code, data)
+        try:
+            message = self.format_message(service_code, data, extended=self.extended)
+        except FrameError as e:
+            return f"Error: {str(e)}"
         return self.send_to_bus(message)
 
+    def send_batch(self, requests: List[Tuple[str, Dict[str, Any]]]) -> str:
+        """
+        Enviar varias peticiones en un solo mensaje; el bus las atiende en paralelo
+        requests: lista de (service_code, data)
+        """
+        batch = {"requests": [{"service": code, "data": data} for code, data in requests]}
+        return self.send_request(BATCH_SERVICE, batch)
+
+    def open_pipeline(self) -> "SOAPipeline":
+        """
+        Abrir una conexión persistente que admite varias peticiones en vuelo
+        """
+        return SOAPipeline(self)
+
+
+class SOAPipeline:
+    """Conexión persistente al bus con pipelining: las respuestas llegan en cualquier orden"""
+    
+    def __init__(self, protocol: SOAProtocol, timeout: Optional[float] = None):
+        self.protocol = protocol
+        self.sock = socket.create_connection((protocol.bus_host, protocol.bus_port), timeout=timeout)
+        self.sock.settimeout(None)
+        
+        caps = protocol.negotiate(self.sock, corr=True, codecs=[protocol.codec.name], **protocol.caps_offer())
+        if caps.get("corr") is not True:
+            self.sock.close()
+            raise ConnectionError("El bus no soporta correlation IDs")
+        self.extended = protocol.extended and caps.get("ext") is True
+        # Codec binario solo si el bus lo anunció; si no, JSON
+        self.codec = protocol.codec if protocol.codec.name in caps.get("codecs", []) else JSON_CODEC
+        self.compressor = negotiated_compressor(caps)
+        
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+    
+    def submit(self, service_code: str, data: Dict[str, Any]) -> Future:
+        """
+        Enviar una petición sin esperar la respuesta
+        Retorna un Future que se resuelve con los datos decodificados de la respuesta
+        """
+        message = compress_frame(encode_frame(service_code, data, self.codec, self.extended),
+                                 self.compressor, self.protocol.compress_min)
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise ConnectionError("Pipeline cerrado")
+            correlation_id = next(self._ids) % MAX_CORRELATION_ID
+            self._pending[correlation_id] = future
+        try:
+            with self._send_lock:
+                self.sock.sendall(build_correlation(correlation_id).encode('ascii') + message)
+        except OSError:
+            with self._lock:
+                self._pending.pop(correlation_id, None)
+            raise
+        return future
+    
+    def request(self, service_code: str, data: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """
+        Enviar una petición y esperar su respuesta
+        """
+        return self.submit(service_code, data).result(timeout)
+    
+    def _read_loop(self):
+        """Despachar cada respuesta al Future de su correlation ID"""
+        error: Exception = ConnectionError("Conexión con el bus cerrada")
+        try:
+            while True:
+                correlation_id, frame = split_correlation(read_frame(self.sock))
+                with self._lock:
+                    future = self._pending.pop(correlation_id, None)
+                if future is None:
+                    continue
+                try:
+                    _, data, _ = decode_frame(frame)
+                except ValueError as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(data)
+        except (OSError, ValueError) as e:
+            if not self._closed:
+                error = e
+        finally:
+            with self._lock:
+                self._closed = True
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(error)
+    
+    def close(self):
+        """Cerrar la conexión; las peticiones pendientes fallan con ConnectionError"""
+        with self._lock:
+            self._closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
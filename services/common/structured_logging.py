@@ -0,0 +1,74 @@
+"""
+Logging estructurado para los servicios SOA
+Nivel según LOG_LEVEL y formato según LOG_FORMAT (text o json). Los campos se pasan
+con extra={"fields": {...}}. Los eventos por mensaje se muestrean con Sampler para
+no hacer I/O en cada petición.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por evento"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Texto legible con los campos como clave=valor"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """Configurar el logging del proceso una sola vez (LOG_LEVEL, LOG_FORMAT)"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    handler = logging.StreamHandler(sys.stdout)
+    fmt = (fmt or os.getenv("LOG_FORMAT", "text")).lower()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+
+class Sampler:
+    """Decide si registrar un evento frecuente: rate=1 todos, rate=0 ninguno"""
+
+    def __init__(self, rate: float):
+        self.rate = max(0.0, min(1.0, rate))
+
+    def __call__(self) -> bool:
+        return self.rate >= 1.0 or (self.rate > 0.0 and random.random() < self.rate)
+
+
+def elapsed_ms(start: float) -> float:
+    """Milisegundos transcurridos desde un time.perf_counter()"""
+    return round((time.perf_counter() - start) * 1000, 3)
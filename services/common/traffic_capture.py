@@ -0,0 +1,143 @@
+"""
+Captura de tráfico del Bus de Servicios SOA
+Registra cada mensaje recibido (con su conexión de origen y hora) y la hora de cada
+respuesta en un archivo binario de solo anexado, para reproducirlo después con
+benchmarks/replay_capture.py. El hilo que atiende al cliente solo agrega el registro
+a un buffer en memoria; un hilo de fondo lo escribe al archivo por bloques.
+
+Formato: MAGIC y luego registros RECORD (big endian) seguidos del mensaje, que solo se
+guarda en las peticiones (en las respuestas `size` es el tamaño enviado al cliente).
+"""
+import itertools
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+MAGIC = b"SOACAP01"
+RECORD = struct.Struct(">dIBiI")  # hora, conexión, tipo, correlation ID (-1 = sin prefijo), tamaño
+
+REQUEST = 0
+RESPONSE = 1
+OPEN = 2  # Conexión aceptada: los ids se reinician si el bus vuelve a anexar al mismo archivo
+
+
+class CaptureRecord(NamedTuple):
+    timestamp: float
+    connection: int
+    kind: int
+    correlation_id: Optional[int]
+    size: int
+    frame: bytes  # Mensaje completo tal como llegó (vacío en las respuestas)
+
+
+class TrafficCapture:
+    """Escritor de capturas con buffer en memoria y volcado desde un hilo de fondo"""
+
+    def __init__(self, path: str, flush_interval: float = 0.2, max_buffer_bytes: int = 16 * 1024 * 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._lock = threading.Lock()
+        self._connections = itertools.count(1)
+        self._stop = threading.Event()
+
+        self.records = 0
+        self.dropped = 0  # Registros descartados porque el disco no alcanzó al tráfico
+        self.written_bytes = 0
+
+        self._writer = threading.Thread(target=self._run, name="bus-capture", daemon=True)
+        self._writer.start()
+
+    def new_connection(self) -> int:
+        """Identificador para una conexión de cliente recién aceptada"""
+        connection = next(self._connections)
+        self._append(RECORD.pack(time.time(), connection, OPEN, -1, 0))
+        return connection
+
+    def request(self, connection: int, frame: bytes):
+        """Registrar un mensaje recibido (con sus prefijos de correlación y codec)"""
+        self._append(RECORD.pack(time.time(), connection, REQUEST, -1, len(frame)) + bytes(frame))
+
+    def response(self, connection: int, correlation_id: Optional[int], size: int):
+        """Registrar la hora en que se respondió una petición"""
+        corr = -1 if correlation_id is None else correlation_id
+        self._append(RECORD.pack(time.time(), connection, RESPONSE, corr, size))
+
+    def _append(self, record: bytes):
+        with self._lock:
+            if self._buffer_bytes + len(record) > self.max_buffer_bytes:
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+            self._buffer_bytes += len(record)
+            self.records += 1
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Escribir al archivo lo acumulado en el buffer"""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            self._buffer_bytes = 0
+        if pending:
+            data = b"".join(pending)
+            self._file.write(data)
+            self._file.flush()
+            self.written_bytes += len(data)
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._writer.join()
+        self.flush()
+        self._file.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "records": self.records,
+                "dropped": self.dropped,
+                "buffered_bytes": self._buffer_bytes,
+                "written_bytes": self.written_bytes,
+            }
+
+
+def _read_exact(f: BinaryIO, size: int) -> Optional[bytes]:
+    data = f.read(size)
+    return data if len(data) == size else None  # Registro incompleto al final: captura cortada
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """Leer los registros de un archivo de captura en orden"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un archivo de captura del bus")
+        while True:
+            header = _read_exact(f, RECORD.size)
+            if header is None:
+                return
+            timestamp, connection, kind, corr, size = RECORD.unpack(header)
+            frame = b""
+            if kind == REQUEST:
+                frame = _read_exact(f, size)
+                if frame is None:
+                    return
+            yield CaptureRecord(timestamp, connection, kind, None if corr < 0 else corr, size, frame)
+
+
+def worker_capture_path(path: str, worker_id: int) -> str:
+    """Archivo propio por worker del supervisor (los ids de conexión son locales a cada proceso)"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{worker_id}{ext}"
@@ -12,11 +12,14 @@ from sqlalchemy import and_
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-import uvicorn
 
 from database.db_config import get_db, init_db
 from database.models import Incidencia, Espacio, Usuario, Reserva, Notificacion, Auditoria
+from database.queries import INCIDENCIAS_KEYSET, InvalidCursor, fetch_page, page_response, select_incidencias
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 import requests
 
 app = FastAPI(title="Servicio de Incidencias - INCID")
@@ -25,7 +28,11 @@ app = FastAPI(title="Servicio de Incidencias - INCID")
 NOTIFICATION_SERVICE = "http://localhost:5008"
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("INCID")
+init_db("INCID")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "INCID", registries=[db_metrics])
 
 # Modelos Pydantic
 class IncidenciaCreate(BaseModel):
@@ -163,28 +170,13 @@ async def report_incident(incident_data: IncidenciaCreate, db: Session = Depends
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/incidents", response_model=List[IncidenciaResponse])
-async def get_incidents(db: Session = Depends(get_db)):
-    """Obtener todas las incidencias"""
+async def get_incidents(cursor: Optional[str] = None, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """Obtener las incidencias, más recientes primero; paginadas si se pide cursor o limit (X-Next-Cursor)"""
     try:
-        incidents = db.query(Incidencia).order_by(Incidencia.fecha_reporte.desc()).all()
-        
-        result = []
-        for incident in incidents:
-            espacio = db.query(Espacio).filter(Espacio.id_espacio == incident.id_espacio).first()
-            usuario = db.query(Usuario).filter(Usuario.id_usuario == incident.id_usuario_reporta).first()
-            
-            result.append(IncidenciaResponse(
-                id=incident.id_incidencia,
-                id_espacio=incident.id_espacio,
-                tipo_incidencia=incident.tipo_incidencia,
-                descripcion=incident.descripcion,
-                estado=incident.estado,
-                fecha_reporte=incident.fecha_reporte,
-                espacio_nombre=espacio.nombre if espacio else "Desconocido",
-                usuario_reporta_nombre=usuario.nombre if usuario else "Desconocido"
-            ))
-        
-        return result
+        incidents, next_cursor = fetch_page(db, INCIDENCIAS_KEYSET, select_incidencias(), cursor, limit)
+        return page_response(incidents, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error obteniendo incidencias: {str(e)}")
         import traceback
@@ -358,7 +350,7 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("incid", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5006)
+    run_service(app, "INCID", port=5006)
 
 
 
@@ -11,19 +11,26 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-import uvicorn
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 from database.db_config import get_db, init_db
 from database.models import Notificacion, Reserva, Usuario
+from database.queries import NOTIFICACIONES_KEYSET, InvalidCursor, fetch_page, page_response, select_notificaciones
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 
 app = FastAPI(title="Servicio de Notificaciones - NOTIF")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("NOTIF")
+init_db("NOTIF")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "NOTIF", registries=[db_metrics])
 
 # Modelos Pydantic
 class NotificationSend(BaseModel):
@@ -249,39 +256,30 @@ async def get_notifications_history(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     tipo: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
-    """Obtener historial de notificaciones con filtros"""
+    """Obtener historial de notificaciones con filtros; paginado si se pide cursor o limit (X-Next-Cursor)"""
     try:
-        query = db.query(Notificacion)
+        query = select_notificaciones()
         
         # Aplicar filtros
         if fecha_inicio:
             fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
-            query = query.filter(Notificacion.fecha_creacion >= fecha_inicio_dt)
+            query = query.where(Notificacion.fecha_creacion >= fecha_inicio_dt)
         
         if fecha_fin:
             fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d")
-            query = query.filter(Notificacion.fecha_creacion <= fecha_fin_dt)
+            query = query.where(Notificacion.fecha_creacion <= fecha_fin_dt)
         
         if tipo:
-            query = query.filter(Notificacion.tipo_notificacion == tipo)
-        
-        notifications = query.order_by(Notificacion.fecha_creacion.desc()).limit(100).all()
+            query = query.where(Notificacion.tipo_notificacion == tipo)
         
-        return [
-            {
-                "id": notif.id_notificacion,
-                "tipo": notif.tipo_notificacion,
-                "destinatario": notif.destinatario_email,
-                "asunto": notif.asunto,
-                "enviada": notif.enviada,
-                "fecha_creacion": notif.fecha_creacion,
-                "fecha_envio": notif.fecha_envio,
-                "reserva_id": notif.id_reserva
-            }
-            for notif in notifications
-        ]
+        notifications, next_cursor = fetch_page(db, NOTIFICACIONES_KEYSET, query, cursor, limit)
+        return page_response(notifications, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -360,7 +358,7 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("notif", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5008)
+    run_service(app, "NOTIF", port=5008)
 
 
 
@@ -7,21 +7,28 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, select
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, date
-import uvicorn
 
-from database.db_config import get_db, init_db
+from database.db_config import AsyncSessionLocal, get_async_db, init_db
 from database.models import Reserva, Espacio, Usuario, Auditoria, Incidencia
+from database.queries import AUDITORIA_KEYSET, InvalidCursor, export_response, fetch_page_async, page_response
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 
 app = FastAPI(title="Servicio de Reportes - REPRT")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("REPORT")
+init_db("REPORT")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "REPORT", registries=[db_metrics])
 
 # Modelos Pydantic
 class ReporteUsoRequest(BaseModel):
@@ -41,45 +48,48 @@ class ReporteAuditoriaResponse(BaseModel):
     acciones_por_dia: List[dict]
     acciones_por_tipo: dict
 
+async def count_rows(db: AsyncSession, model, *condiciones) -> int:
+    """Contar filas de un modelo que cumplen las condiciones"""
+    query = select(func.count()).select_from(model)
+    if condiciones:
+        query = query.where(*condiciones)
+    return await db.scalar(query)
+
+async def count_by(db: AsyncSession, column, valores: List[str], *condiciones) -> dict:
+    """Contar filas por valor de una columna en una sola consulta (valores sin filas = 0)"""
+    query = select(column, func.count()).group_by(column)
+    if condiciones:
+        query = query.where(*condiciones)
+    conteos = dict((await db.execute(query)).all())
+    return {valor: conteos.get(valor, 0) for valor in valores}
+
 @app.post("/reports/uso", response_model=ReporteUsoResponse)
-async def generate_usage_report(request: ReporteUsoRequest, db: Session = Depends(get_db)):
+async def generate_usage_report(request: ReporteUsoRequest, db: AsyncSession = Depends(get_async_db)):
     """Generar reporte de uso"""
     try:
         fecha_inicio = datetime.strptime(request.fecha_inicio, "%Y-%m-%d").date()
         fecha_fin = datetime.strptime(request.fecha_fin, "%Y-%m-%d").date()
         
         # Total de reservas en el período
-        total_reservas = db.query(Reserva).filter(
-            and_(
-                Reserva.fecha_inicio >= fecha_inicio,
-                Reserva.fecha_inicio <= fecha_fin,
-                Reserva.estado.in_(['aprobada', 'pendiente'])
-            )
-        ).count()
-        
-        # Reservas por estado
-        reservas_por_estado = {}
-        for estado in ['aprobada', 'pendiente', 'rechazada', 'cancelada']:
-            count = db.query(Reserva).filter(
-                and_(
-                    Reserva.fecha_inicio >= fecha_inicio,
-                    Reserva.fecha_inicio <= fecha_fin,
-                    Reserva.estado == estado
-                )
-            ).count()
-            reservas_por_estado[estado] = count
+        # Reservas por estado (una consulta agrupada)
+        reservas_por_estado = await count_by(
+            db, Reserva.estado, ['aprobada', 'pendiente', 'rechazada', 'cancelada'],
+            Reserva.fecha_inicio >= fecha_inicio,
+            Reserva.fecha_inicio <= fecha_fin
+        )
+        total_reservas = reservas_por_estado['aprobada'] + reservas_por_estado['pendiente']
         
         # Espacios más usados
-        espacios_usados = db.query(
+        espacios_usados = (await db.execute(select(
             Espacio.nombre,
             func.count(Reserva.id_reserva).label('uso_count')
-        ).join(Reserva).filter(
+        ).join(Reserva).where(
             and_(
                 Reserva.fecha_inicio >= fecha_inicio,
                 Reserva.fecha_inicio <= fecha_fin,
                 Reserva.estado == 'aprobada'
             )
-        ).group_by(Espacio.nombre).order_by(func.count(Reserva.id_reserva).desc()).limit(5).all()
+        ).group_by(Espacio.nombre).order_by(func.count(Reserva.id_reserva).desc()).limit(5))).all()
         
         espacios_mas_usados = [
             {"nombre": espacio.nombre, "uso": espacio.uso_count}
@@ -88,7 +98,7 @@ async def generate_usage_report(request: ReporteUsoRequest, db: Session = Depend
         
         # Calcular ocupación (simplificado)
         # En un sistema real, esto sería más complejo considerando horarios y capacidad
-        total_espacios = db.query(Espacio).filter(Espacio.activo == True).count()
+        total_espacios = await count_rows(db, Espacio, Espacio.activo == True)
         if total_espacios > 0:
             ocupacion_porcentaje = min((total_reservas / (total_espacios * 10)) * 100, 100)  # Simplificado
         else:
@@ -107,18 +117,18 @@ async def generate_usage_report(request: ReporteUsoRequest, db: Session = Depend
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/reports/audit", response_model=ReporteAuditoriaResponse)
-async def generate_audit_report(request: ReporteAuditoriaRequest, db: Session = Depends(get_db)):
+async def generate_audit_report(request: ReporteAuditoriaRequest, db: AsyncSession = Depends(get_async_db)):
     """Generar reporte de auditoría"""
     try:
         fecha_reporte = datetime.strptime(request.fecha, "%Y-%m-%d").date()
         
         # Acciones por día
-        acciones_por_dia = db.query(
+        acciones_por_dia = (await db.execute(select(
             func.date(Auditoria.fecha_accion).label('fecha'),
             func.count(Auditoria.id_auditoria).label('cantidad')
-        ).filter(
+        ).where(
             func.date(Auditoria.fecha_accion) == fecha_reporte
-        ).group_by(func.date(Auditoria.fecha_accion)).all()
+        ).group_by(func.date(Auditoria.fecha_accion)))).all()
         
         acciones_por_dia_list = [
             {"fecha": str(accion.fecha), "cantidad": accion.cantidad}
@@ -126,17 +136,10 @@ async def generate_audit_report(request: ReporteAuditoriaRequest, db: Session =
         ]
         
         # Acciones por tipo
-        acciones_por_tipo = {}
         tipos_accion = ['crear', 'actualizar', 'eliminar', 'aprobar', 'cancelar', 'configurar']
-        
-        for tipo in tipos_accion:
-            count = db.query(Auditoria).filter(
-                and_(
-                    func.date(Auditoria.fecha_accion) == fecha_reporte,
-                    Auditoria.accion == tipo
-                )
-            ).count()
-            acciones_por_tipo[tipo] = count
+        acciones_por_tipo = await count_by(
+            db, Auditoria.accion, tipos_accion, func.date(Auditoria.fecha_accion) == fecha_reporte
+        )
         
         return ReporteAuditoriaResponse(
             acciones_por_dia=acciones_por_dia_list,
@@ -149,20 +152,19 @@ async def generate_audit_report(request: ReporteAuditoriaRequest, db: Session =
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/reports/incidencias")
-async def get_incident_report(db: Session = Depends(get_db)):
+async def get_incident_report(db: AsyncSession = Depends(get_async_db)):
     """Obtener reporte de incidencias"""
     try:
         # Incidencias por estado
-        incidencias_por_estado = {}
-        for estado in ['abierta', 'en_progreso', 'resuelta', 'cerrada']:
-            count = db.query(Incidencia).filter(Incidencia.estado == estado).count()
-            incidencias_por_estado[estado] = count
+        incidencias_por_estado = await count_by(
+            db, Incidencia.estado, ['abierta', 'en_progreso', 'resuelta', 'cerrada']
+        )
         
         # Incidencias por tipo
-        tipos_incidencia = db.query(
+        tipos_incidencia = (await db.execute(select(
             Incidencia.tipo_incidencia,
             func.count(Incidencia.id_incidencia).label('cantidad')
-        ).group_by(Incidencia.tipo_incidencia).all()
+        ).group_by(Incidencia.tipo_incidencia))).all()
         
         incidencias_por_tipo = {
             tipo.tipo_incidencia: tipo.cantidad
@@ -178,62 +180,89 @@ async def get_incident_report(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def audit_history_query(fecha_inicio: Optional[str], fecha_fin: Optional[str], accion: Optional[str]):
+    """
+    Historial de auditoría con el usuario que hizo cada acción, filtrado por fechas (YYYY-MM-DD) y acción
+    Las fechas se validan al armar la consulta: ValueError si alguna es inválida
+    """
+    query = select(
+        Auditoria.id_auditoria.label("id"),
+        Auditoria.accion,
+        Auditoria.tabla_afectada,
+        Auditoria.id_registro.label("registro_id"),
+        Usuario.nombre.label("usuario"),
+        Usuario.correo_institucional.label("usuario_email"),
+        Auditoria.datos_nuevos.label("detalles"),
+        Auditoria.fecha_accion,
+    ).join(Usuario, Usuario.id_usuario == Auditoria.id_usuario)
+    
+    # Aplicar filtros
+    if fecha_inicio:
+        fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
+        query = query.where(Auditoria.fecha_accion >= fecha_inicio_dt)
+    
+    if fecha_fin:
+        fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d")
+        query = query.where(Auditoria.fecha_accion <= fecha_fin_dt)
+    
+    if accion:
+        query = query.where(Auditoria.accion == accion)
+    return query
+
 @app.get("/reports/auditoria")
 async def get_audit_history(
     fecha_inicio: Optional[str] = None,
     fecha_fin: Optional[str] = None,
     accion: Optional[str] = None,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Obtener historial de auditoría con filtros"""
+    """Obtener historial de auditoría con filtros; paginado si se pide cursor o limit (X-Next-Cursor)"""
     try:
-        query = db.query(Auditoria).join(Usuario)
-        
-        # Aplicar filtros
-        if fecha_inicio:
-            fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
-            query = query.filter(Auditoria.fecha_accion >= fecha_inicio_dt)
-        
-        if fecha_fin:
-            fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d")
-            query = query.filter(Auditoria.fecha_accion <= fecha_fin_dt)
-        
-        if accion:
-            query = query.filter(Auditoria.accion == accion)
-        
-        auditorias = query.order_by(Auditoria.fecha_accion.desc()).limit(limit).all()
-        
-        return [
-            {
-                "id": audit.id_auditoria,
-                "accion": audit.accion,
-                "tabla_afectada": audit.tabla_afectada,
-                "registro_id": audit.registro_id,
-                "usuario": audit.usuario.nombre,
-                "usuario_email": audit.usuario.correo_institucional,
-                "detalles": audit.detalles,
-                "fecha": audit.fecha_accion.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            for audit in auditorias
-        ]
+        query = audit_history_query(fecha_inicio, fecha_fin, accion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fecha inválida: {e}")
+    try:
+        auditorias, next_cursor = await fetch_page_async(db, AUDITORIA_KEYSET, query, cursor, limit)
+        for audit in auditorias:
+            audit["fecha"] = audit.pop("fecha_accion").strftime("%Y-%m-%d %H:%M:%S")
+        return page_response(auditorias, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/reports/auditoria/export")
+async def export_audit_history(
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    accion: Optional[str] = None,
+    formato: Literal["ndjson", "csv"] = "ndjson"
+):
+    """Exportar el historial de auditoría completo en orden cronológico, transmitido en NDJSON o CSV"""
+    try:
+        query = audit_history_query(fecha_inicio, fecha_fin, accion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Fecha inválida: {e}")
+    query = query.order_by(Auditoria.fecha_accion, Auditoria.id_auditoria)
+    return export_response(query, formato, "auditoria")
+
 @app.get("/reports/estadisticas")
-async def get_statistics(db: Session = Depends(get_db)):
+async def get_statistics(db: AsyncSession = Depends(get_async_db)):
     """Obtener estadísticas generales del sistema"""
     try:
         # Totales generales
-        total_usuarios = db.query(Usuario).filter(Usuario.activo == True).count()
-        total_espacios = db.query(Espacio).filter(Espacio.activo == True).count()
-        total_reservas = db.query(Reserva).count()
-        total_incidencias = db.query(Incidencia).count()
+        total_usuarios = await count_rows(db, Usuario, Usuario.activo == True)
+        total_espacios = await count_rows(db, Espacio, Espacio.activo == True)
+        total_reservas = await count_rows(db, Reserva)
+        total_incidencias = await count_rows(db, Incidencia)
         
         # Reservas por estado
-        reservas_aprobadas = db.query(Reserva).filter(Reserva.estado == 'aprobada').count()
-        reservas_pendientes = db.query(Reserva).filter(Reserva.estado == 'pendiente').count()
-        reservas_rechazadas = db.query(Reserva).filter(Reserva.estado == 'rechazada').count()
+        reservas = await count_by(db, Reserva.estado, ['aprobada', 'pendiente', 'rechazada'])
+        reservas_aprobadas = reservas['aprobada']
+        reservas_pendientes = reservas['pendiente']
+        reservas_rechazadas = reservas['rechazada']
         
         # Tasas de aprobación/rechazo
         total_procesadas = reservas_aprobadas + reservas_rechazadas
@@ -241,9 +270,7 @@ async def get_statistics(db: Session = Depends(get_db)):
         tasa_rechazo = (reservas_rechazadas / total_procesadas * 100) if total_procesadas > 0 else 0
         
         # Incidencias abiertas
-        incidencias_abiertas = db.query(Incidencia).filter(
-            Incidencia.estado.in_(['abierta', 'en_progreso'])
-        ).count()
+        incidencias_abiertas = await count_rows(db, Incidencia, Incidencia.estado.in_(['abierta', 'en_progreso']))
         
         return {
             "usuarios_activos": total_usuarios,
@@ -269,36 +296,36 @@ async def handle_soa_message(message: str):
         service_code, data = protocol.parse_message(message)
         
         if service_code.strip() == "report":
-            db = next(get_db())
-            
-            if "uso" in data and "fecha_inicio" in data["uso"] and "fecha_fin" in data["uso"]:
-                # Generar reporte de uso
-                request = ReporteUsoRequest(
-                    fecha_inicio=data["uso"]["fecha_inicio"],
-                    fecha_fin=data["uso"]["fecha_fin"]
-                )
-                result = await generate_usage_report(request, db)
-                response_data = {
-                    "ocupacion": result.ocupacion_porcentaje,
-                    "total_reservas": result.total_reservas,
-                    "espacios_mas_usados": result.espacios_mas_usados
-                }
+            async with AsyncSessionLocal() as db:
             
-            elif "audit" in data and "fecha" in data["audit"]:
-                # Generar reporte de auditoría
-                request = ReporteAuditoriaRequest(fecha=data["audit"]["fecha"])
-                result = await generate_audit_report(request, db)
-                response_data = [
-                    {
-                        "accion": accion["fecha"],
-                        "usuario": "Sistema",
-                        "fecha": accion["fecha"]
+                if "uso" in data and "fecha_inicio" in data["uso"] and "fecha_fin" in data["uso"]:
+                    # Generar reporte de uso
+                    request = ReporteUsoRequest(
+                        fecha_inicio=data["uso"]["fecha_inicio"],
+                        fecha_fin=data["uso"]["fecha_fin"]
+                    )
+                    result = await generate_usage_report(request, db)
+                    response_data = {
+                        "ocupacion": result.ocupacion_porcentaje,
+                        "total_reservas": result.total_reservas,
+                        "espacios_mas_usados": result.espacios_mas_usados
                     }
-                    for accion in result.acciones_por_dia
-                ]
             
-            else:
-                response_data = {"error": "Comando no reconocido"}
+                elif "audit" in data and "fecha" in data["audit"]:
+                    # Generar reporte de auditoría
+                    request = ReporteAuditoriaRequest(fecha=data["audit"]["fecha"])
+                    result = await generate_audit_report(request, db)
+                    response_data = [
+                        {
+                            "accion": accion["fecha"],
+                            "usuario": "Sistema",
+                            "fecha": accion["fecha"]
+                        }
+                        for accion in result.acciones_por_dia
+                    ]
+            
+                else:
+                    response_data = {"error": "Comando no reconocido"}
         
         else:
             response_data = {"error": "Servicio no reconocido"}
@@ -310,7 +337,7 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("report", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5009)
+    run_service(app, "REPORT", port=5009)
 
 
 
@@ -2,23 +2,166 @@
 Bus de Servicios SOA - Sistema de Reservación UDP
 Puerto: 5000
 """
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import logging
 import socket
 import threading
+import time
 import json
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Union
+
+from services.common.connection_pool import (
+    AsyncServiceConnectionPool, PoolTimeoutError, ServiceConnectionPool, open_socket, open_stream
+)
+from services.common.metrics import MetricsRegistry, start_metrics_server
+from services.common.priority_lanes import DEFAULT_LANE, LaneScheduler, LaneTimeout, parse_lane_map
+from services.common.rate_limiter import DEFAULT_USER_KEYS, RateLimiter
+from services.common.response_cache import ResponseCache, parse_ttls
+from services.common.service_guard import CircuitBreaker, ServiceGuard, parse_service_values
+from services.common.service_registry import NoReplicaAvailable, Replica, ServiceRegistry
+from services.common.single_flight import SingleFlight
+from services.common.soa_codecs import Codec, available_codecs
+from services.common.soa_compression import COMPRESS_MIN_BYTES, Compressor, choose_compressor
+from services.common.soa_protocol import (
+    BATCH_SERVICE, BUS_SERVICE, CAPS_SERVICE, FrameError, build_correlation, build_header, check_compression,
+    compress_frame, decode_frame, encode_frame, is_extended, read_frame, read_frame_async, split_codec,
+    split_correlation, split_frame
+)
+from services.common.structured_logging import Sampler, configure_logging, elapsed_ms
+from services.common.traffic_capture import TrafficCapture
+
+logger = logging.getLogger("service_bus")
 
 class ServiceBus:
     """Bus de servicios para comunicación SOA"""
     
-    def __init__(self, host: str = "localhost", port: int = 5000):
+    def __init__(self, host: str = "localhost", port: int = 5000,
+                 pool_size: int = None, pool_idle_timeout: float = None,
+                 service_config: Dict[str, dict] = None, listen_socket: socket.socket = None,
+                 reuse_port: bool = False):
         self.host = host
         self.port = port
+        # Varios procesos comparten el puerto con SO_REUSEPORT o con un socket heredado
+        self.listen_socket = listen_socket
+        self.reuse_port = reuse_port
+        self.backlog = int(os.getenv("BUS_BACKLOG", "4096"))
         self.services = {}  # Diccionario de servicios registrados
         self.running = False
         self.server_socket = None
         
-        # Configuración de servicios
-        self.service_config = {
+        # Configuración de servicios: {"host", "port"}, {"unix": ruta} o {"replicas": [...], "strategy": ...}
+        self.service_config = service_config or self.default_service_config()
+        
+        # Réplicas por servicio con balanceo y sondeo de salud
+        self.registry = ServiceRegistry.from_config(
+            self.service_config,
+            default_strategy=os.getenv("BUS_BALANCER", "round_robin"),
+            max_failures=int(os.getenv("BUS_HEALTH_MAX_FAILURES", "2"))
+        )
+        self.health_interval = float(os.getenv("BUS_HEALTH_INTERVAL", "5"))
+        
+        # Plazos, límite de peticiones en vuelo y circuit breaker por servicio
+        self.deadline = float(os.getenv("BUS_DEADLINE", "10"))
+        self.deadlines = parse_service_values(os.getenv("BUS_DEADLINES", ""))
+        self.max_in_flight = int(os.getenv("BUS_MAX_IN_FLIGHT", "64"))
+        self.breaker_failures = int(os.getenv("BUS_BREAKER_FAILURES", "5"))
+        self.breaker_reset = float(os.getenv("BUS_BREAKER_RESET", "30"))
+        self.guards: Dict[str, ServiceGuard] = {}
+        self.guards_lock = threading.Lock()
+        
+        # Pools de conexiones persistentes por servicio (pool_size=0 los desactiva)
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv("BUS_POOL_SIZE", "8"))
+        self.pool_idle_timeout = (pool_idle_timeout if pool_idle_timeout is not None
+                                  else float(os.getenv("BUS_POOL_IDLE_TIMEOUT", "60")))
+        self.pools: Dict[tuple, ServiceConnectionPool] = {}
+        self.pools_lock = threading.Lock()
+        
+        # Pipelining: peticiones con correlation ID en vuelo por conexión y workers compartidos
+        self.pipeline_depth = int(os.getenv("BUS_PIPELINE_DEPTH", "32"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BUS_PIPELINE_WORKERS", "64")),
+            thread_name_prefix="bus-pipeline"
+        )
+        
+        # Lotes: sub-peticiones atendidas en paralelo por un grupo de workers propio
+        # (separado de los de pipelining para que un lote no espere por sí mismo)
+        self.batch_max = int(os.getenv("BUS_BATCH_MAX", "32"))
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BUS_BATCH_WORKERS", "32")),
+            thread_name_prefix="bus-batch"
+        )
+        
+        # Carriles de prioridad con weighted fair queuing sobre los cupos de reenvío (BUS_LANE_SLOTS=0 los desactiva)
+        self.scheduler = None
+        lane_slots = int(os.getenv("BUS_LANE_SLOTS", "64"))
+        if lane_slots > 0:
+            lanes = os.getenv("BUS_LANES")
+            lane_map = os.getenv("BUS_LANE_MAP")
+            self.scheduler = LaneScheduler(
+                lane_slots,
+                lanes=parse_service_values(lanes) if lanes else None,
+                lane_map=parse_lane_map(lane_map) if lane_map else None,
+                limits=parse_service_values(os.getenv("BUS_LANE_LIMITS", "")),
+                default_lane=os.getenv("BUS_LANE_DEFAULT", DEFAULT_LANE)
+            )
+        
+        # Límite de peticiones por cliente y servicio (sin BUS_RATE_LIMITS ni BUS_RATE_DEFAULT no se limita)
+        self.rate_limiter = None
+        rates = parse_service_values(os.getenv("BUS_RATE_LIMITS", ""))
+        default_rate = float(os.getenv("BUS_RATE_DEFAULT", "0"))
+        if rates or default_rate > 0:
+            user_keys = os.getenv("BUS_RATE_USER_KEYS")
+            self.rate_limiter = RateLimiter(
+                rates,
+                bursts=parse_service_values(os.getenv("BUS_RATE_BURSTS", "")),
+                default_rate=default_rate,
+                by_user=os.getenv("BUS_RATE_BY_USER", "0") == "1",
+                user_keys=user_keys.split(",") if user_keys else DEFAULT_USER_KEYS,
+                max_keys=int(os.getenv("BUS_RATE_MAX_KEYS", "100000"))
+            )
+        
+        # Métricas en proceso y logging muestreado de eventos por mensaje
+        self.metrics = MetricsRegistry()
+        self.describe_metrics()
+        self.metrics_port = int(os.getenv("BUS_METRICS_PORT", "0"))  # 0 = sin endpoint HTTP
+        self.metrics_server = None
+        self.sample = Sampler(float(os.getenv("BUS_LOG_SAMPLE", "0.01")))
+        
+        # Compresión de respuestas grandes, negociada por conexión (BUS_COMPRESSION_ENABLED=0 la desactiva)
+        self.compression_enabled = os.getenv("BUS_COMPRESSION_ENABLED", "1") == "1"
+        self.compress_min = int(os.getenv("BUS_COMPRESS_MIN_BYTES", str(COMPRESS_MIN_BYTES)))
+        
+        # Caché de lecturas idempotentes (BUS_CACHE_ENABLED=0 la desactiva)
+        self.cache = None
+        if os.getenv("BUS_CACHE_ENABLED", "1") == "1":
+            ttls = os.getenv("BUS_CACHE_TTLS")
+            self.cache = ResponseCache(
+                ttls=parse_ttls(ttls) if ttls else None,
+                max_bytes=int(os.getenv("BUS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+            )
+        
+        # Lecturas idénticas concurrentes comparten una llamada (BUS_COALESCE_ENABLED=0 lo desactiva)
+        self.coalescer = SingleFlight() if os.getenv("BUS_COALESCE_ENABLED", "1") == "1" else None
+        
+        # Comandos _bus: sólo desde loopback o con este token en el payload (vacío = sólo loopback)
+        self.admin_token = os.getenv("BUS_ADMIN_TOKEN", "")
+        
+        # Captura de tráfico para reproducirlo fuera de línea (BUS_CAPTURE_FILE vacío = sin captura)
+        capture_path = os.getenv("BUS_CAPTURE_FILE", "")
+        self.capture = TrafficCapture(capture_path) if capture_path else None
+    
+    @staticmethod
+    def default_service_config() -> Dict[str, dict]:
+        """Servicios en localhost; <SERVICIO>_SERVICE_SOCKET los conecta por socket Unix"""
+        config = {
             "auth": {"host": "localhost", "port": 5001},
             "user": {"host": "localhost", "port": 5002},
             "space": {"host": "localhost", "port": 5003},
@@ -29,15 +172,228 @@ class ServiceBus:
             "notif": {"host": "localhost", "port": 5008},
             "report": {"host": "localhost", "port": 5009}
         }
+        for service_code, entry in config.items():
+            path = os.getenv(f"{service_code.upper()}_SERVICE_SOCKET")
+            if path:
+                entry["unix"] = path
+        return config
+    
+    def get_pool(self, replica: Replica) -> ServiceConnectionPool:
+        """Obtener (o crear) el pool de conexiones de una réplica"""
+        pool = self.pools.get(replica.key)
+        if pool is None:
+            with self.pools_lock:
+                pool = self.pools.get(replica.key)
+                if pool is None:
+                    pool = ServiceConnectionPool(
+                        replica.host, replica.port,
+                        max_size=self.pool_size,
+                        idle_timeout=self.pool_idle_timeout,
+                        unix=replica.unix
+                    )
+                    self.pools[replica.key] = pool
+        return pool
+    
+    def close_pool(self, replica: Replica):
+        """Cerrar el pool de una réplica dada de baja"""
+        with self.pools_lock:
+            pool = self.pools.pop(replica.key, None)
+        if pool is not None:
+            pool.close()
+    
+    def get_guard(self, service_code: str) -> ServiceGuard:
+        """Obtener (o crear) la protección de un servicio"""
+        guard = self.guards.get(service_code)
+        if guard is None:
+            with self.guards_lock:
+                guard = self.guards.get(service_code)
+                if guard is None:
+                    config = self.service_config.get(service_code, {})
+                    guard = ServiceGuard(
+                        service_code,
+                        deadline=float(config.get("deadline", self.deadlines.get(service_code, self.deadline))),
+                        max_in_flight=int(config.get("max_in_flight", self.max_in_flight)),
+                        breaker=CircuitBreaker(self.breaker_failures, self.breaker_reset)
+                    )
+                    self.guards[service_code] = guard
+        return guard
+    
+    def describe_metrics(self):
+        """Textos HELP de las métricas del bus y métricas calculadas al exportar"""
+        self.metrics.describe("soa_bus_requests_total", "Peticiones reenviadas por servicio")
+        self.metrics.describe("soa_bus_errors_total", "Errores del bus por servicio y tipo")
+        self.metrics.describe("soa_bus_request_duration_seconds", "Latencia de reenvío por servicio")
+        self.metrics.describe("soa_bus_received_bytes_total", "Bytes recibidos de clientes por servicio")
+        self.metrics.describe("soa_bus_sent_bytes_total", "Bytes enviados a clientes por servicio")
+        self.metrics.describe("soa_bus_in_flight", "Peticiones en curso por servicio")
+        self.metrics.describe("soa_bus_breaker_state", "Circuit breaker: 0 cerrado, 1 semiabierto, 2 abierto")
+        self.metrics.describe("soa_bus_compression_saved_bytes_total", "Bytes ahorrados al comprimir respuestas")
+        self.metrics.describe("soa_bus_coalesce_calls_total", "Lecturas enviadas al servicio con coalescencia activa")
+        self.metrics.describe("soa_bus_coalesced_total", "Lecturas atendidas con la llamada en vuelo de otra petición")
+        self.metrics.describe("soa_bus_rate_limit_keys", "Buckets de límite de peticiones en memoria")
+        self.metrics.describe("soa_bus_rate_limit_evictions_total", "Buckets desalojados por el límite de memoria")
+        self.metrics.describe("soa_bus_lane_wait_seconds", "Espera por un cupo de reenvío por carril")
+        self.metrics.describe("soa_bus_lane_queue_depth", "Peticiones esperando cupo por carril")
+        self.metrics.describe("soa_bus_lane_active", "Cupos de reenvío ocupados por carril")
+        self.metrics.describe("soa_bus_lane_expired_total", "Peticiones cuyo plazo venció esperando cupo, por carril")
+        self.metrics.add_collector(self.collect_metrics)
+    
+    def collect_metrics(self):
+        """Métricas de caché, circuit breakers y réplicas, leídas al exportar"""
+        if self.cache is not None:
+            stats = self.cache.stats()
+            yield "cache_hits_total", "counter", {}, stats["hits"]
+            yield "cache_misses_total", "counter", {}, stats["misses"]
+            yield "cache_evictions_total", "counter", {}, stats["evictions"]
+            yield "cache_bytes", "gauge", {}, stats["bytes"]
+        if self.coalescer is not None:
+            stats = self.coalescer.stats()
+            for service_code, count in stats["calls"].items():
+                yield "coalesce_calls_total", "counter", {"service": service_code}, count
+            for service_code, count in stats["coalesced"].items():
+                yield "coalesced_total", "counter", {"service": service_code}, count
+        if self.rate_limiter is not None:
+            stats = self.rate_limiter.stats()
+            yield "rate_limit_keys", "gauge", {}, stats["keys"]
+            yield "rate_limit_evictions_total", "counter", {}, stats["evictions"]
+        if self.scheduler is not None:
+            for lane, info in self.scheduler.stats()["lanes"].items():
+                yield "lane_queue_depth", "gauge", {"lane": lane}, info["queued"]
+                yield "lane_active", "gauge", {"lane": lane}, info["active"]
+                yield "lane_admitted_total", "counter", {"lane": lane}, info["admitted"]
+                yield "lane_expired_total", "counter", {"lane": lane}, info["expired"]
+        states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        for service_code, guard in list(self.guards.items()):
+            yield "breaker_state", "gauge", {"service": service_code}, states[guard.breaker.state]
+            yield "breaker_opens_total", "counter", {"service": service_code}, guard.breaker.opens
+        for service_code, info in self.registry.snapshot().items():
+            for replica in info["replicas"]:
+                name = f"unix:{replica['unix']}" if replica["unix"] else f"{replica['host']}:{replica['port']}"
+                labels = {"service": service_code, "replica": name}
+                yield "replica_healthy", "gauge", labels, int(replica["healthy"])
+                yield "replica_outstanding", "gauge", labels, replica["outstanding"]
+    
+    def metric_label(self, service_code: str) -> str:
+        """Etiqueta de servicio para métricas, acotada a los servicios conocidos"""
+        if service_code == BATCH_SERVICE or service_code in self.registry:
+            return service_code
+        return "unknown"
+    
+    def count_error(self, service_code: str, kind: str):
+        self.metrics.inc("errors_total", service=self.metric_label(service_code), kind=kind)
+    
+    def record_request(self, label: str, start: float, received: int, sent: int, correlation_id: Optional[int]):
+        """Registrar métricas de una petición terminada y, muestreado, su evento de log"""
+        self.metrics.add("in_flight", -1, service=label)
+        self.metrics.inc("requests_total", service=label)
+        self.metrics.observe("request_duration_seconds", time.perf_counter() - start, service=label)
+        self.metrics.inc("received_bytes_total", received, service=label)
+        self.metrics.inc("sent_bytes_total", sent, service=label)
+        if self.sample() and logger.isEnabledFor(logging.INFO):
+            logger.info("request", extra={"fields": {
+                "service": label, "corr": correlation_id, "bytes_in": received,
+                "bytes_out": sent, "ms": elapsed_ms(start)
+            }})
+    
+    def process(self, service_code: str, data: Any, extended: bool, received: int,
+                correlation_id: Optional[int] = None) -> bytes:
+        """Reenviar una petición de cliente y preparar su respuesta, con métricas"""
+        label = self.metric_label(service_code)
+        self.metrics.add("in_flight", 1, service=label)
+        start = time.perf_counter()
+        response = b""
+        try:
+            response = self.forward_to_service(service_code, data)
+            response = self.finish_response(service_code, response, extended)
+            return response
+        finally:
+            self.record_request(label, start, received, len(response), correlation_id)
+    
+    def rate_limit(self, service_code: str, data: Any, client: str, codec: Codec, extended: bool) -> Optional[bytes]:
+        """Respuesta de rechazo si el cliente superó su límite para el servicio (None si se admite)"""
+        if self.rate_limiter is None or service_code in (CAPS_SERVICE, BUS_SERVICE):
+            return None
+        if service_code == BATCH_SERVICE:
+            # Cada sub-petición consume del bucket de su servicio
+            try:
+                items = [(code, sub_data) for code, sub_data, error in self.parse_batch(data) if error is None]
+            except ValueError:
+                return None  # handle_batch responde el error de formato
+        else:
+            items = [(service_code, data)]
+        for code, sub_data in items:
+            retry_after = self.rate_limiter.check(code, sub_data, client)
+            if retry_after is not None:
+                self.count_error(service_code, "rate_limited")
+                error = {"error": f"Límite de peticiones excedido para {code}, reintente en {retry_after:.2f}s",
+                         "retry_after": round(retry_after, 3)}
+                return encode_frame(service_code, error, codec, extended)
+        return None
+    
+    def lane_for(self, service_code: str, data: Any, client: str) -> Optional[str]:
+        """Carril de prioridad de una petición (None si los carriles están desactivados)"""
+        if self.scheduler is None:
+            return None
+        return self.scheduler.lane_for(service_code, data, client)
+    
+    def lane_timeout(self, service_code: str) -> float:
+        """Espera máxima por un cupo: el plazo del servicio"""
+        if service_code in self.registry:
+            return self.get_guard(service_code).deadline
+        return self.deadline
+    
+    def lane_rejection(self, service_code: str, codec: Codec, extended: bool, error: str) -> bytes:
+        """Respuesta para una petición cuyo plazo venció esperando cupo"""
+        self.count_error(service_code, "lane_timeout")
+        return encode_frame(service_code, {"error": error}, codec, extended)
+    
+    def process_in_lane(self, service_code: str, data: Any, codec: Codec, extended: bool,
+                        received: int, client: str = "") -> bytes:
+        """Esperar turno en el carril de la petición y luego procesarla"""
+        lane = self.lane_for(service_code, data, client)
+        if lane is None:
+            return self.process(service_code, data, extended, received)
+        try:
+            waited = self.scheduler.acquire(lane, self.lane_timeout(service_code))
+        except LaneTimeout as e:
+            return self.lane_rejection(service_code, codec, extended, str(e))
+        self.metrics.observe("lane_wait_seconds", waited, lane=lane)
+        try:
+            return self.process(service_code, data, extended, received)
+        finally:
+            self.scheduler.release(lane)
+    
+    def start_background(self):
+        """Tareas de fondo: sondeo de réplicas y endpoint HTTP de métricas"""
+        self.registry.start_probing(self.health_interval)
+        if self.metrics_port and self.metrics_server is None:
+            self.metrics_server = start_metrics_server(self.metrics, self.host, self.metrics_port)
+            logger.info("Métricas disponibles en http://%s:%s/metrics", self.host, self.metrics_port)
+    
+    def stop_background(self):
+        self.registry.stop_probing()
+        if self.capture is not None:
+            self.capture.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server.server_close()
+            self.metrics_server = None
+    
+    def create_listener(self) -> socket.socket:
+        """Socket de escucha del bus (el heredado del supervisor, si existe)"""
+        if self.listen_socket is not None:
+            return self.listen_socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        return sock
     
     def parse_message(self, message: str) -> tuple:
-        """Parsear mensaje según protocolo SOA"""
-        if len(message) < 10:
-            raise ValueError("Mensaje muy corto")
-        
-        length_str = message[:5]
-        service_code = message[5:10].strip()
-        data_str = message[10:]
+        """Parsear mensaje según protocolo SOA (cabecera clásica o extendida)"""
+        service_code, data_str = split_frame(message)
         
         try:
             data = json.loads(data_str) if data_str else {}
@@ -45,83 +401,422 @@ class ServiceBus:
         except json.JSONDecodeError:
             raise ValueError("Error al decodificar JSON")
     
-    def format_response(self, service_code: str, data: Any) -> str:
+    def format_response(self, service_code: str, data: Any, extended: bool = False) -> str:
         """Formatear respuesta según protocolo SOA"""
         json_data = json.dumps(data, ensure_ascii=False)
         service_code = service_code.ljust(5)[:5]
         message = service_code + json_data
-        length_str = str(len(message)).zfill(5)
+        length_str = build_header(len(message.encode('utf-8')), extended)  # Longitud en bytes UTF-8
         
         return length_str + message
     
-    def forward_to_service(self, service_code: str, data: Dict[str, Any]) -> str:
-        """Reenviar mensaje a servicio específico"""
+    def negotiate_caps(self, data: Any) -> bool:
+        """Responder a la negociación de capacidades: retorna si el cliente acepta cabecera extendida"""
+        return isinstance(data, dict) and data.get("ext") is True
+    
+    def negotiate_compression(self, data: Any) -> Optional[Compressor]:
+        """Elegir la compresión de respuestas entre las que ofrece el cliente en _caps"""
+        if not self.compression_enabled or not isinstance(data, dict):
+            return None
+        return choose_compressor(data.get("compress"))
+    
+    def capabilities(self, extended: bool, compressor: Optional[Compressor] = None) -> dict:
+        """Capacidades anunciadas al cliente en la respuesta a _caps"""
+        return {"ext": extended, "corr": True, "codecs": available_codecs(), "batch": self.batch_max,
+                "compress": compressor.name if compressor else None}
+    
+    def with_correlation(self, response: Union[str, bytes], correlation_id: Optional[int],
+                         compressor: Optional[Compressor] = None) -> bytes:
+        """
+        Codificar la respuesta: comprimida si se negoció y supera el umbral, y con el
+        prefijo de correlación de la petición, si lo tenía
+        """
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        if compressor is not None and len(response) >= self.compress_min:
+            compressed = compress_frame(response, compressor, self.compress_min)
+            self.metrics.inc("compression_saved_bytes_total", len(response) - len(compressed),
+                             algorithm=compressor.name)
+            response = compressed
+        if correlation_id is None:
+            return response
+        return build_correlation(correlation_id).encode('ascii') + response
+    
+    def adapt_response(self, service_code: str, response: str, extended: bool) -> str:
+        """Reemplazar por un error las respuestas extendidas destinadas a clientes que no las negociaron"""
+        if extended or not is_extended(response):
+            return response
+        return self.format_response(service_code, {
+            "error": "Respuesta excede 99999 bytes; el cliente debe negociar cabecera extendida"
+        })
+    
+    def finish_response(self, service_code: str, response: Union[str, bytes], extended: bool) -> bytes:
+        """
+        Preparar la respuesta del servicio para el cliente
+        Los servicios responden en JSON y la trama se entrega tal cual aunque el cliente pida
+        otro codec: el cliente decodifica cada trama según su prefijo, y traducirla aquí costaba
+        un json.loads más un encode por respuesta en el bus.
+        """
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        if is_extended(response) and not extended:
+            return self.adapt_response(service_code, response.decode('utf-8'), extended).encode('utf-8')
+        return response
+    
+    def admin_allowed(self, data: Any, client: str) -> bool:
+        """Comandos _bus desde loopback (o socket Unix) o con {"token": BUS_ADMIN_TOKEN}"""
+        if self.admin_token and isinstance(data, dict) and isinstance(data.get("token"), str):
+            if hmac.compare_digest(data["token"].encode("utf-8"), self.admin_token.encode("utf-8")):
+                return True
+        if not client:
+            return True  # Peer sin dirección IP: socket Unix del mismo equipo
         try:
-            if service_code not in self.service_config:
-                return self.format_response(service_code, {"error": "Servicio no encontrado"})
+            address = ipaddress.ip_address(client.split("%", 1)[0])
+        except ValueError:
+            return False
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        return address.is_loopback
+    
+    def handle_admin(self, data: Any, client: str = "") -> dict:
+        """Atender comandos de operación del bus (código _bus)"""
+        if not self.admin_allowed(data, client):
+            self.count_error(BUS_SERVICE, "forbidden")
+            logger.warning("Comando _bus rechazado", extra={"fields": {"client": client}})
+            return {"error": "Comando _bus no autorizado"}
+        
+        if not isinstance(data, dict):
+            return {"error": "Comando no reconocido"}
+        
+        if "stats" in data:
+            return {
+                "cache": self.cache.stats() if self.cache else None,
+                "coalesce": self.coalescer.stats() if self.coalescer else None,
+                "capture": self.capture.stats() if self.capture else None,
+                "rate_limit": self.rate_limiter.stats() if self.rate_limiter else None
+            }
+        
+        if "lanes" in data:
+            return {"lanes": self.scheduler.stats() if self.scheduler else None}
+        
+        if "metrics" in data:
+            return {"metrics": self.metrics.render()}
+        
+        if "replicas" in data:
+            return {"replicas": self.registry.snapshot()}
+        
+        if "breakers" in data:
+            return {"services": {code: guard.snapshot() for code, guard in list(self.guards.items())}}
+        
+        if "register" in data or "deregister" in data:
+            params = data.get("register") or data.get("deregister")
+            try:
+                service_code = str(params["service"])
+                unix = str(params["unix"]) if params.get("unix") else None
+                host = str(params.get("host", "localhost")) if unix else str(params["host"])
+                port = int(params.get("port", 0)) if unix else int(params["port"])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return {"error": "Se requiere service, y host y port o unix"}
             
-            config = self.service_config[service_code]
+            if "register" in data:
+                self.registry.register(service_code, host, port, unix)
+                if "strategy" in params:
+                    try:
+                        self.registry.set_strategy(service_code, params["strategy"])
+                    except ValueError as e:
+                        return {"error": str(e)}
+                return {"registered": True, "replicas": self.registry.snapshot().get(service_code)}
             
+            replica = self.registry.deregister(service_code, host, port, unix)
+            if replica is None:
+                return {"error": "Réplica no registrada"}
+            self.close_pool(replica)
+            return {"deregistered": True, "replicas": self.registry.snapshot().get(service_code)}
+        
+        return {"error": "Comando no reconocido"}
+    
+    def cache_lookup(self, service_code: str, data: Dict[str, Any]) -> tuple:
+        """Consultar la caché: retorna (llave, respuesta o None, generación)"""
+        if self.cache is None:
+            return None, None, 0
+        key = self.cache.key_for(service_code, data)
+        if key is None:
+            # Una escritura invalida la caché antes de llegar al servicio...
+            self.cache.observe(service_code, data)
+            return None, None, 0
+        cached, generation = self.cache.get(key)
+        return key, cached, generation
+    
+    def cache_store(self, service_code: str, data: Dict[str, Any], key: Optional[tuple],
+                    generation: int, response: Union[str, bytes]):
+        """Guardar una lectura exitosa, o invalidar de nuevo tras una escritura"""
+        if self.cache is None:
+            return
+        if key is None:
+            # ...y otra vez al terminar, por lecturas que corrieron durante la escritura
+            self.cache.observe(service_code, data)
+            return
+        try:
+            _, response_data, _ = decode_frame(response.encode('utf-8') if isinstance(response, str) else response)
+        except ValueError:
+            return
+        if not (isinstance(response_data, dict) and "error" in response_data):
+            self.cache.put(key, response, generation)
+    
+    def parse_batch(self, data: Any) -> List[tuple]:
+        """Validar un lote: retorna [(service_code, datos, error)] en el orden recibido"""
+        requests = data.get("requests") if isinstance(data, dict) else None
+        if not isinstance(requests, list):
+            raise ValueError('Formato de lote: {"requests": [{"service": ..., "data": ...}, ...]}')
+        if len(requests) > self.batch_max:
+            raise ValueError(f"El lote excede {self.batch_max} peticiones")
+        
+        items = []
+        for request in requests:
+            service_code = request.get("service") if isinstance(request, dict) else None
+            if not isinstance(service_code, str):
+                items.append((None, None, "Petición de lote inválida"))
+            elif service_code in (CAPS_SERVICE, BUS_SERVICE, BATCH_SERVICE):
+                items.append((service_code, None, "Servicio no permitido dentro de un lote"))
+            else:
+                items.append((service_code, request.get("data", {}), None))
+        return items
+    
+    def batch_item(self, service_code: str, response: Union[str, bytes]) -> dict:
+        """Convertir la respuesta de una sub-petición en un elemento del lote"""
+        try:
+            _, response_data, _ = decode_frame(response.encode('utf-8') if isinstance(response, str) else response)
+        except ValueError as e:
+            return {"service": service_code, "ok": False, "error": str(e)}
+        if isinstance(response_data, dict) and "error" in response_data:
+            return {"service": service_code, "ok": False, "error": response_data["error"]}
+        return {"service": service_code, "ok": True, "data": response_data}
+    
+    def handle_batch(self, data: Any) -> str:
+        """Atender un lote: reenviar las sub-peticiones en paralelo y agregar sus respuestas"""
+        try:
+            items = self.parse_batch(data)
+        except ValueError as e:
+            return self.format_response(BATCH_SERVICE, {"error": str(e)})
+        
+        futures = [
+            self.batch_executor.submit(self.forward_to_service, service_code, sub_data) if error is None else None
+            for service_code, sub_data, error in items
+        ]
+        responses = []
+        for (service_code, _, error), future in zip(items, futures):
+            if future is None:
+                responses.append({"service": service_code, "ok": False, "error": error})
+                continue
+            try:
+                responses.append(self.batch_item(service_code, future.result()))
+            except Exception as e:
+                responses.append({"service": service_code, "ok": False, "error": str(e)})
+        return self.format_response(BATCH_SERVICE, {"responses": responses}, extended=True)
+    
+    def forward_to_service(self, service_code: str, data: Dict[str, Any]) -> str:
+        """Reenviar mensaje a servicio específico, respondiendo desde caché las lecturas vigentes"""
+        if service_code == BATCH_SERVICE:
+            return self.handle_batch(data)
+        key, cached, generation = self.cache_lookup(service_code, data)
+        if cached is not None:
+            return cached
+        flight = self.flight_key(service_code, data)
+        if flight is None:
+            response = self.send_to_service(service_code, data)
+        else:
+            response = self.coalescer.do(flight, lambda: self.send_to_service(service_code, data))
+        self.cache_store(service_code, data, key, generation, response)
+        return response
+    
+    def flight_key(self, service_code: str, data: Dict[str, Any]) -> Optional[tuple]:
+        """Llave de coalescencia de una lectura; las escrituras abren una nueva generación"""
+        if self.coalescer is None:
+            return None
+        key = self.coalescer.key_for(service_code, data)
+        if key is None:
+            self.coalescer.observe(service_code, data)
+        return key
+    
+    def send_to_service(self, service_code: str, data: Dict[str, Any]) -> str:
+        """Enviar mensaje al servicio y retornar su respuesta"""
+        if service_code not in self.registry:
+            self.count_error(service_code, "not_found")
+            return self.format_response(service_code, {"error": "Servicio no encontrado"})
+        
+        # Rechazo inmediato si el servicio está saturado o con el circuito abierto
+        guard = self.get_guard(service_code)
+        rejection = guard.admit()
+        if rejection is not None:
+            self.count_error(service_code, "rejected")
+            return self.format_response(service_code, {"error": rejection})
+        
+        try:
+            replica = self.registry.choose(service_code)
+        except NoReplicaAvailable as e:
+            guard.finish(False)
+            self.count_error(service_code, "unavailable")
+            return self.format_response(service_code, {"error": str(e)})
+        
+        start = time.monotonic()
+        ok = False
+        timed_out = False
+        try:
             # Crear mensaje para el servicio
-            message = self.format_response(service_code, data)
+            message = self.format_response(service_code, data, extended=True)
             
-            # Conectar al servicio
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-                client_socket.connect((config["host"], config["port"]))
-                client_socket.sendall(message.encode('utf-8'))
-                
-                # Recibir respuesta
-                response = client_socket.recv(4096).decode('utf-8')
-                return response
-                
+            if self.pool_size > 0:
+                # Reutilizar una conexión persistente del pool de la réplica
+                response = self.get_pool(replica).request(message.encode('utf-8'), timeout=guard.deadline)
+                response = response.decode('utf-8')
+            else:
+                # Conectar al servicio (el plazo aplica a cada operación del socket)
+                with open_socket(replica.host, replica.port, replica.unix, timeout=guard.deadline) as client_socket:
+                    client_socket.sendall(message.encode('utf-8'))
+                    
+                    # Recibir respuesta completa según la longitud declarada
+                    response = read_frame(client_socket).decode('utf-8')
+            ok = True
+            return response
+        
+        except (socket.timeout, PoolTimeoutError):
+            timed_out = True
+            self.count_error(service_code, "timeout")
+            return self.format_response(service_code, {"error": f"Tiempo de espera agotado ({guard.deadline:g}s)"})
         except Exception as e:
+            self.count_error(service_code, "communication")
             return self.format_response(service_code, {"error": f"Error de comunicación: {str(e)}"})
+        finally:
+            self.registry.release(replica, time.monotonic() - start, ok)
+            guard.finish(ok, timed_out)
     
     def handle_client(self, client_socket: socket.socket, address: tuple):
         """Manejar cliente conectado"""
+        send_lock = threading.Lock()  # Las respuestas en paralelo no deben intercalarse
+        in_flight = threading.BoundedSemaphore(self.pipeline_depth)
+        connection = self.capture.new_connection() if self.capture is not None else 0
+        client = address[0] if isinstance(address, tuple) else ""
         try:
-            print(f"Conexión establecida desde {address}")
+            logger.debug("Conexión establecida", extra={"fields": {"client": address}})
+            
+            extended = False  # Cabecera extendida negociada con este cliente
+            compressor = None  # Compresión de respuestas negociada con este cliente
             
             while True:
-                # Recibir mensaje
-                message = client_socket.recv(4096).decode('utf-8')
-                if not message:
+                # Recibir mensaje completo
+                try:
+                    frame = read_frame(client_socket)
+                except ConnectionError:
+                    break
+                except FrameError as e:
+                    # Cabecera inválida: el flujo quedó desincronizado
+                    client_socket.sendall(self.format_response("error", {"error": str(e)}).encode('utf-8'))
                     break
                 
-                print(f"Mensaje recibido: {message[:50]}...")
-                
+                received = len(frame)
+                if self.capture is not None:
+                    self.capture.request(connection, frame)
+                correlation_id = None
                 try:
-                    # Parsear mensaje
-                    service_code, data = self.parse_message(message)
-                    print(f"Servicio: {service_code}, Datos: {data}")
+                    correlation_id, frame = split_correlation(frame)
+                    check_compression(frame, compressor)
+                    
+                    # Parsear mensaje con el codec indicado en su prefijo (JSON por defecto)
+                    service_code, data, codec = decode_frame(frame)
+                    extended = extended or is_extended(split_codec(frame)[1])
+                    limited = self.rate_limit(service_code, data, client, codec, extended)
                     
-                    # Reenviar a servicio correspondiente
-                    response = self.forward_to_service(service_code, data)
+                    if service_code == CAPS_SERVICE:
+                        # Negociación de capacidades, atendida por el propio bus
+                        extended = self.negotiate_caps(data)
+                        compressor = self.negotiate_compression(data)
+                        caps = self.capabilities(extended, compressor)
+                        response = self.format_response(CAPS_SERVICE, caps).encode('utf-8')
+                    elif service_code == BUS_SERVICE:
+                        # Comandos de operación, atendidos por el propio bus
+                        response = encode_frame(BUS_SERVICE, self.handle_admin(data, client), codec)
+                    elif limited is not None:
+                        # Cliente sobre su límite: se responde sin reenviar al servicio
+                        response = limited
+                    elif correlation_id is not None:
+                        # Petición con correlation ID: se atiende en paralelo y se responde al terminar
+                        in_flight.acquire()
+                        args = (client_socket, send_lock, in_flight, correlation_id, service_code, data,
+                                codec, extended, received, connection, compressor)
+                        lane = self.lane_for(service_code, data, client)
+                        if lane is None:
+                            self.executor.submit(self.handle_pipelined, *args)
+                        else:
+                            # Espera su turno en el carril sin ocupar un worker
+                            self.scheduler.submit(
+                                lane, self.lane_timeout(service_code),
+                                lambda waited, args=args, lane=lane:
+                                    self.executor.submit(self.handle_pipelined, *args, lane, waited)
+                            )
+                        continue
+                    else:
+                        # Reenviar a servicio correspondiente
+                        response = self.process_in_lane(service_code, data, codec, extended, received, client)
                     
                     # Enviar respuesta
-                    client_socket.sendall(response.encode('utf-8'))
-                    print(f"Respuesta enviada: {response[:50]}...")
+                    with send_lock:
+                        client_socket.sendall(self.with_correlation(response, correlation_id, compressor))
                     
                 except ValueError as e:
-                    error_response = self.format_response("error", {"error": str(e)})
-                    client_socket.sendall(error_response.encode('utf-8'))
+                    self.count_error("", "protocol")
+                    response = self.format_response("error", {"error": str(e)})
+                    with send_lock:
+                        client_socket.sendall(self.with_correlation(response, correlation_id, compressor))
+                
+                if self.capture is not None:
+                    self.capture.response(connection, correlation_id, len(response))
                 
         except Exception as e:
-            print(f"Error manejando cliente {address}: {e}")
+            logger.warning("Error manejando cliente", extra={"fields": {"client": address, "error": str(e)}})
         finally:
+            # Esperar las respuestas con correlation ID que siguen en vuelo
+            for _ in range(self.pipeline_depth):
+                in_flight.acquire()
             client_socket.close()
-            print(f"Conexión cerrada con {address}")
+            logger.debug("Conexión cerrada", extra={"fields": {"client": address}})
+    
+    def handle_pipelined(self, client_socket: socket.socket, send_lock: threading.Lock,
+                         in_flight: threading.BoundedSemaphore, correlation_id: int,
+                         service_code: str, data: Dict[str, Any], codec: Codec, extended: bool,
+                         received: int = 0, connection: int = 0, compressor: Optional[Compressor] = None,
+                         lane: Optional[str] = None, waited: Optional[float] = 0.0):
+        """Reenviar una petición con correlation ID y responder apenas termine
+
+        Con carriles activos llega con el cupo ya asignado (`waited` segundos de espera),
+        o con waited=None si su plazo venció en la cola.
+        """
+        try:
+            if lane is not None and waited is None:
+                response = self.lane_rejection(service_code, codec, extended,
+                                               f"Tiempo de espera agotado en el carril {lane}")
+            else:
+                if lane is not None:
+                    self.metrics.observe("lane_wait_seconds", waited, lane=lane)
+                response = self.process(service_code, data, extended, received, correlation_id)
+            with send_lock:
+                client_socket.sendall(self.with_correlation(response, correlation_id, compressor))
+            if self.capture is not None:
+                self.capture.response(connection, correlation_id, len(response))
+        except OSError:
+            pass  # El cliente cerró la conexión antes de recibir la respuesta
+        finally:
+            if lane is not None and waited is not None:
+                self.scheduler.release(lane)
+            in_flight.release()
     
     def start(self):
         """Iniciar bus de servicios"""
+        self.start_background()
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket = self.create_listener()
             
             self.running = True
-            print(f"Bus de servicios iniciado en {self.host}:{self.port}")
+            logger.info("Bus de servicios iniciado en %s:%s", self.host, self.port)
             
             while self.running:
                 try:
@@ -135,27 +830,318 @@ class ServiceBus:
                     
                 except socket.error as e:
                     if self.running:
-                        print(f"Error aceptando conexión: {e}")
+                        logger.warning("Error aceptando conexión: %s", e)
                     
         except Exception as e:
-            print(f"Error iniciando bus de servicios: {e}")
+            logger.error("Error iniciando bus de servicios: %s", e)
         finally:
             self.stop()
     
     def stop(self):
         """Detener bus de servicios"""
         self.running = False
+        self.stop_background()
         if self.server_socket:
             self.server_socket.close()
-        print("Bus de servicios detenido")
+        for pool in self.pools.values():
+            pool.close()
+        self.executor.shutdown(wait=False)
+        self.batch_executor.shutdown(wait=False)
+        logger.info("Bus de servicios detenido")
+
+class AsyncServiceBus(ServiceBus):
+    """Bus de servicios sobre asyncio: un único hilo atiende todas las conexiones"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.async_pools: Dict[tuple, AsyncServiceConnectionPool] = {}
+        self.server = None
+    
+    def get_async_pool(self, replica: Replica) -> AsyncServiceConnectionPool:
+        """Obtener (o crear) el pool asyncio de una réplica"""
+        pool = self.async_pools.get(replica.key)
+        if pool is None:
+            pool = AsyncServiceConnectionPool(
+                replica.host, replica.port,
+                max_size=self.pool_size,
+                idle_timeout=self.pool_idle_timeout,
+                unix=replica.unix
+            )
+            self.async_pools[replica.key] = pool
+        return pool
+    
+    def close_pool(self, replica: Replica):
+        """Cerrar el pool asyncio de una réplica dada de baja"""
+        pool = self.async_pools.pop(replica.key, None)
+        if pool is not None:
+            pool.close()
+    
+    async def forward_to_service_async(self, service_code: str, data: Dict[str, Any]) -> bytes:
+        """Reenviar mensaje a servicio específico sin bloquear el event loop (con caché de lecturas)"""
+        if service_code == BATCH_SERVICE:
+            return await self.handle_batch_async(data)
+        key, cached, generation = self.cache_lookup(service_code, data)
+        if cached is not None:
+            return cached
+        flight = self.flight_key(service_code, data)
+        if flight is None:
+            response = await self.send_to_service_async(service_code, data)
+        else:
+            response = await self.coalescer.do_async(flight, lambda: self.send_to_service_async(service_code, data))
+        self.cache_store(service_code, data, key, generation, response)
+        return response
+    
+    async def handle_batch_async(self, data: Any) -> bytes:
+        """Atender un lote con una tarea por sub-petición"""
+        try:
+            items = self.parse_batch(data)
+        except ValueError as e:
+            return self.format_response(BATCH_SERVICE, {"error": str(e)}).encode('utf-8')
+        
+        results = await asyncio.gather(
+            *(self.forward_to_service_async(service_code, sub_data)
+              for service_code, sub_data, error in items if error is None),
+            return_exceptions=True
+        )
+        results = iter(results)
+        responses = []
+        for service_code, _, error in items:
+            if error is None:
+                result = next(results)
+                if isinstance(result, BaseException):
+                    responses.append({"service": service_code, "ok": False, "error": str(result)})
+                    continue
+                responses.append(self.batch_item(service_code, result))
+            else:
+                responses.append({"service": service_code, "ok": False, "error": error})
+        return self.format_response(BATCH_SERVICE, {"responses": responses}, extended=True).encode('utf-8')
+    
+    async def process_async(self, service_code: str, data: Any, extended: bool, received: int,
+                            correlation_id: Optional[int] = None) -> bytes:
+        """Reenviar una petición de cliente y preparar su respuesta, con métricas"""
+        label = self.metric_label(service_code)
+        self.metrics.add("in_flight", 1, service=label)
+        start = time.perf_counter()
+        response = b""
+        try:
+            response = await self.forward_to_service_async(service_code, data)
+            response = self.finish_response(service_code, response, extended)
+            return response
+        finally:
+            self.record_request(label, start, received, len(response), correlation_id)
+    
+    async def process_in_lane_async(self, service_code: str, data: Any, codec: Codec, extended: bool,
+                                    received: int, correlation_id: Optional[int] = None, client: str = "") -> bytes:
+        """Esperar turno en el carril de la petición (sin bloquear el event loop) y luego procesarla"""
+        lane = self.lane_for(service_code, data, client)
+        if lane is None:
+            return await self.process_async(service_code, data, extended, received, correlation_id)
+        try:
+            waited = await self.scheduler.acquire_async(lane, self.lane_timeout(service_code))
+        except LaneTimeout as e:
+            return self.lane_rejection(service_code, codec, extended, str(e))
+        self.metrics.observe("lane_wait_seconds", waited, lane=lane)
+        try:
+            return await self.process_async(service_code, data, extended, received, correlation_id)
+        finally:
+            self.scheduler.release(lane)
+    
+    async def send_to_service_async(self, service_code: str, data: Dict[str, Any]) -> bytes:
+        """Enviar mensaje al servicio sin bloquear el event loop"""
+        if service_code not in self.registry:
+            self.count_error(service_code, "not_found")
+            return self.format_response(service_code, {"error": "Servicio no encontrado"}).encode('utf-8')
+        
+        guard = self.get_guard(service_code)
+        rejection = guard.admit()
+        if rejection is not None:
+            self.count_error(service_code, "rejected")
+            return self.format_response(service_code, {"error": rejection}).encode('utf-8')
+        
+        try:
+            replica = self.registry.choose(service_code)
+        except NoReplicaAvailable as e:
+            guard.finish(False)
+            self.count_error(service_code, "unavailable")
+            return self.format_response(service_code, {"error": str(e)}).encode('utf-8')
+        
+        start = time.monotonic()
+        ok = False
+        timed_out = False
+        try:
+            message = self.format_response(service_code, data, extended=True).encode('utf-8')
+            
+            if self.pool_size > 0:
+                request = self.get_async_pool(replica).request(message)
+            else:
+                request = self.request_direct_async(replica, message)
+            response = await asyncio.wait_for(request, guard.deadline)
+            ok = True
+            return response
+        
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.count_error(service_code, "timeout")
+            error = {"error": f"Tiempo de espera agotado ({guard.deadline:g}s)"}
+            return self.format_response(service_code, error).encode('utf-8')
+        except Exception as e:
+            self.count_error(service_code, "communication")
+            return self.format_response(service_code, {"error": f"Error de comunicación: {str(e)}"}).encode('utf-8')
+        finally:
+            self.registry.release(replica, time.monotonic() - start, ok)
+            guard.finish(ok, timed_out)
+    
+    async def request_direct_async(self, replica: Replica, message: bytes) -> bytes:
+        """Enviar un mensaje por una conexión nueva (sin pool) y leer la respuesta"""
+        reader, writer = await open_stream(replica.host, replica.port, replica.unix)
+        try:
+            writer.write(message)
+            await writer.drain()
+            return await read_frame_async(reader)
+        finally:
+            writer.close()
+    
+    async def handle_client_async(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Manejar cliente conectado: leer mensajes NNNNNSSSSS y reenviarlos"""
+        address = writer.get_extra_info("peername")
+        extended = False  # Cabecera extendida negociada con este cliente
+        compressor = None  # Compresión de respuestas negociada con este cliente
+        write_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(self.pipeline_depth)
+        tasks = set()
+        connection = self.capture.new_connection() if self.capture is not None else 0
+        client = address[0] if isinstance(address, tuple) else ""
+        try:
+            while True:
+                try:
+                    frame = await read_frame_async(reader)
+                except asyncio.IncompleteReadError:
+                    break  # Cliente cerró la conexión
+                except FrameError as e:
+                    writer.write(self.format_response("error", {"error": str(e)}).encode('utf-8'))
+                    await writer.drain()
+                    break  # Cabecera inválida: el flujo quedó desincronizado
+                
+                received = len(frame)
+                if self.capture is not None:
+                    self.capture.request(connection, frame)
+                correlation_id = None
+                try:
+                    correlation_id, frame = split_correlation(frame)
+                    check_compression(frame, compressor)
+                    service_code, data, codec = decode_frame(frame)
+                    extended = extended or is_extended(split_codec(frame)[1])
+                    limited = self.rate_limit(service_code, data, client, codec, extended)
+                    if service_code == CAPS_SERVICE:
+                        extended = self.negotiate_caps(data)
+                        compressor = self.negotiate_compression(data)
+                        caps = self.capabilities(extended, compressor)
+                        response = self.format_response(CAPS_SERVICE, caps).encode('utf-8')
+                    elif service_code == BUS_SERVICE:
+                        response = encode_frame(BUS_SERVICE, self.handle_admin(data, client), codec)
+                    elif limited is not None:
+                        response = limited
+                    elif correlation_id is not None:
+                        # Petición con correlation ID: se atiende en una tarea y se responde al terminar
+                        await in_flight.acquire()
+                        task = asyncio.create_task(self.handle_pipelined_async(
+                            writer, write_lock, in_flight, correlation_id, service_code, data, codec, extended,
+                            received, connection, compressor, client
+                        ))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                        continue
+                    else:
+                        response = await self.process_in_lane_async(service_code, data, codec, extended, received,
+                                                                    client=client)
+                except ValueError as e:
+                    self.count_error("", "protocol")
+                    response = self.format_response("error", {"error": str(e)})
+                
+                async with write_lock:
+                    writer.write(self.with_correlation(response, correlation_id, compressor))
+                    await writer.drain()
+                if self.capture is not None:
+                    self.capture.response(connection, correlation_id, len(response))
+                
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.warning("Error manejando cliente", extra={"fields": {"client": address, "error": str(e)}})
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+    
+    async def handle_pipelined_async(self, writer: asyncio.StreamWriter, write_lock: asyncio.Lock,
+                                     in_flight: asyncio.Semaphore, correlation_id: int,
+                                     service_code: str, data: Dict[str, Any], codec: Codec, extended: bool,
+                                     received: int = 0, connection: int = 0,
+                                     compressor: Optional[Compressor] = None, client: str = ""):
+        """Reenviar una petición con correlation ID y responder apenas termine"""
+        try:
+            response = await self.process_in_lane_async(service_code, data, codec, extended, received,
+                                                        correlation_id, client)
+            async with write_lock:
+                writer.write(self.with_correlation(response, correlation_id, compressor))
+                await writer.drain()
+            if self.capture is not None:
+                self.capture.response(connection, correlation_id, len(response))
+        except OSError:
+            pass  # El cliente cerró la conexión antes de recibir la respuesta
+        finally:
+            in_flight.release()
+    
+    async def serve(self):
+        """Aceptar conexiones hasta que se cancele la tarea"""
+        self.server = await asyncio.start_server(self.handle_client_async, sock=self.create_listener())
+        self.running = True
+        # El sondeo y el endpoint de métricas usan sockets bloqueantes: corren en sus propios hilos
+        self.start_background()
+        logger.info("Bus de servicios (asyncio) iniciado en %s:%s", self.host, self.port)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            # Las conexiones del pool pertenecen a este loop: cerrarlas antes de que asyncio.run lo cierre
+            pools, self.async_pools = list(self.async_pools.values()), {}
+            await asyncio.gather(*(pool.aclose() for pool in pools), return_exceptions=True)
+    
+    def start(self):
+        """Iniciar bus de servicios en modo asyncio"""
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            logger.error("Error iniciando bus de servicios: %s", e)
+        finally:
+            self.stop()
+    
+    def stop(self):
+        """Detener bus de servicios"""
+        self.running = False
+        self.stop_background()
+        if self.server:
+            self.server.close()
+        logger.info("Bus de servicios detenido")
 
 def main():
     """Función principal"""
-    bus = ServiceBus()
+    parser = argparse.ArgumentParser(description="Bus de Servicios SOA")
+    parser.add_argument("--mode", choices=["thread", "async"], default=os.getenv("BUS_MODE", "thread"),
+                        help="Motor del bus: un hilo por cliente (thread) o event loop asyncio (async)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BUS_WORKERS", "1")),
+                        help="Procesos del bus que comparten el puerto, bajo un supervisor")
+    args = parser.parse_args()
+    
+    configure_logging()
+    if args.workers > 1:
+        from services.bus_supervisor import BusSupervisor
+        BusSupervisor(args.workers, mode=args.mode, metrics_port=int(os.getenv("BUS_METRICS_PORT", "0"))).start()
+        return
+    
+    bus = AsyncServiceBus() if args.mode == "async" else ServiceBus()
     try:
         bus.start()
     except KeyboardInterrupt:
-        print("\nDeteniendo bus de servicios...")
+        logger.info("Deteniendo bus de servicios...")
         bus.stop()
 
 if __name__ == "__main__":
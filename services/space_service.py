@@ -10,17 +10,26 @@ from fastapi import FastAPI, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
-import uvicorn
 
 from database.db_config import get_db, init_db
 from database.models import Espacio, Auditoria
+from database.queries import (
+    PAGE_SIZE, ESPACIOS_KEYSET, InvalidCursor, as_dicts, fetch_page, page_response, select_espacios
+)
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 from datetime import datetime
 
 app = FastAPI(title="Servicio de Espacios - SPACE")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("SPACE")
+init_db("SPACE")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "SPACE", registries=[db_metrics])
 
 # Modelos Pydantic
 class EspacioCreate(BaseModel):
@@ -99,22 +108,18 @@ async def create_space(space_data: EspacioCreate, db: Session = Depends(get_db))
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+def spaces_page(db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Página de espacios por id; retorna (espacios, cursor siguiente)"""
+    return fetch_page(db, ESPACIOS_KEYSET, select_espacios(), cursor, limit)
+
 @app.get("/spaces", response_model=List[EspacioResponse])
-async def get_all_spaces(db: Session = Depends(get_db)):
-    """Obtener todos los espacios"""
+async def get_all_spaces(cursor: Optional[str] = None, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """Obtener los espacios; paginados si se pide cursor o limit (cursor siguiente en X-Next-Cursor)"""
     try:
-        spaces = db.query(Espacio).all()
-        return [
-            EspacioResponse(
-                id=space.id_espacio,
-                nombre=space.nombre,
-                tipo=space.tipo,
-                capacidad=space.capacidad,
-                activo=space.activo,
-                fecha_creacion=space.fecha_creacion
-            )
-            for space in spaces
-        ]
+        spaces, next_cursor = spaces_page(db, cursor, limit)
+        return page_response(spaces, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -261,14 +266,25 @@ async def handle_soa_message(message: str):
                     "status": "created"
                 }
             
+            elif "getallpage" in data:
+                # Obtener una página de espacios: {"cursor", "limit"}
+                params = data["getallpage"] or {}
+                spaces, next_cursor = spaces_page(db, params.get("cursor"), params.get("limit") or PAGE_SIZE)
+                response_data = {
+                    "items": [
+                        {"id": space["id"], "nombre": space["nombre"], "tipo": space["tipo"]} for space in spaces
+                    ],
+                    "next": next_cursor
+                }
+            
             elif "getall" in data:
                 # Obtener todos los espacios
-                spaces = await get_all_spaces(db)
+                spaces = as_dicts(db.execute(select_espacios().order_by(Espacio.id_espacio)))
                 response_data = [
                     {
-                        "id": space.id,
-                        "nombre": space.nombre,
-                        "tipo": space.tipo
+                        "id": space["id"],
+                        "nombre": space["nombre"],
+                        "tipo": space["tipo"]
                     }
                     for space in spaces
                 ]
@@ -286,5 +302,5 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("space", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5003)
+    run_service(app, "SPACE", port=5003)
 
@@ -9,18 +9,27 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from fastapi import FastAPI, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
-import uvicorn
+from typing import List, Literal, Optional
 
 from database.db_config import get_db, init_db
 from database.models import Usuario, Auditoria
+from database.queries import (
+    PAGE_SIZE, USUARIOS_KEYSET, InvalidCursor, as_dicts, export_response, fetch_page, page_response, select_usuarios
+)
 from services.common.soa_protocol import SOAProtocol
+from services.common.db_metrics import install_db_metrics
+from services.common.loop_monitor import install_loop_monitor
+from services.common.serving import run_service
 from datetime import datetime
 
 app = FastAPI(title="Servicio de Usuarios - USER")
 
 # Inicializar base de datos
-init_db()
+db_metrics = install_db_metrics("USER")
+init_db("USER")
+
+# Detector de bloqueos del event loop (/metrics y /debug/loop)
+install_loop_monitor(app, "USER", registries=[db_metrics])
 
 # Modelos Pydantic
 class UsuarioCreate(BaseModel):
@@ -107,23 +116,26 @@ async def create_user(user_data: UsuarioCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+def users_page(db: Session, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """Página de usuarios por id; retorna (usuarios, cursor siguiente)"""
+    return fetch_page(db, USUARIOS_KEYSET, select_usuarios(), cursor, limit)
+
 @app.get("/users", response_model=List[UsuarioResponse])
-async def get_all_users(db: Session = Depends(get_db)):
-    """Obtener todos los usuarios"""
+async def get_all_users(cursor: Optional[str] = None, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    """Obtener los usuarios; paginados si se pide cursor o limit (cursor siguiente en X-Next-Cursor)"""
     try:
-        users = db.query(Usuario).all()
-        return [
-            UsuarioResponse(
-                id=user.id_usuario,
-                rut=user.rut,
-                correo_institucional=user.correo_institucional,
-                nombre=user.nombre,
-                tipo_usuario=user.tipo_usuario,
-                activo=user.activo,
-                fecha_creacion=user.fecha_creacion
-            )
-            for user in users
-        ]
+        users, next_cursor = users_page(db, cursor, limit)
+        return page_response(users, next_cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/users/export")
+async def export_users(formato: Literal["ndjson", "csv"] = "ndjson"):
+    """Exportar la tabla completa de usuarios, transmitida en NDJSON o CSV"""
+    try:
+        return export_response(select_usuarios().order_by(Usuario.id_usuario), formato, "usuarios")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -265,14 +277,23 @@ async def handle_soa_message(message: str):
                     "status": "created"
                 }
             
+            elif "getallpage" in data:
+                # Obtener una página de usuarios: {"cursor", "limit"}
+                params = data["getallpage"] or {}
+                users, next_cursor = users_page(db, params.get("cursor"), params.get("limit") or PAGE_SIZE)
+                response_data = {
+                    "items": [{"id": user["id"], "rut": user["rut"], "tipo": user["tipo_usuario"]} for user in users],
+                    "next": next_cursor
+                }
+            
             elif "getall" in data:
                 # Obtener todos los usuarios
-                users = await get_all_users(db)
+                users = as_dicts(db.execute(select_usuarios().order_by(Usuario.id_usuario)))
                 response_data = [
                     {
-                        "id": user.id,
-                        "rut": user.rut,
-                        "tipo": user.tipo_usuario
+                        "id": user["id"],
+                        "rut": user["rut"],
+                        "tipo": user["tipo_usuario"]
                     }
                     for user in users
                 ]
@@ -302,5 +323,5 @@ async def handle_soa_message(message: str):
         return SOAProtocol().format_message("user", {"error": str(e)})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5002)
+    run_service(app, "USER", port=5002)
 
@@ -0,0 +1,40 @@
+"""
+Comandos de operación _bus: sólo desde loopback o con el token compartido
+"""
+import pytest
+
+from services.service_bus import ServiceBus
+
+CONFIG = {"book": {"host": "127.0.0.1", "port": 1}}
+REGISTER = {"register": {"service": "book", "host": "10.0.0.9", "port": 5005}}
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    monkeypatch.setenv("BUS_ADMIN_TOKEN", "s3creto")
+    return ServiceBus(service_config=CONFIG)
+
+
+@pytest.mark.parametrize("client", ["127.0.0.1", "127.0.0.53", "::1", "::ffff:127.0.0.1", ""])
+def test_loopback_can_register(bus, client):
+    assert bus.handle_admin(REGISTER, client)["registered"] is True
+
+
+@pytest.mark.parametrize("client", ["10.0.0.7", "::ffff:10.0.0.7", "2001:db8::1", "no-es-ip"])
+def test_remote_clients_are_rejected(bus, client):
+    assert "no autorizado" in bus.handle_admin(REGISTER, client)["error"]
+    assert "no autorizado" in bus.handle_admin({"stats": True}, client)["error"]
+    assert len(bus.registry.snapshot()["book"]["replicas"]) == 1
+
+
+def test_remote_client_with_token(bus):
+    assert "no autorizado" in bus.handle_admin(dict(REGISTER, token="otro"), "10.0.0.7")["error"]
+    assert bus.handle_admin(dict(REGISTER, token="s3creto"), "10.0.0.7")["registered"] is True
+    deregister = {"deregister": REGISTER["register"], "token": "s3creto"}
+    assert bus.handle_admin(deregister, "10.0.0.7")["deregistered"] is True
+
+
+def test_without_configured_token_only_loopback(monkeypatch):
+    monkeypatch.delenv("BUS_ADMIN_TOKEN", raising=False)
+    bus = ServiceBus(service_config=CONFIG)
+    assert "no autorizado" in bus.handle_admin(dict(REGISTER, token=""), "10.0.0.7")["error"]
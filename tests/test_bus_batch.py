@@ -0,0 +1,80 @@
+"""
+Lotes del bus (_bulk): cada sub-petición se reenvía por separado y su respuesta vuelve en el mismo orden
+"""
+import asyncio
+
+import pytest
+
+from services.common.soa_protocol import decode_frame
+from services.service_bus import AsyncServiceBus, ServiceBus
+
+CONFIG = {code: {"host": "127.0.0.1", "port": 1} for code in ("user", "space", "book")}
+
+REQUESTS = [
+    {"service": "space", "data": {"getall": {}}},
+    {"service": "book", "data": {"cancel": 3}},
+    {"service": "_bus", "data": {"stats": True}},
+    {"service": "user", "data": {"getallpage": {"limit": 2}}},
+    {"data": {"getall": {}}},
+    {"service": "book", "data": {"fail": True}},
+]
+
+
+def fake_service(bus, service_code: str, data: dict) -> str:
+    if data.get("fail"):
+        return bus.format_response(service_code, {"error": "Reserva no encontrada"})
+    return bus.format_response(service_code, {"service": service_code, "echo": data})
+
+
+def check_responses(responses: list):
+    assert [response["ok"] for response in responses] == [True, True, False, True, False, False]
+    assert responses[0]["data"] == {"service": "space", "echo": {"getall": {}}}
+    assert responses[1]["data"] == {"service": "book", "echo": {"cancel": 3}}
+    assert "no permitido" in responses[2]["error"]
+    assert responses[3]["data"] == {"service": "user", "echo": {"getallpage": {"limit": 2}}}
+    assert responses[4]["error"] == "Petición de lote inválida"
+    assert responses[5] == {"service": "book", "ok": False, "error": "Reserva no encontrada"}
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setenv("BUS_CACHE_ENABLED", "0")
+
+
+def test_batch_is_split_and_answered_in_order(monkeypatch):
+    bus = ServiceBus(service_config=CONFIG)
+    sent = []
+
+    def send_to_service(service_code, data):
+        sent.append((service_code, data))
+        return fake_service(bus, service_code, data)
+
+    monkeypatch.setattr(bus, "send_to_service", send_to_service)
+    service_code, data, _ = decode_frame(bus.handle_batch({"requests": REQUESTS}).encode("utf-8"))
+    assert service_code == "_bulk"
+    check_responses(data["responses"])
+    # Sólo las sub-peticiones válidas llegan a los servicios, una por una
+    expected = [(r["service"], r["data"]) for i, r in enumerate(REQUESTS) if i not in (2, 4)]
+    assert len(sent) == len(expected) and all(request in sent for request in expected)
+
+
+def test_async_batch_is_split_and_answered_in_order(monkeypatch):
+    bus = AsyncServiceBus(service_config=CONFIG)
+
+    async def send_to_service_async(service_code, data):
+        await asyncio.sleep(0.01 if service_code == "space" else 0)  # Termina último, responde primero
+        return fake_service(bus, service_code, data).encode("utf-8")
+
+    monkeypatch.setattr(bus, "send_to_service_async", send_to_service_async)
+    response = asyncio.run(bus.handle_batch_async({"requests": REQUESTS}))
+    check_responses(decode_frame(response)[1]["responses"])
+
+
+@pytest.mark.parametrize("data, error", [
+    ({"requests": [{"service": "space", "data": {}}] * 33}, "excede 32"),
+    ({"requests": {"service": "space"}}, "Formato de lote"),
+    ([], "Formato de lote"),
+])
+def test_invalid_batches_are_rejected(data, error):
+    bus = ServiceBus(service_config=CONFIG)
+    assert error in decode_frame(bus.handle_batch(data).encode("utf-8"))[1]["error"]
@@ -0,0 +1,42 @@
+"""
+Compresión de mensajes SOA: la descompresión está acotada y sólo se aceptan algoritmos negociados
+"""
+import pytest
+
+from services.common.soa_compression import LZ4Compressor, ZlibCompressor, lz4_frame
+from services.common.soa_protocol import FrameError, check_compression, compress_frame, decode_frame, encode_frame
+
+COMPRESSORS = [ZlibCompressor()] + ([LZ4Compressor()] if lz4_frame is not None else [])
+
+
+@pytest.mark.parametrize("compressor", COMPRESSORS, ids=lambda c: c.name)
+def test_round_trip_within_limit(compressor):
+    payload = b"reserva " * 1000
+    assert compressor.decompress(compressor.compress(payload), max_length=len(payload)) == payload
+
+
+@pytest.mark.parametrize("compressor", COMPRESSORS, ids=lambda c: c.name)
+def test_expansion_past_the_limit_is_rejected(compressor):
+    bomb = compressor.compress(b"\0" * (8 * 1024 * 1024))
+    with pytest.raises(ValueError, match="excede"):
+        compressor.decompress(bomb, max_length=1024 * 1024)
+
+
+@pytest.mark.parametrize("compressor", COMPRESSORS, ids=lambda c: c.name)
+def test_truncated_payload_is_rejected(compressor):
+    with pytest.raises(ValueError):
+        compressor.decompress(compressor.compress(bytes(range(256)) * 64)[:-8])
+
+
+def test_compressed_frame_needs_negotiation():
+    zlib = ZlibCompressor()
+    frame = compress_frame(encode_frame("book", {"bulk": ["x" * 10] * 1000}, extended=True), zlib, min_bytes=0)
+    assert frame[:2] == b"~z"
+
+    with pytest.raises(FrameError, match="no negociada"):
+        check_compression(frame, None)
+    check_compression(frame, zlib)
+    assert decode_frame(frame)[1] == {"bulk": ["x" * 10] * 1000}
+
+    # Un mensaje sin comprimir se acepta siempre
+    check_compression(encode_frame("book", {"ok": True}), None)
@@ -0,0 +1,141 @@
+"""
+Pools de conexiones del bus: un mensaje ya enviado no se reenvía aunque la conexión falle
+"""
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from services.common.connection_pool import AsyncServiceConnectionPool, PoolConnectError, ServiceConnectionPool
+from services.common.soa_client import SOAClient, SOAConnectionError
+from services.common.soa_protocol import SOAProtocol, read_frame
+
+PROTOCOL = SOAProtocol()
+
+
+class ClosingBackend:
+    """Servicio que responde cada mensaje salvo el número `close_on`, tras el cual cierra la conexión sin responder"""
+
+    def __init__(self, close_on: int):
+        self.close_on = close_on
+        self.received = 0
+        self._lock = threading.Lock()
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        with conn:
+            while True:
+                try:
+                    read_frame(conn)
+                except (ConnectionError, OSError, ValueError):
+                    return
+                with self._lock:
+                    self.received += 1
+                    number = self.received
+                if number == self.close_on:
+                    return  # Recibió el mensaje y se cae antes de responder
+                conn.sendall(PROTOCOL.format_message("book", {"ok": number}).encode("utf-8"))
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def backend():
+    server = ClosingBackend(close_on=2)
+    yield server
+    server.close()
+
+
+def message(data: dict) -> bytes:
+    return PROTOCOL.format_message("book", data).encode("utf-8")
+
+
+def test_sync_pool_does_not_resend_after_send(backend):
+    pool = ServiceConnectionPool("127.0.0.1", backend.port, max_size=1)
+    assert b'"ok": 1' in pool.request(message({"user": 1, "space": 1}), timeout=5)
+
+    # La conexión reutilizada recibe el mensaje y se cierra: reenviarlo duplicaría la reserva
+    with pytest.raises((OSError, ValueError)):
+        pool.request(message({"user": 1, "space": 1}), timeout=5)
+    assert backend.received == 2
+
+    # El pool sigue sirviendo con una conexión nueva
+    assert b'"ok": 3' in pool.request(message({"getmyreservas": 1}), timeout=5)
+    pool.close()
+
+
+def test_sync_pool_reconnects_when_idle_connection_was_closed():
+    backend = ClosingBackend(close_on=0)
+    pool = ServiceConnectionPool("127.0.0.1", backend.port, max_size=1)
+    sock = pool.acquire()
+    pool.release(sock)
+    sock.shutdown(socket.SHUT_RDWR)  # Conexión ociosa caída antes del checkout: se descarta sin enviar
+
+    assert b'"ok": 1' in pool.request(message({"getmyreservas": 1}), timeout=5)
+    assert backend.received == 1
+    pool.close()
+    backend.close()
+
+
+def test_sync_pool_reports_refused_connection_as_not_sent():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    server.close()
+    pool = ServiceConnectionPool("127.0.0.1", port, max_size=1)
+    with pytest.raises(PoolConnectError):
+        pool.request(message({"user": 1, "space": 1}), timeout=5)
+    assert pool.stats()["abiertas"] == 0
+
+
+def test_client_retries_write_when_connect_fails(monkeypatch):
+    backend = ClosingBackend(close_on=0)
+    client = SOAClient("127.0.0.1", backend.port, pool_size=1, retries=2, backoff=0)
+    connect, attempts = client.pool._connect, []
+
+    def flaky_connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionRefusedError("bus reiniciando")
+        return connect()
+
+    monkeypatch.setattr(client.pool, "_connect", flaky_connect)
+    # _caps es el mensaje 1 y la reserva el 2: se reintentó porque nunca se envió
+    assert client.request("book", {"create": {"user": 1, "space": 1}}) == {"ok": 2}
+    assert backend.received == 2
+    client.close()
+    backend.close()
+
+
+def test_client_does_not_retry_write_after_send():
+    backend = ClosingBackend(close_on=2)
+    client = SOAClient("127.0.0.1", backend.port, pool_size=1, retries=2, backoff=0)
+    with pytest.raises(SOAConnectionError):
+        client.request("book", {"create": {"user": 1, "space": 1}})
+    assert backend.received == 2
+    client.close()
+    backend.close()
+
+
+def test_async_pool_does_not_resend_after_send(backend):
+    async def scenario():
+        pool = AsyncServiceConnectionPool("127.0.0.1", backend.port, max_size=1)
+        assert b'"ok": 1' in await pool.request(message({"user": 1, "space": 1}))
+        with pytest.raises((OSError, asyncio.IncompleteReadError, ValueError)):
+            await pool.request(message({"user": 1, "space": 1}))
+        assert backend.received == 2
+        assert b'"ok": 3' in await pool.request(message({"getmyreservas": 1}))
+        pool.close()
+
+    asyncio.run(scenario())
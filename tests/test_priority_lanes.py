@@ -0,0 +1,100 @@
+"""
+Carriles de prioridad del bus: reparto de cupos por peso, límites por carril y vencimiento en cola
+"""
+import asyncio
+import time
+
+import pytest
+
+from services.common.priority_lanes import LaneScheduler, LaneTimeout, parse_lane_map
+
+
+def drain(scheduler: LaneScheduler, holder: str, grants: list, count: int):
+    """Liberar el cupo `count` veces; cada liberación lo entrega a la siguiente petición en espera"""
+    for _ in range(count):
+        scheduler.release(holder)
+        holder = grants[-1]
+
+
+def queue(scheduler: LaneScheduler, lane: str, count: int, grants: list, timeout: float = 10):
+    for _ in range(count):
+        scheduler.submit(lane, timeout, lambda waited, lane=lane: grants.append(lane))
+
+
+def test_no_wait_while_slots_are_free():
+    scheduler = LaneScheduler(2)
+    assert scheduler.acquire("bulk", 1) == 0.0
+    assert scheduler.acquire("interactive", 1) == 0.0
+    assert scheduler.stats()["active"] == 2
+
+
+def test_slots_are_shared_by_weight():
+    scheduler = LaneScheduler(1, lanes={"interactive": 8, "normal": 4, "bulk": 1})
+    scheduler.acquire("bulk", 1)
+    grants = []
+    # Los reportes llegaron primero, pero interactive recibe 8 turnos por cada uno de bulk
+    queue(scheduler, "bulk", 16, grants)
+    queue(scheduler, "interactive", 16, grants)
+    drain(scheduler, "bulk", grants, 18)
+    assert grants[:9].count("interactive") == 8
+    assert grants.count("interactive") == 16 and grants.count("bulk") == 2
+
+
+def test_lane_limit_caps_its_slots():
+    scheduler = LaneScheduler(4, limits={"bulk": 1})
+    scheduler.acquire("bulk", 1)
+    grants = []
+    queue(scheduler, "bulk", 1, grants)
+    assert grants == []  # Hay cupos libres, pero bulk ya usa su máximo
+    scheduler.acquire("interactive", 1)
+    scheduler.release("bulk")
+    assert grants == ["bulk"]
+
+
+def test_wait_past_the_deadline_raises():
+    scheduler = LaneScheduler(1)
+    scheduler.acquire("normal", 1)
+    start = time.monotonic()
+    with pytest.raises(LaneTimeout):
+        scheduler.acquire("bulk", 0.05)
+    assert time.monotonic() - start < 1
+    assert scheduler.stats()["lanes"]["bulk"]["expired"] == 1
+    assert scheduler.stats()["lanes"]["bulk"]["queued"] == 0
+
+
+def test_expired_waiter_gets_none_and_does_not_take_the_slot():
+    scheduler = LaneScheduler(1)
+    scheduler.acquire("normal", 1)
+    results = []
+    scheduler.submit("bulk", 0, results.append)
+    time.sleep(0.01)
+    scheduler.release("normal")
+    assert results == [None]
+    assert scheduler.stats()["active"] == 0
+
+
+def test_async_acquire_waits_for_release():
+    async def scenario():
+        scheduler = LaneScheduler(1)
+        scheduler.acquire("normal", 1)
+        waiting = asyncio.ensure_future(scheduler.acquire_async("interactive", 1))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        scheduler.release("normal")
+        assert await waiting >= 0.0
+        assert scheduler.stats()["lanes"]["interactive"]["active"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_lane_for_rules():
+    scheduler = LaneScheduler(1, lane_map=parse_lane_map("book=interactive,book.cancel=bulk,client:10.0.0.9=bulk"))
+    assert scheduler.lane_for("book", {"getmyreservas": 1}) == "interactive"
+    assert scheduler.lane_for("book", {"cancel": 3}) == "bulk"
+    assert scheduler.lane_for("book", {"getmyreservas": 1}, client="10.0.0.9") == "bulk"
+    assert scheduler.lane_for("report", {"uso": {}}) == "normal"
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        LaneScheduler(1, lane_map={"book": "urgente"})
@@ -0,0 +1,101 @@
+"""
+Listados paginados por keyset: filas con fecha de orden NULL y listado completo sin cursor ni limit
+"""
+import base64
+import json
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from database.db_config import Base
+from database.models import Espacio, Reserva, Usuario
+from database.queries import RESERVAS_KEYSET, InvalidCursor, fetch_page, select_reservas
+
+START = datetime(2026, 3, 2, 9)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Usuario), [{"rut": "1-9", "correo_institucional": "a@mail.udp.cl", "nombre": "Ana",
+                                        "tipo_usuario": "estudiante"}])
+        conn.execute(insert(Espacio), [{"nombre": "Sala A", "tipo": "sala", "capacidad": 30}])
+        # Reservas 1-7; las pares sin fecha de solicitud (datos antiguos o cargados a mano)
+        conn.execute(insert(Reserva), [
+            {"id_usuario": 1, "id_espacio": 1, "estado": "pendiente", "fecha_inicio": START + timedelta(days=i),
+             "fecha_fin": START + timedelta(days=i, hours=1),
+             "fecha_solicitud": None if i % 2 == 0 else START - timedelta(days=10 - i)}
+            for i in range(1, 8)
+        ])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def all_pages(db, limit: int) -> list:
+    ids, cursor = [], None
+    while True:
+        rows, cursor = fetch_page(db, RESERVAS_KEYSET, select_reservas(), cursor, limit)
+        ids += [row["id"] for row in rows]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_null_timestamps_do_not_end_pagination(db, limit):
+    # Más recientes primero y las filas sin fecha al final, por id descendente
+    assert all_pages(db, limit) == [7, 5, 3, 1, 6, 4, 2]
+
+
+def test_cursor_on_a_null_timestamp_row(db):
+    rows, cursor = fetch_page(db, RESERVAS_KEYSET, select_reservas(), None, 5)
+    assert rows[-1]["id"] == 6 and rows[-1]["fecha_solicitud"] is None
+    rows, cursor = fetch_page(db, RESERVAS_KEYSET, select_reservas(), cursor, 5)
+    assert [row["id"] for row in rows] == [4, 2]
+    assert cursor is None
+
+
+def test_full_list_without_cursor_or_limit(db):
+    rows, cursor = fetch_page(db, RESERVAS_KEYSET, select_reservas(), None, None)
+    assert [row["id"] for row in rows] == [7, 5, 3, 1, 6, 4, 2]
+    assert cursor is None
+
+
+def test_null_in_a_non_nullable_cursor_column_is_rejected(db):
+    cursor = RESERVAS_KEYSET.encode({"fecha_solicitud": None, "id": None})
+    with pytest.raises(InvalidCursor):
+        fetch_page(db, RESERVAS_KEYSET, select_reservas(), cursor, 2)
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("payload", [
+    ["reservas", "2026-03-01T09:00:00", "7"],  # id como texto
+    ["reservas", "2026-03-01T09:00:00", 7.5],
+    ["reservas", "2026-03-01T09:00:00", True],
+    ["reservas", "ayer", 7],  # fecha mal formada
+    ["reservas", 20260301, 7],
+    ["reservas", ["2026-03-01T09:00:00"], 7],
+    ["reservas", "2026-03-01T09:00:00"],  # faltan campos
+    ["espacios", 7],  # cursor de otro listado
+    {"0": "reservas"},
+    "reservas",
+])
+def test_malformed_cursor_fields_are_rejected(db, payload):
+    with pytest.raises(InvalidCursor):
+        fetch_page(db, RESERVAS_KEYSET, select_reservas(), raw_cursor(payload), 2)
+
+
+def test_cursor_that_is_not_base64_json_is_rejected(db):
+    with pytest.raises(InvalidCursor):
+        fetch_page(db, RESERVAS_KEYSET, select_reservas(), "no es un cursor", 2)
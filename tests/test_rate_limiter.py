@@ -0,0 +1,75 @@
+"""
+Límite de peticiones del bus: recarga de los token buckets y llaves por dirección y usuario
+"""
+import pytest
+
+from services.common import rate_limiter
+from services.common.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_refill(clock):
+    limiter = RateLimiter({"book": 2.0}, bursts={"book": 3})
+    assert [limiter.check("book", {}, "10.0.0.1") for _ in range(3)] == [None, None, None]
+    assert limiter.check("book", {}, "10.0.0.1") == pytest.approx(0.5)
+
+    clock[0] += 0.5  # Un token a 2 por segundo
+    assert limiter.check("book", {}, "10.0.0.1") is None
+    assert limiter.check("book", {}, "10.0.0.1") is not None
+
+    clock[0] += 60  # La recarga no supera la ráfaga
+    assert [limiter.check("book", {}, "10.0.0.1") for _ in range(4)].count(None) == 3
+    assert limiter.stats()["limited"] == {"book": 3}
+
+
+def test_services_without_rate_are_not_limited(clock):
+    limiter = RateLimiter({"auth": 1.0}, bursts={"auth": 1})
+    assert all(limiter.check("book", {}, "10.0.0.1") is None for _ in range(100))
+    assert limiter.stats()["keys"] == 0
+
+
+def test_buckets_are_per_address(clock):
+    limiter = RateLimiter({"auth": 1.0}, bursts={"auth": 1})
+    assert limiter.check("auth", {}, "10.0.0.1") is None
+    assert limiter.check("auth", {}, "10.0.0.1") is not None
+    assert limiter.check("auth", {}, "10.0.0.2") is None
+
+
+def test_varying_the_user_does_not_bypass_the_address_bucket(clock):
+    limiter = RateLimiter({"auth": 1.0}, bursts={"auth": 2}, by_user=True)
+    results = [limiter.check("auth", {"rut": f"{i}-9"}, "10.0.0.1") for i in range(10)]
+    assert results[:2] == [None, None]
+    assert all(result is not None for result in results[2:])
+    # Los rechazos no crean buckets de usuario: sólo la dirección y los dos admitidos
+    assert limiter.stats()["keys"] == 3
+
+
+def test_user_bucket_is_charged_across_addresses(clock):
+    limiter = RateLimiter({"book": 1.0}, bursts={"book": 2}, by_user=True)
+    assert limiter.check("book", {"user": 7}, "10.0.0.1") is None
+    assert limiter.check("book", {"user": 7}, "10.0.0.2") is None
+    assert limiter.check("book", {"user": 7}, "10.0.0.3") is not None
+    # Otro usuario desde una dirección con tokens sigue admitido
+    assert limiter.check("book", {"user": 8}, "10.0.0.3") is None
+
+
+def test_rejection_charges_no_bucket(clock):
+    limiter = RateLimiter({"book": 1.0}, bursts={"book": 1}, by_user=True)
+    assert limiter.check("book", {"user": 1}, "10.0.0.1") is None
+    assert limiter.check("book", {"user": 2}, "10.0.0.1") is not None  # Dirección sin tokens
+    # El usuario 2 no gastó su token en el rechazo
+    assert limiter.check("book", {"user": 2}, "10.0.0.2") is None
+
+
+def test_least_recently_used_buckets_are_evicted(clock):
+    limiter = RateLimiter({"book": 1.0}, bursts={"book": 1}, max_keys=2)
+    for client in ("a", "b", "c"):
+        limiter.check("book", {}, client)
+    assert limiter.stats()["keys"] == 2 and limiter.stats()["evictions"] == 1
+    assert limiter.check("book", {}, "a") is None  # Desalojado: vuelve a empezar lleno
@@ -0,0 +1,87 @@
+"""
+Caché de lecturas del bus: TTL, límite de memoria e invalidación con las escrituras
+"""
+import pytest
+
+from services.common import response_cache
+from services.common.response_cache import ResponseCache, parse_ttls
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def store(cache: ResponseCache, service_code: str, data: dict, response: str) -> tuple:
+    key = cache.key_for(service_code, data)
+    _, generation = cache.get(key)
+    cache.put(key, response, generation)
+    return key
+
+
+def test_read_is_served_until_its_ttl(clock):
+    cache = ResponseCache(ttls={("space", "getall"): 30})
+    key = store(cache, "space", {"getall": {}}, "espacios")
+    assert cache.get(key)[0] == "espacios"
+    clock[0] += 30
+    assert cache.get(key)[0] is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_only_configured_commands_are_cacheable():
+    cache = ResponseCache(ttls={("space", "getall"): 30})
+    assert cache.key_for("space", {"getallpage": {}}) is None
+    assert cache.key_for("user", {"getall": {}}) is None
+
+
+def test_write_invalidates_its_service(clock):
+    cache = ResponseCache()
+    spaces = store(cache, "space", {"getall": {}}, "espacios")
+    users = store(cache, "user", {"getall": {}}, "usuarios")
+
+    cache.observe("user", {"create": {"rut": "1-9"}})
+    assert cache.get(users)[0] is None
+    assert cache.get(spaces)[0] == "espacios"
+
+
+def test_write_invalidates_dependent_services(clock):
+    cache = ResponseCache()
+    config = store(cache, "avail", {"config": True}, "config")
+    cache.observe("book", {"cancel": 3})  # Una reserva cambia la disponibilidad
+    assert cache.get(config)[0] is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_reads_do_not_invalidate(clock):
+    cache = ResponseCache()
+    key = store(cache, "space", {"getall": {}}, "espacios")
+    cache.observe("space", {"getallpage": {"limit": 5}})
+    assert cache.get(key)[0] == "espacios"
+
+
+def test_response_read_before_a_write_is_not_stored(clock):
+    cache = ResponseCache()
+    key = cache.key_for("space", {"getall": {}})
+    _, generation = cache.get(key)
+    cache.observe("space", {"create": {"nombre": "Sala B"}})  # Escritura durante la lectura
+    cache.put(key, "espacios sin Sala B", generation)
+    assert cache.get(key)[0] is None
+
+
+def test_lru_eviction_by_bytes(clock):
+    cache = ResponseCache(ttls={("space", "getallpage"): 30}, max_bytes=10)
+    first = store(cache, "space", {"getallpage": {"cursor": "a"}}, "12345")
+    second = store(cache, "space", {"getallpage": {"cursor": "b"}}, "12345")
+    cache.get(first)  # first pasa a ser la más reciente
+    store(cache, "space", {"getallpage": {"cursor": "c"}}, "12345")
+    assert cache.get(second)[0] is None
+    assert cache.get(first)[0] == "12345"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_parse_ttls():
+    assert parse_ttls("avail.config=60, space.getall=5") == {("avail", "config"): 60.0, ("space", "getall"): 5.0}
+    with pytest.raises(ValueError):
+        parse_ttls("avail=60")
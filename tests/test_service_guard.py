@@ -0,0 +1,92 @@
+"""
+Protección del bus por servicio: transiciones del circuit breaker y límite de peticiones en vuelo
+"""
+import pytest
+
+from services.common import service_guard
+from services.common.service_guard import CircuitBreaker, ServiceGuard, parse_service_values
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [500.0]
+    monkeypatch.setattr(service_guard.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opens == 1
+    assert not breaker.allow()
+    assert breaker.snapshot()["retry_in"] == 10
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 1
+
+
+def test_half_open_admits_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record(False)
+    clock[0] += 9.9
+    assert not breaker.allow()
+
+    clock[0] += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # Prueba en curso
+
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10)
+    for _ in range(5):
+        breaker.record(False)
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opens == 2
+    assert not breaker.allow()
+    clock[0] += 10
+    assert breaker.allow()
+
+
+def test_guard_rejects_over_max_in_flight(clock):
+    guard = ServiceGuard("report", deadline=30, max_in_flight=2, breaker=CircuitBreaker())
+    assert guard.admit() is None
+    assert guard.admit() is None
+    assert "saturado" in guard.admit()
+    guard.finish(ok=True)
+    assert guard.admit() is None
+    assert guard.snapshot()["in_flight"] == 2 and guard.snapshot()["rejected_overload"] == 1
+
+
+def test_guard_counts_timeouts_and_rejects_while_open(clock):
+    guard = ServiceGuard("avail", deadline=2, max_in_flight=0, breaker=CircuitBreaker(failure_threshold=2))
+    for _ in range(2):
+        assert guard.admit() is None
+        guard.finish(ok=False, timed_out=True)
+    assert "circuito abierto" in guard.admit()
+    snapshot = guard.snapshot()
+    assert snapshot["timeouts"] == 2 and snapshot["rejected_open"] == 1 and snapshot["in_flight"] == 0
+    assert snapshot["breaker"]["state"] == CircuitBreaker.OPEN
+
+
+def test_parse_service_values():
+    assert parse_service_values(" report=30, avail=2.5 ") == {"report": 30.0, "avail": 2.5}
+    with pytest.raises(ValueError):
+        parse_service_values("report")
@@ -0,0 +1,101 @@
+"""
+Coalescencia de lecturas en vuelo: sólo lecturas conocidas comparten llamada y su error
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.common.single_flight import SingleFlight
+
+
+@pytest.mark.parametrize("service_code, data", [
+    ("user", {"create": {"rut": "1-9"}}),
+    ("user", {"getall": {}, "create": {"rut": "1-9"}}),
+    ("book", {"getmyreservas": 1, "user": 1, "space": 1, "inicio": "x", "fin": "y"}),
+    ("auth", {"rut": "1-9", "pass": "x"}),
+    ("user", {"getallpage": {"cursor": b"\x00"}}),
+])
+def test_writes_and_unknown_payloads_have_no_key(service_code, data):
+    assert SingleFlight().key_for(service_code, data) is None
+
+
+def test_write_is_not_merged_with_concurrent_read():
+    flight = SingleFlight()
+    read = {"getall": {}}
+    mixed = {"getall": {}, "create": {"rut": "1-9"}}
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_read():
+        calls.append("read")
+        started.set()
+        release.wait(5)
+        return "lista"
+
+    leader = threading.Thread(target=flight.do, args=(flight.key_for("user", read), slow_read))
+    leader.start()
+    started.wait(5)
+
+    # La escritura no tiene llave: va directo al servicio y abre una nueva generación
+    assert flight.key_for("user", mixed) is None
+    flight.observe("user", mixed)
+    assert flight.key_for("user", read) != ("user", 0, '{"getall":{}}')
+    release.set()
+    leader.join(5)
+    assert calls == ["read"]
+    assert flight.stats()["coalesced"] == {}
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight()
+    key = flight.key_for("avail", {"config": True})
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing_call():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("servicio caído")
+
+    def request():
+        try:
+            flight.do(key, failing_call)
+        except ConnectionError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=request) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.stats()["coalesced"].get("avail", 0) < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(errors) == 4 and all(error is errors[0] for error in errors)
+    # La llamada fallida no queda en vuelo: la siguiente petición vuelve a intentarlo
+    assert flight.do(key, lambda: "ok") == "ok"
+    assert flight.stats() == {"calls": {"avail": 2}, "coalesced": {"avail": 3}, "in_flight": 0}
+
+
+def test_async_leader_error_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        key = flight.key_for("avail", {"config": True})
+
+        async def failing_call():
+            await asyncio.sleep(0.01)
+            raise ConnectionError("servicio caído")
+
+        results = await asyncio.gather(*(flight.do_async(key, failing_call) for _ in range(4)),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        assert await flight.do_async(key, lambda: asyncio.sleep(0, "ok")) == "ok"
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+"""
+Clasificación de mensajes SOA en lecturas y escrituras: con varias llaves el servicio decide qué ejecuta
+"""
+import pytest
+
+from services.common.response_cache import ResponseCache
+from services.common.soa_commands import command_of, is_read
+
+
+@pytest.mark.parametrize("service_code, data", [
+    ("user", {"getall": {}}),
+    ("space", {"getallpage": {"limit": 10}}),
+    ("book", {"getmyreservas": 1}),
+    ("avail", {"config": True}),
+])
+def test_single_read_command(service_code, data):
+    assert is_read(service_code, data)
+
+
+@pytest.mark.parametrize("service_code, data", [
+    # user_service revisa "create" antes que "getall": se ejecuta la escritura
+    ("user", {"getall": {}, "create": {"rut": "1-9", "nombre": "Ana"}}),
+    ("user", {"getallpage": {}, "changerole": {"user": 1, "rol": "admin"}}),
+    # booking_service crea la reserva si vienen user, space, inicio y fin
+    ("book", {"getmyreservas": 1, "user": 1, "space": 1, "inicio": "2026-03-02T09:00", "fin": "2026-03-02T10:00"}),
+    ("admin", {"config": {"max_horas": 4}}),
+    ("user", {}),
+    ("user", "getall"),
+])
+def test_writes_and_ambiguous_payloads_are_not_reads(service_code, data):
+    assert not is_read(service_code, data)
+
+
+def test_command_of_multiple_keys_is_empty():
+    assert command_of({"cancel": 3}) == "cancel"
+    assert command_of({"getall": {}, "create": {}}) == ""
+
+
+def test_mixed_payload_is_not_cached_and_invalidates():
+    cache = ResponseCache()
+    key = cache.key_for("user", {"getall": {}})
+    _, generation = cache.get(key)
+    cache.put(key, '{"usuarios": []}', generation)
+
+    mixed = {"getall": {}, "create": {"rut": "1-9", "nombre": "Ana"}}
+    assert cache.key_for("user", mixed) is None
+    cache.observe("user", mixed)
+    assert cache.get(key)[0] is None
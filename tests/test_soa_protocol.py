@@ -0,0 +1,101 @@
+"""
+Lectura de mensajes SOA con los prefijos de correlación (#), codec ($) y compresión (~) y la cabecera extendida
+"""
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from services.common.soa_codecs import available_codecs, get_codec
+from services.common.soa_compression import ZlibCompressor
+from services.common.soa_protocol import (
+    FrameError, build_correlation, compress_frame, decode_frame, encode_frame, read_frame, read_frame_async,
+    split_correlation
+)
+
+SMALL = {"getallpage": {"cursor": "a" * 300}}  # Comprimible y con cabecera clásica
+BIG = {"reservas": [{"id": i, "estado": "pendiente"} for i in range(10000)]}  # Más de 99999 bytes en JSON
+CODECS = [name for name in ("json", "msgpack") if name in available_codecs()]
+
+
+def frames():
+    """(nombre, mensaje, correlation ID) con cada combinación de prefijos y cabeceras"""
+    zlib = ZlibCompressor()
+    for codec_name in CODECS:
+        codec = get_codec(codec_name)
+        for extended, data in ((False, SMALL), (True, BIG)):
+            frame = encode_frame("book", data, codec, extended=extended)
+            name = f"{codec_name}-{'ext' if extended else 'std'}"
+            yield name, frame, None
+            yield name + "-corr", build_correlation(7).encode("ascii") + frame, 7
+            compressed = compress_frame(frame, zlib, min_bytes=0)
+            if compressed != frame:
+                yield name + "-zlib", compressed, None
+                yield name + "-corr-zlib", build_correlation(99999999).encode("ascii") + compressed, 99999999
+
+
+FRAMES = list(frames())
+
+
+def send_in_chunks(sock: socket.socket, data: bytes, chunk: int):
+    for start in range(0, len(data), chunk):
+        sock.sendall(data[start:start + chunk])
+
+
+# Los mensajes pequeños llegan también de a 1 y 3 bytes, para partir cada prefijo y cabecera
+READS = [(name, frame, correlation, chunk) for name, frame, correlation in FRAMES
+         for chunk in ((1, 3, 1 << 20) if len(frame) < 1000 else (4096, 1 << 20))]
+
+
+@pytest.mark.parametrize("name, frame, correlation, chunk", READS,
+                         ids=[f"{name}-{chunk}" for name, _, _, chunk in READS])
+def test_read_frame(name, frame, correlation, chunk):
+    left, right = socket.socketpair()
+    with left, right:
+        # Dos mensajes seguidos: el primero no debe consumir bytes del segundo
+        writer = threading.Thread(target=send_in_chunks, args=(left, frame + frame, chunk))
+        writer.start()
+        first, second = read_frame(right), read_frame(right)
+        writer.join()
+    assert bytes(first) == frame and bytes(second) == frame
+    correlation_id, message = split_correlation(first)
+    assert correlation_id == correlation
+    service_code, data, _ = decode_frame(message)
+    assert service_code == "book"
+    assert data == (BIG if "-ext" in name else SMALL)
+
+
+@pytest.mark.parametrize("name, frame, correlation", FRAMES, ids=[name for name, _, _ in FRAMES])
+def test_read_frame_async(name, frame, correlation):
+    async def scenario():
+        reader = asyncio.StreamReader()
+        reader.feed_data(frame + frame)
+        reader.feed_eof()
+        return await read_frame_async(reader), await read_frame_async(reader)
+
+    first, second = asyncio.run(scenario())
+    assert first == frame and second == frame
+
+
+@pytest.mark.parametrize("data", [b"12a45book {}", b"X0000000001x5book {}", b"#12ab5678" + b"00007book {}"])
+def test_invalid_header_is_rejected(data):
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(data)
+        with pytest.raises(FrameError):
+            split_correlation(read_frame(right))
+
+
+def test_closed_mid_frame():
+    left, right = socket.socketpair()
+    with right:
+        left.sendall(encode_frame("book", {"getall": {}})[:-2])
+        left.close()
+        with pytest.raises(ConnectionError):
+            read_frame(right)
+
+
+def test_large_frame_needs_extended_header():
+    with pytest.raises(FrameError):
+        encode_frame("book", BIG, extended=False)